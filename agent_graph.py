@@ -1,31 +1,257 @@
 import os
-import re
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from typing import TypedDict, List
-from langgraph.graph import StateGraph, END
+from langgraph.graph import StateGraph, START, END
+from pydantic import ValidationError
 from langchain_core.messages import HumanMessage
-from langchain_openai import ChatOpenAI
-from rag_setup import get_retriever
-from pdf_gen import generate_permit_pdf
+from resources import (
+    get_llm,
+    get_llm_cache,
+    get_retriever,
+    get_reranker,
+    get_structured_tables,
+    record_tokens,
+)
+from chat_history import count_tokens, user_statements
+from retrieval import (
+    retrieve_many,
+    SOP_QUERY,
+    SOP_FILTER,
+    LAW_FILTER,
+    msds_query,
+    msds_filter,
+)
+from pdf_gen import generate_permit_pdf, new_permit_id
+from hazard_lexicon import get_lexicon
+from context_assembler import assemble
+from reranker import RERANK_CANDIDATES
+from fine_kinney import HEDGE, NEGATION, assess, mentioned_measures, risk_level
+from schemas import GateDecision, RiskAssessment, StructuredOutputError
+from prompt_registry import get_prompts
+
+# LLM / 임베딩 / 인덱스는 import 시점이 아니라 노드에서 처음 필요할 때 로드 (resources.py)
+
+# sequential: coordinator -> regulation_finder -> risk_analyst -> admin_agent
+# parallel: coordinator가 LLM 판정을 기다리는 동안 규정 검색(LLM 없음)을 백그라운드로
+#           먼저 시작한다. MISSING이면 검색을 버리고 바로 END (다른 노드를 기다리지 않음),
+#           통과하면 검색 결과를 받아 위험성 평가와 작업명 요약(work_summary)을 동시에 진행.
+GRAPH_MODE = os.getenv("GRAPH_MODE", "parallel")
+
+# parallel 모드 선행 검색 스레드 수 (sync 그래프)
+PREFETCH_WORKERS = int(os.getenv("PREFETCH_WORKERS", "8"))
+_prefetch_executor = ThreadPoolExecutor(
+    max_workers=PREFETCH_WORKERS, thread_name_prefix="prefetch"
+)
+
+NO_REGULATION = "관련 규정을 찾을 수 없습니다."
 
-# LLM 설정
-llm = ChatOpenAI(model="gpt-4o", temperature=0)
-retriever = get_retriever()
+# 근거 자료에 함께 붙이는 SIF(고위험요인) 유사 사례 수
+SIF_CONTEXT_LIMIT = 2
+
+# async 그래프에서 PDF 렌더링(reportlab, CPU 작업)을 이벤트 루프 밖에서 돌리는 스레드 수
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", "4"))
+_pdf_executor = ThreadPoolExecutor(max_workers=PDF_WORKERS, thread_name_prefix="pdf")
 
 
 # --- 프롬프트 로더 함수 ---
+# 템플릿은 prompt_registry가 시작 시 한 번 컴파일/검증하고 파일이 바뀌면 다시 읽는다.
+# (변수 불일치는 빈 프롬프트로 넘기지 않고 import 시점에 바로 실패)
+prompts = get_prompts()
+
+
 def load_prompt(filename, **kwargs):
     """
-    prompts 폴더의 md 파일을 읽어서 변수({key})를 채워주는 함수
+    prompts 폴더의 md 템플릿에 변수({key})를 채워주는 함수
     """
-    file_path = os.path.join("prompts", filename)
+    return prompts.render(filename, **kwargs)
+
+
+# 의미 유사도 캐시는 위험 요소(hazard_lexicon), 언급된 안전조치, 부정/유보 표현
+# (fine_kinney와 같은 판정 기준)까지 같을 때만 재사용한다.
+# (위험/안전 키워드나 부정 표현 하나 차이로 판정이 바뀌기 때문)
+def cache_guard(text, *extra):
+    detected = get_lexicon().detect(text)
+    found = [name for category in sorted(detected) for name in detected[category]]
+    found += mentioned_measures(text)
+    found += sorted({m.group() for m in NEGATION.finditer(text)})
+    found += sorted({m.group() for m in HEDGE.finditer(text)})
+    return "|".join(found + [str(e) for e in extra])
+
+
+def _node_name(prompt_file):
+    return os.path.splitext(prompt_file)[0] if prompt_file else "llm"
+
+
+def _llm_config(prompt_file):
+    # stream_mode="messages" 이벤트에서 어느 프롬프트의 토큰인지 구분하는 메타데이터
+    # (prompt_version은 추적 대시보드에서 프롬프트 변경 전후를 비교하는 용도)
+    metadata = {"prompt": _node_name(prompt_file)}
+    if prompt_file:
+        metadata["prompt_version"] = prompts.version(prompt_file)
+    return {"metadata": metadata}
+
+
+def _record_usage(prompt_file, prompt, message):
+    """응답의 usage_metadata를 우선 쓰고, 없으면 tiktoken으로 센다"""
+    usage = getattr(message, "usage_metadata", None) or {}
+    record_tokens(
+        _node_name(prompt_file),
+        usage.get("input_tokens") or count_tokens(prompt),
+        usage.get("output_tokens") or count_tokens(message.content),
+    )
+
+
+def ask_llm(prompt, prompt_file="", semantic_text=None, guard=""):
+    """prompt_file을 주면 응답 캐시(llm_cache.py)를 거친다"""
+    cache = get_llm_cache() if prompt_file else None
+    if cache is not None:
+        cached = cache.get(prompt_file, prompt, semantic_text, guard)
+        if cached is not None:
+            record_tokens(_node_name(prompt_file), cached=True)
+            return cached
+
+    message = get_llm().invoke(
+        [HumanMessage(content=prompt)], config=_llm_config(prompt_file)
+    )
+    _record_usage(prompt_file, prompt, message)
+    response = message.content
+    if cache is not None:
+        cache.put(prompt_file, prompt, response, semantic_text, guard)
+    return response
+
+
+async def aask_llm(prompt, prompt_file="", semantic_text=None, guard=""):
+    """비동기 호출: 응답을 기다리는 동안 이벤트 루프가 다른 요청을 처리한다"""
+    cache = get_llm_cache() if prompt_file else None
+    if cache is not None:
+        # SQLite 조회/임베딩은 블로킹이므로 스레드에서
+        cached = await asyncio.to_thread(
+            cache.get, prompt_file, prompt, semantic_text, guard
+        )
+        if cached is not None:
+            record_tokens(_node_name(prompt_file), cached=True)
+            return cached
+
+    message = await get_llm().ainvoke(
+        [HumanMessage(content=prompt)], config=_llm_config(prompt_file)
+    )
+    _record_usage(prompt_file, prompt, message)
+    response = message.content
+    if cache is not None:
+        await asyncio.to_thread(
+            cache.put, prompt_file, prompt, response, semantic_text, guard
+        )
+    return response
+
+
+# 구조화 출력(schemas.py) 검증 실패 시 오류 내용을 붙여 다시 요청하는 최대 횟수
+STRUCTURED_RETRIES = int(os.getenv("STRUCTURED_RETRIES", "1"))
+
+
+def _structured_llm(schema):
+    # json_schema strict: 디코딩 단계에서 스키마 밖의 출력(설명 문장 등)을 막는다
+    # include_raw: 토큰 사용량 기록 + 검증 실패 시 원 응답을 repair 요청에 붙이기 위해
+    return get_llm().with_structured_output(
+        schema, method="json_schema", strict=True, include_raw=True
+    )
+
+
+def _cached_model(schema, cached):
+    """캐시 값을 다시 검증 (스키마 변경 전 응답이나 의미 유사도 적중의 옛 형식은 미스로)"""
+    if cached is None:
+        return None
     try:
-        with open(file_path, "r", encoding="utf-8") as f:
-            content = f.read()
-            # 파일 내용에 변수값 주입 (format 사용)
-            return content.format(**kwargs)
-    except Exception as e:
-        print(f"❌ 프롬프트 로드 실패 ({filename}): {e}")
-        return ""
+        return schema.model_validate_json(cached)
+    except ValidationError:
+        return None
+
+
+def _structured_attempt(prompt_file, prompt, messages, result):
+    """검증된 객체 또는 None (None이면 messages 끝에 repair 요청을 붙인다)"""
+    _record_usage(prompt_file, prompt, result["raw"])
+    if result["parsing_error"] is None and result["parsed"] is not None:
+        return result["parsed"]
+    error = result["parsing_error"] or "응답이 비어 있습니다."
+    print(f"🔧 [{_node_name(prompt_file)}] 출력 검증 실패 -> 재요청: {error}")
+    messages += [
+        result["raw"],
+        HumanMessage(
+            content=f"위 출력이 스키마 검증에 실패했다: {error}\n"
+            "오류를 고쳐 같은 스키마로 다시 출력하라."
+        ),
+    ]
+    return None
+
+
+def ask_structured(prompt, schema, prompt_file, semantic_text=None, guard=""):
+    """
+    schema(pydantic 모델)로 검증된 객체를 반환한다.
+    STRUCTURED_RETRIES번 재요청해도 검증에 실패하면 StructuredOutputError
+    """
+    cache = get_llm_cache()
+    parsed = _cached_model(
+        schema, cache.get(prompt_file, prompt, semantic_text, guard)
+    )
+    if parsed is not None:
+        record_tokens(_node_name(prompt_file), cached=True)
+        return parsed
+
+    llm = _structured_llm(schema)
+    messages = [HumanMessage(content=prompt)]
+    for _ in range(STRUCTURED_RETRIES + 1):
+        result = llm.invoke(messages, config=_llm_config(prompt_file))
+        parsed = _structured_attempt(prompt_file, prompt, messages, result)
+        if parsed is not None:
+            cache.put(
+                prompt_file, prompt, parsed.model_dump_json(), semantic_text, guard
+            )
+            return parsed
+    raise StructuredOutputError(
+        f"{schema.__name__} 출력 검증 실패 ({STRUCTURED_RETRIES}회 재시도)"
+    )
+
+
+async def aask_structured(prompt, schema, prompt_file, semantic_text=None, guard=""):
+    cache = get_llm_cache()
+    cached = await asyncio.to_thread(
+        cache.get, prompt_file, prompt, semantic_text, guard
+    )
+    parsed = _cached_model(schema, cached)
+    if parsed is not None:
+        record_tokens(_node_name(prompt_file), cached=True)
+        return parsed
+
+    llm = _structured_llm(schema)
+    messages = [HumanMessage(content=prompt)]
+    for _ in range(STRUCTURED_RETRIES + 1):
+        result = await llm.ainvoke(messages, config=_llm_config(prompt_file))
+        parsed = _structured_attempt(prompt_file, prompt, messages, result)
+        if parsed is not None:
+            await asyncio.to_thread(
+                cache.put,
+                prompt_file,
+                prompt,
+                parsed.model_dump_json(),
+                semantic_text,
+                guard,
+            )
+            return parsed
+    raise StructuredOutputError(
+        f"{schema.__name__} 출력 검증 실패 ({STRUCTURED_RETRIES}회 재시도)"
+    )
+
+
+def _cache_args(prompt_file, semantic_text, *guard_extra):
+    # 정확 일치 키는 렌더링된 프롬프트 해시라 자동으로 바뀌지만, 의미 유사도 재사용은
+    # guard 단위로 찾으므로 프롬프트 버전을 넣어 템플릿 수정 전 응답을 재사용하지 않게 한다
+    return {
+        "prompt_file": prompt_file,
+        "semantic_text": semantic_text,
+        "guard": cache_guard(
+            semantic_text, *guard_extra, prompts.version(prompt_file)
+        ),
+    }
 
 
 # --- 1. 상태(State) 정의 ---
@@ -36,35 +262,87 @@ class AgentState(TypedDict):
     context: str
     risk_level: str
     risk_score: int
+    risk_report: str
     final_output: str
+    reason_summary: str
     pdf_path: str
+    pdf_bytes: bytes
+    permit_id: str
+    # pdf_job: generate_permit_pdf 인자 (admin_agent가 만들고 permit_pdf가 렌더링)
+    # defer_pdf가 True면 permit_pdf는 건너뛴다 (batch_runner가 모아서 대량 렌더링)
+    defer_pdf: bool
+    pdf_job: dict
     needs_more_info: bool
+    work_title: str
+    # parallel 모드: coordinator가 시작한 선행 검색 (Future / asyncio.Task)
+    prefetch: object
 
 
 # --- 2. 노드(Agent) 정의 ---
 
 
-def coordinator(state: AgentState):
-    """Main Orchestrator: 의도 파악 및 정보 병합"""
+# 각 LLM 노드는 프롬프트 생성 / 응답 처리를 sync·async 버전이 공유한다.
+
+
+def _coordinator_prompt(state):
     print("🤖 [Coordinator] 지능형 분석 중...")
 
-    # [수정] 파일에서 프롬프트 로드
-    prompt = load_prompt(
-        "coordinator.md",
-        chat_history=state.get("chat_history", "없음"),
-        user_input=state["user_input"],
-    )
+    return load_prompt("coordinator.md", user_input=state["user_input"])
+
+
+def _coordinator_cache(state):
+    # coordinator는 현재 입력만 본다
+    return _cache_args("coordinator.md", state["user_input"])
+
+
+# 게이트 판정을 얻지 못했을 때의 응답 (통과시키지 않고 안전 조치를 다시 묻는다)
+GATE_FALLBACK_QUESTION = (
+    "안전 조치 확인을 완료하지 못했습니다. 작업 내용과 안전 조치(환기, 소화기, "
+    "감시인, 보호구 등) 계획을 한 문장으로 다시 알려주세요."
+)
 
-    response = llm.invoke([HumanMessage(content=prompt)]).content
 
-    if response.startswith("MISSING"):
-        question = response.replace("MISSING:", "").strip()
-        return {"needs_more_info": True, "messages": [question]}
+def _coordinator_result(decision):
+    if decision is None:
+        # 게이트는 실패 시 닫힌다 (안전 조치 미확인 작업을 위험성 평가로 넘기지 않음)
+        return {"needs_more_info": True, "messages": [GATE_FALLBACK_QUESTION]}
+    if decision.status == "MISSING":
+        return {"needs_more_info": True, "messages": [decision.question.strip()]}
 
     return {"needs_more_info": False}
 
 
+def coordinator(state: AgentState):
+    """Main Orchestrator: 의도 파악 및 정보 병합"""
+    try:
+        decision = ask_structured(
+            _coordinator_prompt(state), GateDecision, **_coordinator_cache(state)
+        )
+    except StructuredOutputError as e:
+        print(f"⚠️ [Coordinator] 판정 형식 오류, 추가 정보 요청: {e}")
+        decision = None
+    return _coordinator_result(decision)
+
+
+async def acoordinator(state: AgentState):
+    try:
+        decision = await aask_structured(
+            _coordinator_prompt(state), GateDecision, **_coordinator_cache(state)
+        )
+    except StructuredOutputError as e:
+        print(f"⚠️ [Coordinator] 판정 형식 오류, 추가 정보 요청: {e}")
+        decision = None
+    return _coordinator_result(decision)
+
+
 def regulation_finder(state: AgentState):
+    prefetch = state.get("prefetch")
+    if prefetch is not None:
+        return prefetch.result()
+    return _find_regulations(state)
+
+
+def _find_regulations(state):
     print("📚 [Regulation Agent] 스마트 하이브리드 검색 수행 중...")
 
     current_input = state["user_input"]
@@ -72,143 +350,178 @@ def regulation_finder(state: AgentState):
     # 대화 기록과 현재 입력을 합쳐서 전체 맥락 파악
     full_context = f"{history} {current_input}"
 
+    # 문맥 전체를 위험 요소 사전 오토마톤으로 한 번만 훑는다 (화학물질/작업 유형/장비)
+    detected = get_lexicon().detect(full_context)
+
     # ---------------------------------------------------------
-    # [1] 화학물질 정밀 타겟팅 (파일명 필터링)
+    # [1] 화학물질 정밀 타겟팅 (MSDS 메타데이터 필터 검색)
     # ---------------------------------------------------------
-    target_chemicals = ["톨루엔", "벤젠", "아세톤", "황산", "염산", "수소", "질소"]
-    detected_chem = ""
-
-    # 문맥 전체에서 화학물질 감지
-    for chem in target_chemicals:
-        if chem in full_context:
-            detected_chem = chem
-            break
-
-    docs_msds = []
-    if detected_chem:
-        print(f"🎯 화학물질 감지: {detected_chem} -> 파일명 일치 문서만 선별")
-        q_msds = f"{detected_chem} MSDS 물질안전보건자료 경고표지"
-        raw_msds_docs = retriever.invoke(q_msds)
-
-        # 검색된 문서 중 파일명에 실제 '물질명'이 포함된 것만 남김
-        for doc in raw_msds_docs:
-            filename = os.path.basename(doc.metadata.get("source", ""))
-            if detected_chem in filename:
-                docs_msds.append(doc)
+    # 질의를 모두 만든 뒤 한 번의 임베딩 + 한 번의 FAISS 검색으로 처리
+    # (SOP/MSDS 고정 질의는 인덱스 로드 시 미리 계산된 결과를 사용)
+    queries = {}
+    filters = {}
+
+    for chem in detected["chemical"]:
+        print(f"🎯 화학물질 감지: {chem} -> 해당 MSDS 안에서만 검색")
+        queries[f"msds:{chem}"] = msds_query(chem)
+        filters[f"msds:{chem}"] = msds_filter(chem)
 
     # ---------------------------------------------------------
     # [2] 사내 규정 (S-Chem) 독립 검색
     # ---------------------------------------------------------
     print("🏢 사내 규정(S-Chem) 검색")
-    q_sop = "S Chem Safety Regulation_v2 사내 안전 작업 허가 지침 절차"
-    docs_sop = retriever.invoke(q_sop)
+    queries["sop"] = SOP_QUERY
+    filters["sop"] = SOP_FILTER
 
     # ---------------------------------------------------------
     # [3] 법령 및 가이드 (상황별 키워드 주입)
     # ---------------------------------------------------------
-    if any(keyword in full_context for keyword in ["탱크", "밀폐", "청소", "맨홀"]):
+    if {"밀폐공간", "청소/세척"} & set(detected["work_type"]):
         print("🕳️ 밀폐공간/탱크 작업 감지 -> 기술지침 검색 강화")
-        q_gen = f"밀폐공간 작업 프로그램 수립 및 시행에 관한 기술지침 {current_input}"
+        queries["gen"] = f"밀폐공간 작업 프로그램 수립 및 시행에 관한 기술지침 {current_input}"
     else:
         print("⚖️ 일반 법령 검색")
-        q_gen = f"산업안전보건법 안전 보건 규칙 {current_input}"
+        queries["gen"] = f"산업안전보건법 안전 보건 규칙 {current_input}"
+    filters["gen"] = LAW_FILTER
 
-    docs_gen = retriever.invoke(q_gen)
+    # ---------------------------------------------------------
+    # [SIF] 고위험요인 목록 유사 사례 (벡터 검색 없이 키워드 색인 조회)
+    # ---------------------------------------------------------
+    sif_docs = [_format_sif(e) for e in _sif_matches(state)[:SIF_CONTEXT_LIMIT]]
+
+    retriever = get_retriever()
+    if retriever is None:
+        if sif_docs:
+            return {"context": "\n\n---\n\n".join(sif_docs)}
+        return {"context": NO_REGULATION}
+
+    k = retriever.search_kwargs.get("k", 6)
+    # 재순위를 쓰면 후보를 넉넉히 가져와 cross-encoder로 k개만 남긴다
+    reranker = get_reranker()
+    fetch_k = max(k, RERANK_CANDIDATES) if reranker else k
+    names = list(queries)
+    candidates = retrieve_many(
+        retriever.vectorstore,
+        [queries[n] for n in names],
+        fetch_k,
+        [filters[n] for n in names],
+    )
+    if reranker:
+        # 고정 질의(SOP/MSDS)는 현재 작업 설명을 붙여 작업과 관련된 청크가 위로 오게 한다
+        rerank_queries = [
+            queries[n] if n == "gen" else f"{queries[n]} {current_input}"
+            for n in names
+        ]
+        candidates = reranker.rerank_many(rerank_queries, candidates, k)
+    results = dict(zip(names, candidates))
 
     # ---------------------------------------------------------
-    # [4] 결과 병합 (우선순위: MSDS -> SOP -> 법령)
+    # [4] 컨텍스트 조립 (우선순위: MSDS -> SOP -> 법령, 순위별로 번갈아 선정)
+    #     근사 중복 제거 + 같은 페이지 연속 청크 병합 + 토큰 예산 (context_assembler.py)
     # ---------------------------------------------------------
-    combined_docs = []
+    groups = [results[f"msds:{chem}"] for chem in detected["chemical"]]
+    groups += [results["sop"], results["gen"]]
+    context_text, stats = assemble(groups, extra=sif_docs)
+
+    print(
+        f"🔍 [컨텍스트] 후보 {stats['candidates']}개 -> {stats['passages']}개 블록, "
+        f"{stats['tokens']} 토큰 (중복 {stats['duplicates']}, 병합 {stats['merged']}, "
+        f"예산 초과 {stats['over_budget']})"
+    )
 
-    # 1순위: 필터링된 MSDS
-    if docs_msds:
-        combined_docs.extend(docs_msds[:2])
+    if not context_text:
+        return {"context": NO_REGULATION}
+    return {"context": context_text}
 
-    # 2순위: 사내 규정 (SOP)
-    if docs_sop:
-        combined_docs.extend(docs_sop[:2])
 
-    # 3순위: 법령/기술지침
-    if docs_gen:
-        combined_docs.extend(docs_gen[:3])
+def _sif_matches(state):
+    sif, _ = get_structured_tables()
+    return sif.match(_user_text(state))
 
-    # ---------------------------------------------------------
-    # [5] 중복 제거
-    # ---------------------------------------------------------
-    seen_sources = set()
-    unique_docs = []
-
-    for doc in combined_docs:
-        source = os.path.basename(doc.metadata.get("source", "unknown"))
-        if source not in seen_sources:
-            seen_sources.add(source)
-            unique_docs.append(doc)
-
-    # 최종 6개 문서 선정
-    final_docs = unique_docs[:6]
-
-    # [디버깅] 최종 선정된 문서 목록 출력
-    print("🔍 [최종 선정 문서 목록]")
-    for d in final_docs:
-        print(f"   - {os.path.basename(d.metadata.get('source'))}")
-
-    if not final_docs:
-        return {"context": "관련 규정을 찾을 수 없습니다."}
-
-    # 컨텍스트 문자열 생성
-    formatted_docs = []
-    for doc in final_docs:
-        filename = os.path.basename(doc.metadata.get("source", "파일_없음"))
-        content = doc.page_content.strip()
-        formatted_docs.append(f"📄 [출처: {filename}]\n{content}")
-
-    context_text = "\n\n---\n\n".join(formatted_docs)
-    return {"context": context_text}
 
+def _format_sif(entry):
+    return (
+        f"📋 [출처: SIF 고위험요인 목록 {entry['id']}]\n"
+        f"고위험작업: {entry['work']}\n"
+        f"기인물: {entry['agent']} (유사 사례 {entry['cases']}건)\n"
+        f"재해유발요인: {entry['cause']}\n"
+        f"감소대책: {entry['countermeasure']}"
+    )
 
-def risk_analyst(state: AgentState):
-    """Fine-Kinney 알고리즘 기반 정량적 위험성 평가"""
-    print("⚠️ [Risk Analyst] 위험도 계산 중 (Fine-Kinney)...")
 
+async def aregulation_finder(state: AgentState):
+    prefetch = state.get("prefetch")
+    if prefetch is not None:
+        return await prefetch
+    # 임베딩/FAISS/BM25 검색은 블로킹 CPU 작업이므로 스레드로 넘긴다
+    return await asyncio.to_thread(_find_regulations, state)
+
+
+def _safe_find_regulations(state):
+    """선행 검색용: 실패해도 요청 전체를 실패시키지 않고 '규정 없음'으로"""
+    try:
+        return _find_regulations(state)
+    except Exception as e:
+        print(f"⚠️ [Regulation Agent] 검색 실패: {e}")
+        return {"context": NO_REGULATION}
+
+
+def prefetching_coordinator(state: AgentState):
+    """parallel 모드: 규정 검색을 먼저 시작해 두고 게이트 판정"""
+    future = _prefetch_executor.submit(_safe_find_regulations, state)
+    try:
+        result = coordinator(state)
+    except BaseException:
+        future.cancel()
+        raise
+    if result["needs_more_info"]:
+        # 아직 시작 전이면 취소, 실행 중이면 결과만 버린다 (LLM 호출 없음)
+        future.cancel()
+        return result
+    return {**result, "prefetch": future}
+
+
+async def aprefetching_coordinator(state: AgentState):
+    task = asyncio.create_task(asyncio.to_thread(_safe_find_regulations, state))
+    try:
+        result = await acoordinator(state)
+    except BaseException:
+        task.cancel()
+        raise
+    if result["needs_more_info"]:
+        task.cancel()
+        return result
+    return {**result, "prefetch": task}
+
+
+def _risk_prompt(state):
     # 파일에서 프롬프트 로드
-    prompt = load_prompt(
+    return load_prompt(
         "risk_analyst.md",
         chat_history=state.get("chat_history", "없음"),
         user_input=state["user_input"],
         context=state["context"],
     )
 
-    response = llm.invoke([HumanMessage(content=prompt)]).content
 
-    try:
-        # 정규표현식 파싱
-        p_match = re.search(r"P\s*[:=]\s*([\d\.]+)", response)
-        e_match = re.search(r"E\s*[:=]\s*([\d\.]+)", response)
-        c_match = re.search(r"C\s*[:=]\s*([\d\.]+)", response)
-        r_match = re.search(r"R\s*[:=]\s*([\d\.]+)", response)
-
-        p_score = float(p_match.group(1)) if p_match else 0
-        e_score = float(e_match.group(1)) if e_match else 0
-        c_score = float(c_match.group(1)) if c_match else 0
-
-        if r_match:
-            r_score = float(r_match.group(1))
-        else:
-            r_score = p_score * e_score * c_score
-
-        type_match = re.search(r"재해유형\s*[:=]\s*(.+)", response)
-        accident_type = type_match.group(1).strip() if type_match else "복합 위험"
-
-        if r_score >= 320:
-            level = "Very High"
-        elif r_score >= 160:
-            level = "High"
-        elif r_score >= 70:
-            level = "Medium"
-        else:
-            level = "Low"
-
-        final_report = f"""
+def _risk_cache(state):
+    return _cache_args(
+        "risk_analyst.md", f"{state.get('chat_history', '')} {state['user_input']}"
+    )
+
+
+def _user_text(state):
+    """
+    대화 기록 중 사용자 발화(요약된 이전 턴 포함) + 현재 입력
+    (AI 질문 속 '환기, 소화기'가 조치로 잡히지 않도록)
+    """
+    # 문장 경계를 남겨 fine_kinney의 절 단위 부정 판정이 턴을 넘어가지 않게 한다
+    turns = user_statements(state.get("chat_history", "")) + [state["user_input"]]
+    return ". ".join(turn.rstrip(". ") for turn in turns)
+
+
+def _risk_report(accident_type, p_score, e_score, c_score, r_score, level, basis=""):
+    report = f"""
 **🎯 Fine-Kinney 위험성 평가 결과**
 * **재해 형태:** {accident_type}
 * **계산 공식:** $Risk = P \\times E \\times C$
@@ -218,75 +531,207 @@ def risk_analyst(state: AgentState):
     * 강도(C): **{c_score}**
 * **최종 위험도(R):** <span style='color:red; font-size:1.2em; font-weight:bold;'>{int(r_score)}점</span> ({level})
 """
-    except Exception as e:
-        print(f"파싱 에러: {e} / LLM 응답: {response}")
-        r_score = 0
-        level = "Error"
-        final_report = "위험성 평가 데이터를 추출할 수 없습니다."
+    if basis:
+        report += f"* **평가 근거:** {basis}\n"
+    return report
+
 
+def _risk_state(state, r_score, level, final_report):
+    # 규정 컨텍스트는 그대로 두고 평가 결과만 별도 키로 (admin_agent에서 합침)
     return {
         "risk_score": int(r_score),
         "risk_level": level,
-        "context": state["context"] + "\n\n" + final_report,
+        "risk_report": final_report,
     }
 
 
-def admin_agent(state: AgentState):
-    """최종 PDF 생성 및 메시지 작성 (프롬프트 파일 분리 버전)"""
-    print("📝 [Admin Agent] 작업 내용 요약 및 PDF 생성 중...")
+def _stat_summary(accident_type):
+    """산업재해현황 통계에서 재해유형에 해당하는 최신 행 하나"""
+    _, stats = get_structured_tables()
+    rows = stats.lookup(accident_type, limit=1)
+    if not rows:
+        return ""
+    row = rows[0]
+    return f"{row['label']} {' / '.join(row['values'])} ({row['source']})"
 
-    score = state["risk_score"]
-    context = state["context"]
-    history = state.get("chat_history", "")
-    last_input = state["user_input"]
 
-    # ------------------------------------------------------------------
-    # [STEP 1] 대화 기록을 바탕으로 '통합 작업 내용' 요약하기
-    # ------------------------------------------------------------------
-    summary_prompt = load_prompt(
-        "work_summary.md", history=history, last_input=last_input
+def _rule_assessment(state):
+    """
+    규칙 엔진(fine_kinney.py)으로 바로 계산. 규칙에 없으면 None -> LLM 평가
+    (SIF 유사 사례는 regulation_finder가 근거 자료에 넣어 LLM이 참고)
+    """
+    result = assess(_user_text(state))
+    if result is None:
+        print("🧠 규칙에 없거나 안전조치가 불확실한 작업 -> LLM 평가")
+        return None
+
+    print(f"⚡ 규칙 기반 산정: R={result['r']} ({result['level']})")
+    report = _risk_report(
+        result["accident_type"],
+        result["p"],
+        result["e"],
+        result["c"],
+        result["r"],
+        result["level"],
+        result["basis"],
     )
+    stat = _stat_summary(result["accident_type"])
+    if stat:
+        report += f"* **재해 통계:** {stat}\n"
+    return _risk_state(state, result["r"], result["level"], report)
+
+
+def _risk_result(state, assessment):
+    if assessment is None:
+        # 점수 없이 0점(Low)으로 통과시키지 않고 Error -> admin_agent가 보류 처리
+        return _risk_state(
+            state, 0, "Error", "위험성 평가 데이터를 추출할 수 없습니다."
+        )
+
+    # R은 모델에게 계산시키지 않고 검증된 P/E/C로 직접 계산
+    a = assessment
+    r_score = a.p * a.e * a.c
+    level = risk_level(r_score)
+    final_report = _risk_report(a.accident_type, a.p, a.e, a.c, r_score, level)
+    return _risk_state(state, r_score, level, final_report)
+
+
+def risk_analyst(state: AgentState):
+    """Fine-Kinney 알고리즘 기반 정량적 위험성 평가 (규칙 우선, 규칙 밖이면 LLM)"""
+    print("⚠️ [Risk Analyst] 위험도 계산 중 (Fine-Kinney)...")
+    rule = _rule_assessment(state)
+    if rule:
+        return rule
+    try:
+        assessment = ask_structured(
+            _risk_prompt(state), RiskAssessment, **_risk_cache(state)
+        )
+    except StructuredOutputError as e:
+        print(f"❌ [Risk Analyst] LLM 평가 형식 오류: {e}")
+        assessment = None
+    return _risk_result(state, assessment)
+
+
+async def arisk_analyst(state: AgentState):
+    print("⚠️ [Risk Analyst] 위험도 계산 중 (Fine-Kinney)...")
+    rule = _rule_assessment(state)
+    if rule:
+        return rule
+    try:
+        assessment = await aask_structured(
+            _risk_prompt(state), RiskAssessment, **_risk_cache(state)
+        )
+    except StructuredOutputError as e:
+        print(f"❌ [Risk Analyst] LLM 평가 형식 오류: {e}")
+        assessment = None
+    return _risk_result(state, assessment)
+
+
+def _summary_prompt(history, last_input):
+    return load_prompt("work_summary.md", history=history, last_input=last_input)
 
-    # 만약 파일 로드 실패 시 대비용 안전장치
-    if not summary_prompt:
-        summary_prompt = f"대화기록: {history}\n마지막입력: {last_input}\n위 내용을 포함해 작업 내용을 한 문장으로 요약해."
 
+def _clean_title(response):
     # 작업 제목을 LLM이 다시 씁니다.
-    consolidated_work_info = (
-        llm.invoke([HumanMessage(content=summary_prompt)])
-        .content.replace('"', "")
-        .strip()
-    )
+    consolidated_work_info = response.replace('"', "").strip()
     print(f"📌 통합된 작업 내용: {consolidated_work_info}")
+    return consolidated_work_info
 
-    # ------------------------------------------------------------------
-    # [STEP 2] 위험 요인 분석
-    # ------------------------------------------------------------------
+
+def summarize_work(history, last_input):
+    """대화 기록을 바탕으로 '통합 작업 내용'(PDF 제목) 요약"""
+    return _clean_title(
+        ask_llm(
+            _summary_prompt(history, last_input),
+            **_cache_args("work_summary.md", f"{history} {last_input}"),
+        )
+    )
+
+
+async def asummarize_work(history, last_input):
+    return _clean_title(
+        await aask_llm(
+            _summary_prompt(history, last_input),
+            **_cache_args("work_summary.md", f"{history} {last_input}"),
+        )
+    )
+
+
+def summarize_history(summary, turns):
+    """chat_history.ChatHistory의 롤링 요약 갱신용"""
+    return ask_llm(
+        load_prompt("history_summary.md", summary=summary, turns=turns),
+        prompt_file="history_summary.md",
+    ).strip()
+
+
+def work_summary(state: AgentState):
+    """작업명 요약 (parallel 모드에서 위험성 평가와 동시에 실행)"""
+    print("🗂️ [Work Summary] 작업명 요약 중...")
+    try:
+        title = summarize_work(state.get("chat_history", ""), state["user_input"])
+    except Exception as e:
+        # 비우면 admin_agent가 직접 다시 요약한다
+        print(f"⚠️ [Work Summary] 작업명 요약 실패: {e}")
+        title = ""
+    return {"work_title": title}
+
+
+async def awork_summary(state: AgentState):
+    print("🗂️ [Work Summary] 작업명 요약 중...")
+    try:
+        title = await asummarize_work(
+            state.get("chat_history", ""), state["user_input"]
+        )
+    except Exception as e:
+        print(f"⚠️ [Work Summary] 작업명 요약 실패: {e}")
+        title = ""
+    return {"work_title": title}
+
+
+def _admin_context(state):
+    return f"{state['context']}\n\n{state.get('risk_report', '')}".strip()
+
+
+def _admin_prompt(consolidated_work_info, context):
     # admin_agent.md 파일 로드
-    reasoning_prompt_content = load_prompt(
+    return load_prompt(
         "admin_agent.md",
         user_input=consolidated_work_info,
         context=context,
     )
 
-    reason_summary = llm.invoke(
-        [HumanMessage(content=reasoning_prompt_content)]
-    ).content
 
-    # ------------------------------------------------------------------
-    # [STEP 3] PDF 생성
-    # ------------------------------------------------------------------
+def _admin_cache(state, consolidated_work_info):
+    # 같은 작업명이라도 위험도 점수가 다르면 조치 사항이 달라지므로 guard에 포함
+    return _cache_args("admin_agent.md", consolidated_work_info, state["risk_score"])
+
+
+def _pdf_job(state, reason_summary, consolidated_work_info):
+    # 요약된 작업 내용(consolidated_work_info)을 PDF 제목으로 전달
+    return {
+        "risk_score": state["risk_score"],
+        "risk_level": state["risk_level"],
+        "reason_summary": reason_summary,
+        "user_input": consolidated_work_info,
+        "permit_id": new_permit_id(),
+    }
+
+
+def _render_pdf(job):
     try:
-        # 요약된 작업 내용(consolidated_work_info)을 PDF 제목으로 전달
-        pdf_file = generate_permit_pdf(
-            score, state["risk_level"], reason_summary, consolidated_work_info
-        )
+        return generate_permit_pdf(**job)
     except Exception as e:
         print(f"PDF 에러: {e}")
-        pdf_file = None
+        return None
+
 
+def _admin_result(state, reason_summary, job):
+    score, level = state["risk_score"], state["risk_level"]
     # UI 메시지 생성
-    if score >= 160:
+    if level == "Error":
+        short_msg = "⛔ **보류 (평가 실패)**\n위험성 평가를 산정하지 못했습니다. 안전관리자 검토 필요."
+    elif score >= 160:
         short_msg = f"🚨 **반려 (High Risk / {score}점)**\n상세 사유는 PDF 확인 필요."
     elif score >= 70:
         short_msg = (
@@ -295,27 +740,138 @@ def admin_agent(state: AgentState):
     else:
         short_msg = f"✅ **승인 (Low Risk / {score}점)**\n작업 허가서 발급 완료."
 
-    return {"final_output": short_msg, "pdf_path": pdf_file}
+    return {
+        "final_output": short_msg,
+        "reason_summary": reason_summary,
+        "permit_id": job["permit_id"],
+        "pdf_job": job,
+    }
+
+
+def admin_agent(state: AgentState):
+    """최종 메시지와 허가서 문안 작성 (PDF 렌더링은 permit_pdf 노드)"""
+    print("📝 [Admin Agent] 작업 내용 요약 및 허가서 문안 작성 중...")
+
+    # ------------------------------------------------------------------
+    # [STEP 1] 대화 기록을 바탕으로 '통합 작업 내용' 요약하기
+    # (parallel 모드에서는 work_summary 노드가 위험성 평가와 동시에 계산해 둠)
+    # ------------------------------------------------------------------
+    consolidated_work_info = state.get("work_title") or summarize_work(
+        state.get("chat_history", ""), state["user_input"]
+    )
+
+    # ------------------------------------------------------------------
+    # [STEP 2] 위험 요인 분석 (UI에는 토큰 단위로 스트리밍)
+    # ------------------------------------------------------------------
+    reason_summary = ask_llm(
+        _admin_prompt(consolidated_work_info, _admin_context(state)),
+        **_admin_cache(state, consolidated_work_info),
+    )
+
+    job = _pdf_job(state, reason_summary, consolidated_work_info)
+    return _admin_result(state, reason_summary, job)
+
+
+async def aadmin_agent(state: AgentState):
+    print("📝 [Admin Agent] 작업 내용 요약 및 허가서 문안 작성 중...")
+
+    consolidated_work_info = state.get("work_title") or await asummarize_work(
+        state.get("chat_history", ""), state["user_input"]
+    )
+    reason_summary = await aask_llm(
+        _admin_prompt(consolidated_work_info, _admin_context(state)),
+        **_admin_cache(state, consolidated_work_info),
+    )
+
+    job = _pdf_job(state, reason_summary, consolidated_work_info)
+    return _admin_result(state, reason_summary, job)
+
+
+def _pdf_state(pdf):
+    if pdf is None:
+        return {}
+    return {"pdf_path": pdf["path"], "pdf_bytes": pdf["data"]}
+
+
+def permit_pdf(state: AgentState):
+    """[STEP 3] 문안이 확정되는 즉시 PDF 렌더링 (defer_pdf면 pdf_job만 남기고 건너뜀)"""
+    if state.get("defer_pdf"):
+        return {}
+    print("🖨️ [Admin Agent] 작업허가서 PDF 생성 중...")
+    return _pdf_state(_render_pdf(state["pdf_job"]))
 
 
-# --- 3. 그래프 연결 ---
-workflow = StateGraph(AgentState)
-workflow.add_node("coordinator", coordinator)
-workflow.add_node("regulation_finder", regulation_finder)
-workflow.add_node("risk_analyst", risk_analyst)
-workflow.add_node("admin_agent", admin_agent)
-workflow.set_entry_point("coordinator")
+async def apermit_pdf(state: AgentState):
+    if state.get("defer_pdf"):
+        return {}
+    # reportlab 렌더링이 이벤트 루프를 막지 않도록 PDF 전용 스레드 풀에서 실행
+    loop = asyncio.get_running_loop()
+    pdf = await loop.run_in_executor(_pdf_executor, _render_pdf, state["pdf_job"])
+    return _pdf_state(pdf)
 
 
 def check_info(state):
     return "end" if state["needs_more_info"] else "next"
 
 
-workflow.add_conditional_edges(
-    "coordinator", check_info, {"end": END, "next": "regulation_finder"}
-)
-workflow.add_edge("regulation_finder", "risk_analyst")
-workflow.add_edge("risk_analyst", "admin_agent")
-workflow.add_edge("admin_agent", END)
+def fan_out(state):
+    """parallel 모드: MISSING이면 바로 END, 통과하면 검색 결과 수신과 작업명 요약을 동시에"""
+    if state["needs_more_info"]:
+        return END
+    return ["regulation_finder", "work_summary"]
+
+
+SYNC_NODES = {
+    "coordinator": coordinator,
+    "prefetching_coordinator": prefetching_coordinator,
+    "regulation_finder": regulation_finder,
+    "risk_analyst": risk_analyst,
+    "admin_agent": admin_agent,
+    "permit_pdf": permit_pdf,
+    "work_summary": work_summary,
+}
+
+# ainvoke/astream 전용: 요청 하나당 스레드를 잡지 않고 이벤트 루프 하나에서 동시 처리
+ASYNC_NODES = {
+    "coordinator": acoordinator,
+    "prefetching_coordinator": aprefetching_coordinator,
+    "regulation_finder": aregulation_finder,
+    "risk_analyst": arisk_analyst,
+    "admin_agent": aadmin_agent,
+    "permit_pdf": apermit_pdf,
+    "work_summary": awork_summary,
+}
+
+
+def build_graph(mode=GRAPH_MODE, use_async=False):
+    nodes = ASYNC_NODES if use_async else SYNC_NODES
+    workflow = StateGraph(AgentState)
+    for name in ["regulation_finder", "risk_analyst", "admin_agent", "permit_pdf"]:
+        workflow.add_node(name, nodes[name])
+
+    if mode == "parallel":
+        # 노드 이름은 그대로 "coordinator" (UI/스트리밍이 이름으로 구분)
+        workflow.add_node("coordinator", nodes["prefetching_coordinator"])
+        workflow.add_node("work_summary", nodes["work_summary"])
+        workflow.add_edge(START, "coordinator")
+        workflow.add_conditional_edges(
+            "coordinator", fan_out, ["regulation_finder", "work_summary", END]
+        )
+        workflow.add_edge("regulation_finder", "risk_analyst")
+        workflow.add_edge(["risk_analyst", "work_summary"], "admin_agent")
+    else:
+        workflow.add_node("coordinator", nodes["coordinator"])
+        workflow.set_entry_point("coordinator")
+        workflow.add_conditional_edges(
+            "coordinator", check_info, {"end": END, "next": "regulation_finder"}
+        )
+        workflow.add_edge("regulation_finder", "risk_analyst")
+        workflow.add_edge("risk_analyst", "admin_agent")
+
+    workflow.add_edge("admin_agent", "permit_pdf")
+    workflow.add_edge("permit_pdf", END)
+    return workflow.compile()
+
 
-app_graph = workflow.compile()
+app_graph = build_graph()
+app_graph_async = build_graph(use_async=True)
@@ -0,0 +1,134 @@
+import os
+import json
+import math
+import time
+import faiss
+import numpy as np
+from index_store import read_index, write_index
+
+# 서빙용 인덱스 종류 (flat: 기존 정확 검색)
+INDEX_TYPES = ("flat", "ivf_flat", "ivf_pq", "hnsw", "sq8")
+RAG_INDEX_TYPE = os.getenv("RAG_INDEX_TYPE", "flat")
+
+# 검색 파라미터 (정확도 <-> 속도)
+RAG_NPROBE = int(os.getenv("RAG_NPROBE", "16"))
+RAG_EF_SEARCH = int(os.getenv("RAG_EF_SEARCH", "64"))
+
+# 학습에 쓰는 최대 벡터 수 / PQ 서브벡터 수 (1024차원 -> 64 x 16차원)
+MAX_TRAIN_VECTORS = 50_000
+PQ_SUBQUANTIZERS = 64
+HNSW_M = 32
+
+
+def factory_string(index_type, dim, num_vectors):
+    """index_factory 문자열. nlist는 벡터 수의 제곱근 4배 (FAISS 권장 범위)"""
+    nlist = max(1, min(65536, int(4 * math.sqrt(num_vectors))))
+    if index_type == "ivf_flat":
+        return f"IVF{nlist},Flat"
+    if index_type == "ivf_pq":
+        m = PQ_SUBQUANTIZERS if dim % PQ_SUBQUANTIZERS == 0 else 1
+        return f"IVF{nlist},PQ{m}x8"
+    if index_type == "hnsw":
+        return f"HNSW{HNSW_M},Flat"
+    if index_type == "sq8":
+        return "SQ8"
+    raise ValueError(f"지원하지 않는 인덱스 종류: {index_type} (가능: {INDEX_TYPES})")
+
+
+def set_search_params(index, nprobe=None, ef_search=None):
+    """IVF는 nprobe, HNSW는 efSearch 설정"""
+    nprobe = nprobe or RAG_NPROBE
+    ef_search = ef_search or RAG_EF_SEARCH
+    try:
+        faiss.extract_index_ivf(index).nprobe = nprobe
+    except RuntimeError:
+        pass
+    if hasattr(index, "hnsw"):
+        index.hnsw.efSearch = ef_search
+
+
+def search_params(index, selector=None):
+    """
+    인덱스 종류에 맞는 SearchParameters (IVF/HNSW는 전용 타입이 필요하고,
+    파라미터를 넘기면 인덱스 기본값 대신 이 값이 쓰이므로 nprobe/efSearch도 같이 채운다)
+    """
+    try:
+        ivf = faiss.extract_index_ivf(index)
+        return faiss.SearchParametersIVF(sel=selector, nprobe=ivf.nprobe)
+    except RuntimeError:
+        pass
+    if hasattr(index, "hnsw"):
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=index.hnsw.efSearch)
+    return faiss.SearchParameters(sel=selector)
+
+
+def index_nbytes(index):
+    return faiss.serialize_index(index).nbytes
+
+
+def build_ann_index(flat_index, index_type):
+    """
+    정확 인덱스(IndexFlat)의 벡터를 그대로 꺼내 학습/추가한다.
+    FAISS 위치가 동일하므로 index_to_docstore_id를 그대로 쓸 수 있다.
+    """
+    vectors = flat_index.reconstruct_n(0, flat_index.ntotal)
+    dim = flat_index.d
+    index = faiss.index_factory(
+        dim, factory_string(index_type, dim, len(vectors)), faiss.METRIC_L2
+    )
+
+    if not index.is_trained:
+        sample = vectors
+        if len(vectors) > MAX_TRAIN_VECTORS:
+            rng = np.random.default_rng(0)
+            sample = vectors[rng.choice(len(vectors), MAX_TRAIN_VECTORS, replace=False)]
+        index.train(sample)
+
+    index.add(vectors)
+    try:
+        # 필터 검색 시 위치별 벡터 복원(reconstruct)이 가능하도록
+        faiss.extract_index_ivf(index).make_direct_map()
+    except RuntimeError:
+        pass
+    set_search_params(index)
+    return index
+
+
+def load_or_build(db_path, flat_index, index_type, fingerprint):
+    """
+    faiss_db/ann_<type>.faiss 를 코퍼스 지문과 함께 저장/재사용한다.
+    증분 동기화는 항상 flat 인덱스에서 하고, ANN 인덱스는 파생물로 다시 만든다.
+    """
+    path = os.path.join(db_path, f"ann_{index_type}.faiss")
+    meta_path = path + ".json"
+
+    if os.path.exists(path) and os.path.exists(meta_path):
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("fingerprint") == fingerprint:
+            index = read_index(path, mmap=True)
+            set_search_params(index)
+            return index
+
+    print(f"🏗️ ANN 인덱스 학습 중 ({index_type})...")
+    started = time.time()
+    index = build_ann_index(flat_index, index_type)
+    write_index(index, path)
+    with open(meta_path, "w", encoding="utf-8") as f:
+        json.dump({"fingerprint": fingerprint, "ntotal": index.ntotal}, f)
+    print(
+        f"   ✅ {index.ntotal}개 벡터, {index_nbytes(index) / 1e6:.1f}MB "
+        f"(flat {index_nbytes(flat_index) / 1e6:.1f}MB), {time.time() - started:.1f}초"
+    )
+    return index
+
+
+def recall_at_k(exact_index, ann_index, queries, k):
+    """정확 인덱스 top-k 대비 ANN top-k 재현율 + 질의당 평균 지연(ms)"""
+    _, truth = exact_index.search(queries, k)
+    started = time.perf_counter()
+    _, found = ann_index.search(queries, k)
+    latency_ms = (time.perf_counter() - started) * 1000 / len(queries)
+
+    hits = sum(len(set(t) & set(f)) for t, f in zip(truth, found))
+    return hits / truth.size, latency_ms
@@ -1,5 +1,5 @@
 import streamlit as st
-import os
+import time
 import uuid
 import phoenix as px
 from phoenix.otel import register
@@ -25,7 +25,25 @@ phoenix_session = setup_phoenix()
 # ---------------------------------------------------------
 # [그래프 로드]
 # ---------------------------------------------------------
-from agent_graph import app_graph
+from agent_graph import app_graph, summarize_history
+from chat_history import ChatHistory
+from prompt_registry import get_prompts
+from resources import (
+    warm_up,
+    record_request,
+    get_llm_cache,
+    get_reranker,
+    metrics as resource_metrics,
+)
+
+
+@st.cache_resource
+def start_warm_up():
+    # 임베딩 모델/인덱스/LLM 클라이언트를 백그라운드에서 미리 로드 (UI는 바로 표시)
+    return warm_up(background=True)
+
+
+start_warm_up()
 
 st.set_page_config(page_title="SafeGuard-AI", layout="wide")
 st.title("🛡️ SafeGuard-AI")
@@ -43,6 +61,23 @@ if "current_session_id" not in st.session_state:
     st.session_state.sessions[new_id] = []
 
 
+# 세션별 프롬프트용 대화 기록 (롤링 요약 + 최근 턴, chat_history.py)
+if "histories" not in st.session_state:
+    st.session_state.histories = {}
+
+
+def get_history(session_id):
+    histories = st.session_state.histories
+    if session_id not in histories:
+        history = ChatHistory(summarizer=summarize_history)
+        # 기록 관리자 없이 만들어진 세션은 저장된 메시지로 한 번 재구성
+        for msg in st.session_state.sessions.get(session_id, []):
+            history.add(msg["role"], msg["content"])
+        history.compact()
+        histories[session_id] = history
+    return histories[session_id]
+
+
 def start_new_chat():
     """새로운 채팅 세션을 생성하고 전환"""
     new_id = str(uuid.uuid4())
@@ -86,11 +121,70 @@ with st.sidebar:
     st.header("🔧 개발자 도구")
     if phoenix_session:
         st.link_button("🚀 추적 대시보드 열기", phoenix_session.url)
+    if resource_metrics["time_to_ready"] is not None:
+        st.caption(f"🚀 준비 완료(warm-up): {resource_metrics['time_to_ready']}초")
+    if resource_metrics["first_request_seconds"] is not None:
+        st.caption(
+            f"⏱️ 첫 요청 처리 시간: {resource_metrics['first_request_seconds']}초"
+        )
+    for name, seconds in resource_metrics["init_seconds"].items():
+        st.caption(f"📦 {name} 초기화: {seconds}초")
+    # 프롬프트 파일을 고치면 버전 해시가 바뀌어 변경 전후 토큰 사용량을 구분할 수 있다
+    prompt_versions = get_prompts().versions()
+    for node, usage in resource_metrics["tokens"].items():
+        version = prompt_versions.get(f"{node}.md")
+        st.caption(
+            f"🔢 {node}{f' @{version}' if version else ''}: "
+            f"입력 {usage['input']:,} / 출력 {usage['output']:,} 토큰 "
+            f"({usage['calls']}회, 캐시 {usage['cached']}회)"
+        )
+    current_history = get_history(st.session_state.current_session_id)
+    st.caption(
+        f"🧾 대화 기록: {current_history.tokens} 토큰 "
+        f"(요약 {current_history.summary_tokens} + 최근 {len(current_history.turns)}턴)"
+    )
+    cache_stats = get_llm_cache().stats_summary()
+    st.caption(
+        f"♻️ LLM 캐시 적중률: {cache_stats['hit_rate']:.0%} "
+        f"(정확 {cache_stats['exact']} / 유사 {cache_stats['semantic']} / "
+        f"미스 {cache_stats['misses']})"
+    )
+    reranker = get_reranker()
+    if reranker is not None:
+        rerank_stats = reranker.stats_summary()
+        st.caption(
+            f"🧮 재순위 점수 캐시 적중률: {rerank_stats['hit_rate']:.0%} "
+            f"(지연 상한 초과 {rerank_stats['fallbacks']}회)"
+        )
 
 # ---------------------------------------------------------
 # [메인 채팅 UI]
 # ---------------------------------------------------------
 
+
+class TokenStream:
+    """stream_mode="messages" 토큰을 첫 토큰이 올 때 만든 placeholder에 이어 붙여 표시"""
+
+    def __init__(self, container, title):
+        self.container = container
+        self.title = title
+        self.placeholder = None
+        self.text = ""
+
+    def write(self, token):
+        if self.placeholder is None:
+            with self.container:
+                st.caption(self.title)
+                self.placeholder = st.empty()
+        self.text += token
+        self.placeholder.markdown(self.text + "▌")
+
+    def finish(self, text=None):
+        """커서를 지우고 최종 텍스트로 교체 (text가 None이면 스트리밍된 내용 유지)"""
+        if self.placeholder is not None:
+            self.placeholder.markdown(self.text if text is None else text)
+
+
 # 이전 대화 출력
 for msg in current_messages:
     with st.chat_message(msg["role"]):
@@ -106,6 +200,8 @@ if prompt := st.chat_input("작업 내용을 입력하세요..."):
     st.session_state.sessions[st.session_state.current_session_id].append(
         {"role": "user", "content": prompt}
     )
+    history = get_history(st.session_state.current_session_id)
+    history.add("user", prompt)
 
     with st.chat_message("user"):
         st.write(prompt)
@@ -115,12 +211,8 @@ if prompt := st.chat_input("작업 내용을 입력하세요..."):
         status_container = st.container(border=True)
         status_text = status_container.empty()
 
-        # 기억력 20턴으로 확장 (현재 세션 기준)
-        chat_history_text = ""
-
-        for msg in st.session_state.sessions[st.session_state.current_session_id][-20:]:
-            role_name = "User" if msg["role"] == "user" else "AI"
-            chat_history_text += f"{role_name}: {msg['content']}\n"
+        # 이전 대화 요약 + 최근 턴 (토큰 예산 안에서 턴마다 증분 갱신)
+        chat_history_text = history.render()
 
         inputs = {
             "user_input": prompt,
@@ -132,14 +224,52 @@ if prompt := st.chat_input("작업 내용을 입력하세요..."):
         }
 
         final_res = None
-        pdf_path = None
+        res_container = None
+        pdf_bytes = None
+        permit_id = None
         risk_score_val = 0
 
+        # 근거 자료는 coordinator가 통과시킨 뒤에만 표시 (MISSING이면 버림)
+        coordinator_ok = False
+        pending_context = None
+
+        def show_regulation(raw_context):
+            with status_container:
+                st.info("📚 **Regulation Agent:** 관련 규정 검색 완료.")
+                if "\n\n---\n\n" in raw_context:
+                    docs = raw_context.split("\n\n---\n\n")
+                else:
+                    docs = [raw_context]
+
+                with st.expander(f"🔍 근거 자료 ({len(docs)}건)"):
+                    for i, doc in enumerate(docs):
+                        lines = doc.split("\n")
+                        st.caption(f"**{i+1}. {lines[0]}**")
+
+        # 토큰 스트리밍 대상 (LLM 호출 메타데이터의 프롬프트 이름 -> 표시 위치)
+        # (risk_analyst/coordinator는 구조화 JSON 출력이라 스트리밍하지 않는다)
+        streams = {
+            "admin_agent": TokenStream(
+                status_container, "📝 Admin Agent: 허가서 사유 작성 중..."
+            ),
+        }
+
+        request_started = time.perf_counter()
         try:
             status_text.info("🚀 안전 분석 프로세스를 시작합니다...")
 
-            for output in app_graph.stream(inputs):
-                for key, value in output.items():
+            # updates: 노드 단위 결과 / messages: LLM 토큰 (GPT-4o 응답을 생성되는 대로 표시)
+            for mode, payload in app_graph.stream(
+                inputs, stream_mode=["updates", "messages"]
+            ):
+                if mode == "messages":
+                    chunk, metadata = payload
+                    stream = streams.get(metadata.get("prompt"))
+                    if stream is not None and chunk.content:
+                        stream.write(chunk.content)
+                    continue
+
+                for key, value in payload.items():
                     if key == "coordinator":
                         with status_container:
                             if value.get("needs_more_info"):
@@ -151,39 +281,32 @@ if prompt := st.chat_input("작업 내용을 입력하세요..."):
                                 st.success(
                                     "🤖 **Main Orchestrator:** 작업 의도 파악 완료."
                                 )
+                        if not value.get("needs_more_info"):
+                            coordinator_ok = True
+                            if pending_context is not None:
+                                show_regulation(pending_context)
 
                     elif key == "regulation_finder":
-                        with status_container:
-                            st.info("📚 **Regulation Agent:** 관련 규정 검색 완료.")
-                            raw_context = value["context"]
-                            if "\n\n---\n\n" in raw_context:
-                                docs = raw_context.split("\n\n---\n\n")
-                            else:
-                                docs = [raw_context]
-
-                            with st.expander(f"🔍 근거 자료 ({len(docs)}건)"):
-                                for i, doc in enumerate(docs):
-                                    lines = doc.split("\n")
-                                    st.caption(f"**{i+1}. {lines[0]}**")
+                        if coordinator_ok:
+                            show_regulation(value["context"])
+                        else:
+                            pending_context = value["context"]
 
                     elif key == "risk_analyst":
                         score = value.get("risk_score", 0)
                         risk_score_val = score
-                        try:
-                            if (
-                                "**🎯 Fine-Kinney 위험성 평가 결과**"
-                                in value["context"]
-                            ):
-                                report_content = value["context"].split(
-                                    "**🎯 Fine-Kinney 위험성 평가 결과**"
-                                )[1]
-                            else:
-                                report_content = ""
-                        except:
-                            report_content = ""
+                        report_content = value.get("risk_report", "").replace(
+                            "**🎯 Fine-Kinney 위험성 평가 결과**", ""
+                        )
 
                         with status_container:
-                            if score >= 160:
+                            # 평가 실패(Error)는 0점이라도 허용 범위로 보이지 않게 먼저 처리
+                            if value.get("risk_level") == "Error":
+                                st.warning(
+                                    "⛔ **Risk Analyst:** 평가 실패 "
+                                    "(점수 미산정 - 작업 허가 보류)"
+                                )
+                            elif score >= 160:
                                 st.error(
                                     f"⚠️ **Risk Analyst:** 고위험 판정 (Score: {score})"
                                 )
@@ -194,34 +317,50 @@ if prompt := st.chat_input("작업 내용을 입력하세요..."):
                             st.markdown(report_content, unsafe_allow_html=True)
 
                     elif key == "admin_agent":
+                        # 캐시 적중이면 스트리밍된 토큰이 없으므로 한 번에 표시
+                        if streams["admin_agent"].placeholder is None:
+                            with status_container:
+                                st.markdown(value.get("reason_summary", ""))
+                        streams["admin_agent"].finish()
                         with status_container:
-                            st.write("📝 **Admin Agent:** 최종 문서 생성 중...")
+                            st.write("📝 **Admin Agent:** 작업허가서 PDF 생성 중...")
                         final_res = value.get("final_output", "결과 생성 실패")
-                        pdf_path = value.get("pdf_path", None)
+                        permit_id = value.get("permit_id")
+                        # PDF를 기다리지 않고 판정부터 표시
+                        res_container = st.container(border=True)
+                        res_container.markdown(final_res)
+
+                    elif key == "permit_pdf" and value:
+                        pdf_bytes = value.get("pdf_bytes")
 
             status_text.empty()
+            record_request(time.perf_counter() - request_started)
 
         except Exception as e:
             st.error(f"에러 발생: {e}")
 
         if final_res:
-            res_container = st.container(border=True)
-            res_container.markdown(final_res)
+            if res_container is None:
+                res_container = st.container(border=True)
+                res_container.markdown(final_res)
 
             if risk_score_val >= 70:
                 st.info(
                     "💡 **Tip:** 안전 조치(환기, 감시인 배치, 접지 등)를 추가하여 다시 입력하면 위험도가 재평가됩니다."
                 )
 
-            if pdf_path and os.path.exists(pdf_path):
-                with open(pdf_path, "rb") as file:
-                    res_container.download_button(
-                        label="📄 작업허가서(PDF) 다운로드",
-                        data=file,
-                        file_name=os.path.basename(pdf_path),
-                        mime="application/pdf",
-                    )
+            if pdf_bytes:
+                # 렌더링된 bytes를 그대로 전달 (outputs/ 보관본을 다시 읽지 않음)
+                res_container.download_button(
+                    label="📄 작업허가서(PDF) 다운로드",
+                    data=pdf_bytes,
+                    file_name=f"{permit_id}.pdf",
+                    mime="application/pdf",
+                )
 
             st.session_state.sessions[st.session_state.current_session_id].append(
                 {"role": "assistant", "content": final_res, "is_html": True}
             )
+            history.add("assistant", final_res)
+            # 예산을 넘어 밀려난 턴이 있으면 응답 표시 후에 요약에 반영
+            history.compact()
@@ -0,0 +1,269 @@
+"""
+작업 지시서(JSA/작업 오더) 일괄 평가 - 한 건씩 채팅하는 대신 파일 단위로 그래프 실행
+
+    python batch_runner.py orders.csv --column 작업내용
+    python batch_runner.py orders.jsonl --column work --workers 8 --rpm 300
+
+결과는 <입력>_results.csv (또는 --output)에 원본 열 + 평가 열로 저장된다.
+PDF는 평가가 모두 끝난 뒤 프로세스 풀에서 한꺼번에 렌더링해 outputs/<허가 번호>.pdf로 저장한다.
+중간에 중단되어도 같은 명령을 다시 실행하면 체크포인트(<출력>.checkpoint.jsonl)에서 이어서 처리한다.
+"""
+
+import os
+import csv
+import json
+import time
+import asyncio
+import hashlib
+import argparse
+import statistics
+
+BATCH_WORKERS = int(os.getenv("BATCH_WORKERS", "8"))
+RESULT_FIELDS = [
+    "상태",
+    "허가번호",
+    "작업명",
+    "위험등급",
+    "위험점수",
+    "판정",
+    "PDF",
+    "처리시간(초)",
+]
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+
+# --- 입출력 ---
+def read_orders(path):
+    if path.endswith(".jsonl"):
+        with open(path, "r", encoding="utf-8") as f:
+            return [json.loads(line) for line in f if line.strip()]
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        return list(csv.DictReader(f))
+
+
+def write_results(path, rows, results):
+    # "_"로 시작하는 키(렌더링 작업 등)는 내부용
+    results = [{k: v for k, v in r.items() if not k.startswith("_")} for r in results]
+    if path.endswith(".jsonl"):
+        with open(path, "w", encoding="utf-8") as f:
+            for row, result in zip(rows, results):
+                f.write(json.dumps({**row, **result}, ensure_ascii=False) + "\n")
+        return
+    fields = list(rows[0]) + [f for f in RESULT_FIELDS if f not in rows[0]]
+    with open(path, "w", encoding="utf-8-sig", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=fields, extrasaction="ignore")
+        writer.writeheader()
+        for row, result in zip(rows, results):
+            writer.writerow({**row, **result})
+
+
+def row_key(index, text):
+    """행 번호 + 작업 내용 해시 (입력 파일이 바뀌면 해당 행은 다시 평가)"""
+    digest = hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+    return f"{index}:{digest}"
+
+
+def load_checkpoint(path):
+    done = {}
+    if not os.path.exists(path):
+        return done
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                # 강제 종료 시 마지막 줄이 잘려 있을 수 있다
+                continue
+            done[entry["key"]] = entry["result"]
+    return done
+
+
+def summarize_state(state, seconds):
+    """그래프 최종 state -> 결과 열"""
+    if state.get("needs_more_info"):
+        messages = state.get("messages") or [""]
+        return {
+            "상태": "정보 부족",
+            "판정": messages[-1],
+            "처리시간(초)": round(seconds, 2),
+        }
+    return {
+        "상태": "완료",
+        "허가번호": state.get("permit_id", ""),
+        "작업명": state.get("work_title", ""),
+        "위험등급": state.get("risk_level", ""),
+        "위험점수": state.get("risk_score", ""),
+        "판정": (state.get("final_output") or "").split("\n", 1)[0],
+        "PDF": state.get("pdf_path") or "",
+        "처리시간(초)": round(seconds, 2),
+        "_pdf_job": state.get("pdf_job"),
+    }
+
+
+# --- 실행 ---
+async def run_batch(texts, keys, done, checkpoint_path, workers):
+    """
+    체크포인트에 없는 행만 워커 workers개로 동시 처리한다.
+    같은 작업 내용은 한 번만 실행하고 평가 결과를 공유한다. (검색/LLM 캐시는 프로세스 전체가 공유)
+    허가 번호와 PDF는 행마다 따로 발급한다.
+    반환: (행별 결과, 이번 실행에서 처리한 행의 처리 시간 목록)
+    """
+    from agent_graph import app_graph_async
+    from pdf_gen import new_permit_id
+
+    semaphore = asyncio.Semaphore(workers)
+    shared = {}
+    latencies = []
+
+    async def evaluate(text):
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                state = await app_graph_async.ainvoke(
+                    {"user_input": text, "chat_history": "", "defer_pdf": True}
+                )
+                result = summarize_state(state, time.perf_counter() - started)
+            except Exception as e:
+                result = {"상태": "오류", "판정": str(e)[:200]}
+            latencies.append(time.perf_counter() - started)
+            return result
+
+    with open(checkpoint_path, "a", encoding="utf-8") as checkpoint:
+
+        async def one(key, text):
+            if key in done:
+                return done[key]
+            if not text.strip():
+                return {"상태": "건너뜀", "판정": "작업 내용 없음"}
+            first = text not in shared
+            if first:
+                shared[text] = asyncio.ensure_future(evaluate(text))
+            result = dict(await shared[text])
+            job = result.get("_pdf_job")
+            if job and not first:
+                # 같은 작업 내용의 다른 지시서: 평가는 공유하고 허가서는 새 번호로
+                job = {**job, "permit_id": new_permit_id()}
+                result.update({"허가번호": job["permit_id"], "_pdf_job": job})
+            # 오류 행은 기록하지 않아 다음 실행에서 다시 시도
+            if result["상태"] != "오류":
+                checkpoint.write(
+                    json.dumps({"key": key, "result": result}, ensure_ascii=False) + "\n"
+                )
+                checkpoint.flush()
+            return result
+
+        results = await asyncio.gather(*(one(k, t) for k, t in zip(keys, texts)))
+    return results, latencies
+
+
+def render_pending(results, keys, checkpoint_path, processes):
+    """
+    PDF가 아직 없는 행(이번 실행분 + 렌더링 전에 중단된 체크포인트 행)을 한꺼번에 렌더링한다.
+    허가 번호가 평가 시점에 정해지므로 다시 렌더링해도 같은 파일에 덮어쓴다.
+    """
+    from pdf_gen import render_many
+
+    jobs = {}
+    for result in results:
+        job = result.get("_pdf_job")
+        if job and not result.get("PDF"):
+            jobs.setdefault(job["permit_id"], job)
+    if not jobs:
+        return
+
+    rendered = dict(zip(jobs, render_many(list(jobs.values()), processes)))
+    with open(checkpoint_path, "a", encoding="utf-8") as checkpoint:
+        for key, result in zip(keys, results):
+            pdf = rendered.get((result.get("_pdf_job") or {}).get("permit_id"))
+            if pdf is None:
+                continue
+            result["PDF"] = pdf["path"]
+            # 같은 key의 뒤쪽 줄이 앞 줄을 덮어쓰므로 재개 시 다시 렌더링하지 않는다
+            checkpoint.write(
+                json.dumps({"key": key, "result": result}, ensure_ascii=False) + "\n"
+            )
+
+
+def main(
+    path, column, output=None, workers=BATCH_WORKERS, rpm=None, processes=None
+):
+    if rpm:
+        # resources.get_llm()이 처음 호출되기 전에 설정해야 rate limiter가 붙는다
+        os.environ["LLM_RPM"] = str(rpm)
+    from resources import warm_up, get_llm_cache, metrics
+
+    rows = read_orders(path)
+    if not rows:
+        print("⚠️ 평가할 행이 없습니다.")
+        return []
+    if column not in rows[0]:
+        print(f"⚠️ '{column}' 열이 없습니다. (열: {', '.join(rows[0])})")
+        return []
+
+    output = output or f"{os.path.splitext(path)[0]}_results.csv"
+    checkpoint_path = output + ".checkpoint.jsonl"
+    texts = [str(row.get(column) or "") for row in rows]
+    keys = [row_key(i, text) for i, text in enumerate(texts)]
+    done = load_checkpoint(checkpoint_path)
+    resumed = sum(key in done for key in keys)
+    print(
+        f"📦 {len(rows)}행 (체크포인트 완료 {resumed}행, 남은 {len(rows) - resumed}행) "
+        f"| 워커 {workers} | LLM {rpm or os.getenv('LLM_RPM') or '무제한'} rpm"
+    )
+
+    warm_up(background=False)
+    started = time.perf_counter()
+    results, latencies = asyncio.run(
+        run_batch(texts, keys, done, checkpoint_path, workers)
+    )
+    wall = time.perf_counter() - started
+
+    render_pending(results, keys, checkpoint_path, processes)
+    write_results(output, rows, results)
+
+    counts = {}
+    for result in results:
+        counts[result["상태"]] = counts.get(result["상태"], 0) + 1
+    processed = len(rows) - resumed
+    print(f"✅ 저장: {output} ({', '.join(f'{k} {v}' for k, v in counts.items())})")
+    if latencies:
+        print(
+            f"   ⏱️ {processed}행 / {wall:.1f}초 = {processed / wall * 60:.1f}행/분 | "
+            f"행당 p50 {statistics.median(latencies):.2f}s / "
+            f"p95 {percentile(latencies, 0.95):.2f}s "
+            f"(중복 제외 실행 {len(latencies)}건)"
+        )
+    cache = get_llm_cache().stats_summary()
+    tokens = metrics["tokens"].values()
+    print(
+        f"   ♻️ LLM 캐시 적중률 {cache['hit_rate']:.0%} | "
+        f"입력 {sum(u['input'] for u in tokens):,} / "
+        f"출력 {sum(u['output'] for u in tokens):,} 토큰"
+    )
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="작업 지시서 일괄 위험성 평가")
+    parser.add_argument("path", help="CSV 또는 JSONL 작업 지시서 파일")
+    parser.add_argument("--column", default="작업내용", help="작업 설명이 들어있는 열/키")
+    parser.add_argument("--output", default=None, help="결과 파일 (.csv / .jsonl)")
+    parser.add_argument(
+        "--workers", type=int, default=BATCH_WORKERS, help="동시 처리 행 수"
+    )
+    parser.add_argument(
+        "--rpm",
+        type=float,
+        default=None,
+        help="LLM 분당 요청 상한 (기본: LLM_RPM 또는 무제한)",
+    )
+    parser.add_argument(
+        "--processes", type=int, default=None, help="PDF 렌더링 프로세스 수"
+    )
+    args = parser.parse_args()
+
+    main(args.path, args.column, args.output, args.workers, args.rpm, args.processes)
@@ -0,0 +1,383 @@
+"""
+SafeGuard-AI 성능 측정 스크립트
+
+    python bench.py recall      # Dense vs Hybrid(BM25+Dense) recall@k / 지연 비교
+    python bench.py ann         # IVF/PQ/HNSW/SQ8 인덱스의 recall@k vs 메모리/지연
+    python bench.py concurrency # 가짜 LLM 서버로 sync(스레드) vs async 그래프 처리량 비교
+    python bench.py rerank      # 하이브리드 순서 vs cross-encoder 재순위 precision@k / 지연
+"""
+
+import os
+import json
+import time
+import asyncio
+import argparse
+import threading
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+from rag_setup import get_retriever, sync_index
+from retrieval import retrieve_many
+from reranker import Reranker, RERANK_CANDIDATES
+from ann_index import (
+    INDEX_TYPES,
+    build_ann_index,
+    set_search_params,
+    index_nbytes,
+    recall_at_k,
+)
+
+# (질의, 정답 조건) - 조건: 본문에 포함될 문자열(text) 또는 파일명 일부(source)
+EVAL_QUERIES = [
+    ("밀폐공간 작업 프로그램 수립 제619조", {"text": "제619조"}),
+    ("밀폐공간 산소 및 유해가스 농도 측정", {"source": "H-80-2021"}),
+    ("화재감시자 배치 제241조의2", {"text": "제241조의2"}),
+    ("용접 용단 작업 불티 비산 방지 조치", {"source": "F-1-2023"}),
+    ("사업주의 안전조치 의무 제38조", {"text": "제38조"}),
+    ("톨루엔 인화점 폭발한계", {"source": "톨루엔"}),
+    ("벤젠 노출기준 발암성", {"source": "벤젠"}),
+    ("작업 허가서 발급 및 승인 절차", {"source": "S Chem"}),
+    ("HAZOP 가이드워드 이탈 분석", {"source": "P-82-2023"}),
+    ("작업위험성평가 JSA 수행 절차", {"source": "P-140-2020"}),
+]
+
+
+def is_relevant(doc, expected):
+    if "text" in expected and expected["text"] in doc.page_content:
+        return True
+    source = os.path.basename(doc.metadata.get("source", ""))
+    return "source" in expected and expected["source"] in source
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+
+def bench_recall(k):
+    retriever = get_retriever()
+    if retriever is None:
+        return
+
+    print(f"\n📏 recall@{k} ({len(EVAL_QUERIES)}개 질의)")
+    for label, hybrid in [("dense", False), ("hybrid", True)]:
+        hits, latencies = 0, []
+        for query, expected in EVAL_QUERIES:
+            started = time.perf_counter()
+            docs = retrieve_many(retriever.vectorstore, [query], k, hybrid=hybrid)[0]
+            latencies.append((time.perf_counter() - started) * 1000)
+            hits += any(is_relevant(doc, expected) for doc in docs)
+
+        print(
+            f"   - {label:<7} recall@{k}: {hits / len(EVAL_QUERIES):.2f} | "
+            f"p50 {statistics.median(latencies):.1f}ms / "
+            f"p95 {percentile(latencies, 0.95):.1f}ms"
+        )
+
+
+def _precision(docs, expected, k):
+    return sum(is_relevant(doc, expected) for doc in docs[:k]) / k
+
+
+def _reciprocal_rank(docs, expected):
+    for rank, doc in enumerate(docs, start=1):
+        if is_relevant(doc, expected):
+            return 1.0 / rank
+    return 0.0
+
+
+def bench_rerank(k, candidates):
+    retriever = get_retriever()
+    if retriever is None:
+        return
+
+    # 점수 캐시 없이(cold) 한 번, 같은 질의를 다시(warm) 한 번 측정
+    reranker = Reranker(cache_path=":memory:")
+    pools = [
+        retrieve_many(retriever.vectorstore, [query], candidates)[0]
+        for query, _ in EVAL_QUERIES
+    ]
+    expected = [exp for _, exp in EVAL_QUERIES]
+    reranker.model  # 모델 로드 시간은 지연에서 제외
+
+    print(
+        f"\n🧮 precision@{k} / MRR (후보 {candidates}개 -> {k}개, "
+        f"{len(EVAL_QUERIES)}개 질의)"
+    )
+    base = statistics.mean(_precision(p, e, k) for p, e in zip(pools, expected))
+    base_mrr = statistics.mean(
+        _reciprocal_rank(p[:k], e) for p, e in zip(pools, expected)
+    )
+    print(f"   - {'hybrid':<14} precision@{k} {base:.3f} | MRR {base_mrr:.3f}")
+
+    for label in ("rerank (cold)", "rerank (warm)"):
+        reranked, latencies = [], []
+        for (query, _), pool in zip(EVAL_QUERIES, pools):
+            started = time.perf_counter()
+            reranked.append(reranker.rerank(query, pool, k, budget_ms=0))
+            latencies.append((time.perf_counter() - started) * 1000)
+        precision = statistics.mean(
+            _precision(d, e, k) for d, e in zip(reranked, expected)
+        )
+        mrr = statistics.mean(_reciprocal_rank(d, e) for d, e in zip(reranked, expected))
+        print(
+            f"   - {label:<14} precision@{k} {precision:.3f} ({precision - base:+.3f}) | "
+            f"MRR {mrr:.3f} | p50 {statistics.median(latencies):.0f}ms / "
+            f"p95 {percentile(latencies, 0.95):.0f}ms"
+        )
+
+    # 운영 지연 상한(RERANK_BUDGET_MS)을 걸고 빈 캐시에서 연속 요청: 상한을 넘긴 요청은
+    # 벡터 검색 순서로 대체되므로 precision과 대체 횟수를 함께 본다
+    budgeted = Reranker(model_factory=lambda: reranker.model, cache_path=":memory:")
+    results = [
+        budgeted.rerank(query, pool, k) for (query, _), pool in zip(EVAL_QUERIES, pools)
+    ]
+    precision = statistics.mean(_precision(d, e, k) for d, e in zip(results, expected))
+    stats = budgeted.stats_summary()
+    print(
+        f"   - {'rerank (budget)':<14} precision@{k} {precision:.3f} "
+        f"({precision - base:+.3f}) | 상한 {budgeted.budget_ms:.0f}ms 초과 "
+        f"{stats['fallbacks']}/{len(EVAL_QUERIES)}회, 건너뛴 쌍 {stats['skipped']}개"
+    )
+
+
+def bench_ann(types, k, num_queries, nprobes, ef_searches):
+    vectorstore, _, _ = sync_index()
+    if vectorstore is None:
+        return
+
+    exact = vectorstore.index
+    rng = np.random.default_rng(0)
+    picks = rng.choice(exact.ntotal, min(num_queries, exact.ntotal), replace=False)
+    # 실제 질의 대신 코퍼스 청크 벡터를 질의로 사용 (모델 추론 없이 재현 가능)
+    queries = exact.reconstruct_batch(picks)
+
+    print(
+        f"\n📐 recall@{k} vs flat ({exact.ntotal}개 벡터, 질의 {len(queries)}개, "
+        f"flat {index_nbytes(exact) / 1e6:.1f}MB)"
+    )
+    for index_type in types:
+        started = time.time()
+        try:
+            index = build_ann_index(exact, index_type)
+        except Exception as e:
+            print(f"   - {index_type:<8} 생성 실패: {e}")
+            continue
+        build_sec = time.time() - started
+        size_mb = index_nbytes(index) / 1e6
+
+        if index_type.startswith("ivf"):
+            sweep = [("nprobe", v, {"nprobe": v}) for v in nprobes]
+        elif index_type == "hnsw":
+            sweep = [("efSearch", v, {"ef_search": v}) for v in ef_searches]
+        else:
+            sweep = [("-", "-", {})]
+
+        for name, value, params in sweep:
+            set_search_params(index, **params)
+            recall, latency = recall_at_k(exact, index, queries, k)
+            print(
+                f"   - {index_type:<8} {name}={value:<4} recall {recall:.3f} | "
+                f"{latency:.3f}ms/q | {size_mb:.1f}MB | 생성 {build_sec:.1f}s"
+            )
+
+
+# --- 가짜 OpenAI 호환 서버 (네트워크/과금 없이 LLM 대기 시간만 흉내) ---
+FAKE_GATE_RESPONSE = '{"status": "OK", "question": ""}'
+FAKE_RISK_RESPONSE = '{"accident_type": "질식", "p": 3, "e": 2, "c": 40}'
+CONCURRENCY_INPUTS = [
+    "2시 톨루엔 탱크 청소. 환기했고 마스크 썼음.",
+    "제어실 형광등 교체 작업",
+    "배관 용접 작업, 소화기 비치하고 화재감시인 배치함",
+    "벤젠 저장탱크 내부 점검, 산소농도 측정 완료, 송기마스크 착용",
+]
+
+
+def fake_completion(prompt):
+    """프롬프트 종류에 맞춰 그래프가 파싱할 수 있는 응답을 돌려준다"""
+    if "Safety Gatekeeper" in prompt:
+        return FAKE_GATE_RESPONSE
+    if "Fine-Kinney" in prompt:
+        return FAKE_RISK_RESPONSE
+    if "표준 작업명" in prompt:
+        return "벤치마크용 작업"
+    return "1. 규정 검토\n2. 위험 요인\n3. 안전 조치"
+
+
+def start_fake_llm_server(latency):
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            prompt = body["messages"][-1]["content"]
+            time.sleep(latency)
+            payload = json.dumps(
+                {
+                    "id": "chatcmpl-bench",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": body.get("model", "fake"),
+                    "choices": [
+                        {
+                            "index": 0,
+                            "message": {
+                                "role": "assistant",
+                                "content": fake_completion(prompt),
+                            },
+                            "finish_reason": "stop",
+                        }
+                    ],
+                    "usage": {
+                        "prompt_tokens": 0,
+                        "completion_tokens": 0,
+                        "total_tokens": 0,
+                    },
+                },
+                ensure_ascii=False,
+            ).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def _request_inputs(n):
+    return [
+        {
+            "user_input": CONCURRENCY_INPUTS[i % len(CONCURRENCY_INPUTS)],
+            "chat_history": "",
+        }
+        for i in range(n)
+    ]
+
+
+def _report(label, latencies, wall, peak_threads):
+    print(
+        f"   - {label:<16} {len(latencies) / wall:6.2f} req/s | "
+        f"p50 {statistics.median(latencies):.2f}s / p95 {percentile(latencies, 0.95):.2f}s | "
+        f"총 {wall:.1f}s | 최대 스레드 {peak_threads}"
+    )
+
+
+class ThreadPeak:
+    """측정 구간 동안 살아있는 스레드 수의 최댓값"""
+
+    def __init__(self):
+        self.peak = threading.active_count()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._poll, daemon=True)
+
+    def _poll(self):
+        while not self._stop.wait(0.05):
+            self.peak = max(self.peak, threading.active_count())
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def bench_concurrency(requests, concurrency, latency, llm_cache=False):
+    server = start_fake_llm_server(latency)
+    base_url = f"http://127.0.0.1:{server.server_address[1]}/v1"
+    # resources.get_llm()이 처음 호출되기 전에 설정해야 가짜 서버로 연결된다
+    os.environ["OPENAI_BASE_URL"] = base_url
+    os.environ["OPENAI_API_BASE"] = base_url
+    os.environ.setdefault("OPENAI_API_KEY", "sk-bench")
+
+    from resources import warm_up, get_llm_cache
+    from agent_graph import app_graph, app_graph_async
+
+    warm_up(background=False)
+    # 응답 캐시는 실행 간에도 남으므로 켜 두면 sync 다음의 async 실행이 캐시 적중만 재게 된다
+    get_llm_cache().enabled = llm_cache
+    inputs = _request_inputs(requests)
+    print(
+        f"\n🚦 요청 {requests}개, 동시성 {concurrency}, LLM 지연 {latency}s "
+        f"(가짜 서버 {base_url}, LLM 캐시 {'사용' if llm_cache else '끔'})"
+    )
+
+    def run_sync(state):
+        started = time.perf_counter()
+        app_graph.invoke(state)
+        return time.perf_counter() - started
+
+    with ThreadPeak() as peak:
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            latencies = list(pool.map(run_sync, inputs))
+        _report("sync (스레드)", latencies, time.perf_counter() - started, peak.peak)
+
+    async def run_async():
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def one(state):
+            async with semaphore:
+                started = time.perf_counter()
+                await app_graph_async.ainvoke(state)
+                return time.perf_counter() - started
+
+        return await asyncio.gather(*(one(state) for state in inputs))
+
+    with ThreadPeak() as peak:
+        started = time.perf_counter()
+        latencies = asyncio.run(run_async())
+        _report("async (루프 1개)", latencies, time.perf_counter() - started, peak.peak)
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="SafeGuard-AI 성능 측정")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_recall = sub.add_parser("recall", help="Dense vs Hybrid 검색 recall 비교")
+    p_recall.add_argument("--k", type=int, default=6)
+
+    p_ann = sub.add_parser("ann", help="ANN 인덱스 종류별 recall/메모리/지연 비교")
+    p_ann.add_argument(
+        "--types", nargs="+", default=[t for t in INDEX_TYPES if t != "flat"]
+    )
+    p_ann.add_argument("--k", type=int, default=6)
+    p_ann.add_argument("--queries", type=int, default=200)
+    p_ann.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 16, 64])
+    p_ann.add_argument("--ef", type=int, nargs="+", default=[16, 32, 64, 128])
+
+    p_conc = sub.add_parser("concurrency", help="sync vs async 그래프 동시 처리량 비교")
+    p_conc.add_argument("--requests", type=int, default=32)
+    p_conc.add_argument("--concurrency", type=int, default=16)
+    p_conc.add_argument(
+        "--llm-cache",
+        action="store_true",
+        help="LLM 응답 캐시 사용 (기본: 끔, 매 요청이 가짜 서버까지 간다)",
+    )
+    p_conc.add_argument("--latency", type=float, default=0.5, help="가짜 LLM 응답 지연(초)")
+
+    p_rerank = sub.add_parser("rerank", help="cross-encoder 재순위 precision/지연 측정")
+    p_rerank.add_argument("--k", type=int, default=6)
+    p_rerank.add_argument("--candidates", type=int, default=RERANK_CANDIDATES)
+
+    args = parser.parse_args()
+
+    if args.command == "recall":
+        bench_recall(args.k)
+    elif args.command == "ann":
+        bench_ann(args.types, args.k, args.queries, args.nprobe, args.ef)
+    elif args.command == "concurrency":
+        bench_concurrency(
+            args.requests, args.concurrency, args.latency, args.llm_cache
+        )
+    elif args.command == "rerank":
+        bench_rerank(args.k, args.candidates)
@@ -0,0 +1,109 @@
+import re
+import math
+import time
+import heapq
+import unicodedata
+from collections import Counter
+
+# 조사/어미 (긴 것부터 제거 시도)
+JOSA_SUFFIXES = sorted(
+    (
+        "으로써 으로서 에서는 에게서 이라는 에서 에게 으로 부터 까지 이나 라는 "
+        "하는 하여 한다 된다 은 는 이 가 을 를 에 의 로 와 과 도 만"
+    ).split(),
+    key=len,
+    reverse=True,
+)
+
+# 제619조, 제241조의2, 제3항, 제1호 같은 조문 번호는 한 토큰으로 유지
+ARTICLE_PATTERN = re.compile(r"제\s*(\d+)\s*(조|항|호)(?:\s*의\s*(\d+))?")
+WORD_PATTERN = re.compile(r"[가-힣]+|[a-z0-9]+(?:[-.][a-z0-9]+)*")
+
+
+def _strip_josa(word):
+    for suffix in JOSA_SUFFIXES:
+        if len(word) > len(suffix) + 1 and word.endswith(suffix):
+            return word[: -len(suffix)]
+    return word
+
+
+def tokenize(text):
+    """
+    형태소 분석기 없이 쓰는 한국어 토크나이저.
+    - 조문 번호(제619조, 제241조의2)는 정규화된 단일 토큰
+    - 한글 어절은 조사 제거 후 어간 + 문자 bigram (복합명사 "밀폐공간작업" 대응)
+    - 영문/숫자(CAS 번호 108-88-3 등)는 그대로
+    """
+    text = unicodedata.normalize("NFC", text).lower()
+    tokens = []
+
+    for m in ARTICLE_PATTERN.finditer(text):
+        number, unit, sub = m.groups()
+        tokens.append(f"제{number}{unit}" + (f"의{sub}" if sub else ""))
+    text = ARTICLE_PATTERN.sub(" ", text)
+
+    for word in WORD_PATTERN.findall(text):
+        if not ("가" <= word[0] <= "힣"):
+            tokens.append(word)
+            continue
+        stem = _strip_josa(word)
+        tokens.append(stem)
+        if len(stem) >= 3:
+            tokens.extend(stem[i : i + 2] for i in range(len(stem) - 1))
+    return tokens
+
+
+class BM25Index:
+    """
+    docstore ID 기준의 BM25 역색인.
+    postings/문서 길이는 SQLiteDocstore(chunks.sqlite)의 terms/doc_len 테이블에 있고
+    질의 term의 posting만 SQL로 읽는다. 청크 삭제는 docstore.delete가 함께 처리하며,
+    추가분은 docstore.commit 시점(인덱스 저장과 같은 트랜잭션)에 확정된다.
+    """
+
+    def __init__(self, store, k1=1.5, b=0.75):
+        self.store = store
+        self.k1 = k1
+        self.b = b
+
+    def __len__(self):
+        return self.store.doc_count
+
+    # --- 색인 ---
+    def add(self, doc_id, text):
+        self.store.add_terms(doc_id, Counter(tokenize(text)))
+
+    # --- 검색 ---
+    @staticmethod
+    def _idf(n_docs, df):
+        return math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+
+    def search(self, query, k=10, allowed=None, budget_ms=None):
+        """
+        BM25 상위 k개 [(doc_id, score)].
+        allowed: 허용 doc_id 집합 (메타데이터 필터)
+        budget_ms: 희귀한 term부터 점수를 누적하다가 예산을 넘기면 거기서 멈춘다.
+        """
+        n_docs = self.store.doc_count
+        if not n_docs:
+            return []
+
+        started = time.perf_counter()
+        avgdl = self.store.total_len / n_docs
+        df = self.store.document_frequencies(set(tokenize(query)))
+        terms = sorted(df, key=df.get)
+
+        k1, b = self.k1, self.b
+        scores = {}
+        for term in terms:
+            idf = self._idf(n_docs, df[term])
+            for doc_id, tf, length in self.store.postings(term):
+                if allowed is not None and doc_id not in allowed:
+                    continue
+                norm = k1 * (1 - b + b * length / avgdl)
+                score = idf * tf * (k1 + 1) / (tf + norm)
+                scores[doc_id] = scores.get(doc_id, 0.0) + score
+            if budget_ms and (time.perf_counter() - started) * 1000 > budget_ms:
+                break
+
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
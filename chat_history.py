@@ -0,0 +1,148 @@
+import os
+import threading
+from collections import deque
+import tiktoken
+
+# 프롬프트에 넣는 대화 기록 예산 (tiktoken 기준 토큰 수)
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "1200"))
+HISTORY_RECENT_TURNS = int(os.getenv("HISTORY_RECENT_TURNS", "6"))
+SUMMARY_TOKEN_BUDGET = int(os.getenv("SUMMARY_TOKEN_BUDGET", "300"))
+
+TOKENIZER_MODEL = "gpt-4o"
+ROLE_LABELS = {"user": "User", "assistant": "AI"}
+SUMMARY_LABEL = "[이전 대화 요약]"
+
+_encoding = None
+_encoding_lock = threading.Lock()
+
+
+def get_encoding():
+    global _encoding
+    if _encoding is None:
+        with _encoding_lock:
+            if _encoding is None:
+                try:
+                    _encoding = tiktoken.encoding_for_model(TOKENIZER_MODEL)
+                except KeyError:
+                    _encoding = tiktoken.get_encoding("cl100k_base")
+    return _encoding
+
+
+def count_tokens(text):
+    return len(get_encoding().encode(text or ""))
+
+
+def truncate_tokens(text, limit, keep_tail=False):
+    """토큰 수 기준으로 자르기 (keep_tail=True면 뒤쪽을 남김)"""
+    tokens = get_encoding().encode(text or "")
+    if len(tokens) <= limit:
+        return text
+    tokens = tokens[-limit:] if keep_tail else tokens[:limit]
+    return get_encoding().decode(tokens)
+
+
+class ChatHistory:
+    """
+    세션별 대화 기록: 롤링 요약 + 최근 N턴을 토큰 예산 안에서 유지한다.
+    - add(): 턴의 토큰 수를 한 번만 계산해 추가하고, 예산/턴 수를 넘은 오래된 턴은 요약 대기열로
+    - compact(): 대기열을 기존 요약에 합쳐 요약을 갱신 (LLM 1회, 응답 표시 후 호출)
+    - render(): 프롬프트에 넣을 텍스트 (요약 + 최근 턴)
+    """
+
+    def __init__(
+        self,
+        summarizer=None,
+        budget=HISTORY_TOKEN_BUDGET,
+        recent_turns=HISTORY_RECENT_TURNS,
+        summary_budget=SUMMARY_TOKEN_BUDGET,
+    ):
+        # summarizer(기존 요약, 새 대화 텍스트) -> 갱신된 요약
+        self.summarizer = summarizer
+        self.budget = budget
+        self.recent_turns = recent_turns
+        self.summary_budget = summary_budget
+
+        self.summary = ""
+        self.summary_tokens = 0
+        self.turns = deque()  # (줄, 토큰 수)
+        self.recent_tokens = 0
+        self.pending = []
+
+    @property
+    def recent_budget(self):
+        return max(1, self.budget - self.summary_budget)
+
+    @property
+    def tokens(self):
+        return self.summary_tokens + self.recent_tokens
+
+    def add(self, role, content):
+        line = f"{ROLE_LABELS.get(role, role)}: {' '.join(str(content).split())}"
+        tokens = count_tokens(line)
+        # 한 턴이 예산보다 길면 앞부분만 남긴다
+        if tokens > self.recent_budget:
+            line = truncate_tokens(line, self.recent_budget)
+            tokens = count_tokens(line)
+
+        self.turns.append((line, tokens))
+        self.recent_tokens += tokens
+        while len(self.turns) > 1 and (
+            len(self.turns) > self.recent_turns
+            or self.recent_tokens > self.recent_budget
+        ):
+            old_line, old_tokens = self.turns.popleft()
+            self.recent_tokens -= old_tokens
+            self.pending.append(old_line)
+
+    def compact(self):
+        """요약 대기열이 있으면 요약을 갱신. 갱신했으면 True"""
+        if not self.pending:
+            return False
+
+        turns_text = "\n".join(self.pending)
+        summary = None
+        if self.summarizer is not None:
+            try:
+                summary = self.summarizer(self.summary or "없음", turns_text)
+            except Exception as e:
+                print(f"⚠️ 대화 요약 실패, 원문을 잘라서 보관 : {e}")
+        if not summary:
+            summary = f"{self.summary}\n{turns_text}".strip()
+
+        # 예산을 넘으면 최근 내용 쪽을 남긴다
+        self.summary = truncate_tokens(
+            summary.strip(), self.summary_budget, keep_tail=True
+        )
+        self.summary_tokens = count_tokens(self.summary)
+        self.pending = []
+        return True
+
+    def render(self):
+        parts = []
+        if self.summary:
+            parts.append(f"{SUMMARY_LABEL} {self.summary}")
+        parts.extend(line for line, _ in self.turns)
+        return "\n".join(parts)
+
+
+def user_statements(history):
+    """
+    render() 텍스트에서 사용자가 말한 내용만 (요약 포함, AI 질문/안내 줄 제외)
+    규칙 기반 위험성 평가가 AI 질문 속 "환기, 소화기"를 조치로 읽지 않도록 한다.
+    """
+    user_prefix = f"{ROLE_LABELS['user']}:"
+    ai_prefix = f"{ROLE_LABELS['assistant']}:"
+    kept = []
+    for line in (history or "").splitlines():
+        line = line.strip()
+        if line.startswith(SUMMARY_LABEL):
+            line = line[len(SUMMARY_LABEL) :].strip()
+        # 요약 줄은 "- User: ..." 처럼 글머리표가 붙을 수 있다
+        line = line.lstrip("-*• ").strip()
+        if line.startswith(ai_prefix) or line.startswith("AI가"):
+            continue
+        if line.startswith(user_prefix):
+            line = line[len(user_prefix) :].strip()
+        if line and line != "없음":
+            kept.append(line)
+    return kept
@@ -0,0 +1,187 @@
+import os
+import re
+import zlib
+import numpy as np
+from chat_history import count_tokens
+
+# 규정 컨텍스트 토큰 예산 / 같은 문서에서 가져올 최대 청크 수
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "2500"))
+MAX_CHUNKS_PER_SOURCE = int(os.getenv("MAX_CHUNKS_PER_SOURCE", "3"))
+
+# MinHash 근사 중복 제거 (문자 4-gram, 64개 해시, 추정 Jaccard 0.8 이상이면 중복)
+SHINGLE_SIZE = 4
+NUM_PERM = 64
+DEDUPE_THRESHOLD = float(os.getenv("DEDUPE_THRESHOLD", "0.8"))
+_MERSENNE = np.uint64((1 << 61) - 1)
+_rng = np.random.default_rng(0)
+_PERM_A = _rng.integers(1, 1 << 29, NUM_PERM, dtype=np.uint64)
+_PERM_B = _rng.integers(0, 1 << 29, NUM_PERM, dtype=np.uint64)
+
+DOC_SEPARATOR = "\n\n---\n\n"
+# rag_setup 청크 ID: {파일 해시 16자}-{페이지 5자리}-{페이지 내 순번 3자리}
+CHUNK_ID = re.compile(r"-(\d{5})-(\d{3})$")
+
+
+def minhash(text):
+    """공백을 뺀 문자 shingle의 MinHash 서명 (NUM_PERM,)"""
+    compact = "".join(text.split())
+    if len(compact) < SHINGLE_SIZE:
+        compact = compact.ljust(SHINGLE_SIZE)
+    shingles = {
+        compact[i : i + SHINGLE_SIZE] for i in range(len(compact) - SHINGLE_SIZE + 1)
+    }
+    hashes = np.fromiter(
+        (zlib.crc32(s.encode("utf-8")) for s in shingles),
+        dtype=np.uint64,
+        count=len(shingles),
+    )
+    return ((np.outer(_PERM_A, hashes) + _PERM_B[:, None]) % _MERSENNE).min(axis=1)
+
+
+def similarity(sig_a, sig_b):
+    return float(np.mean(sig_a == sig_b))
+
+
+def _position(doc):
+    """(출처, 페이지, 순번) - 청크 ID가 없으면 순번은 None"""
+    m = CHUNK_ID.search(getattr(doc, "id", None) or "")
+    return (
+        doc.metadata.get("source", ""),
+        doc.metadata.get("page", 0),
+        int(m.group(2)) if m else None,
+    )
+
+
+def _strip_heading(left, right):
+    """
+    structure_splitter는 긴 조문의 두 번째 조각부터 조문 첫 줄(제목)을 앞에 붙인다.
+    같은 조문의 앞 조각(left)이 그 제목으로 시작하면 right에서 떼어 낸다.
+    """
+    heading, sep, body = right.partition("\n")
+    if sep and heading.strip() and left.startswith(heading):
+        return body
+    return right
+
+
+def _join_overlap(left, right, max_overlap=200):
+    """청크 분할 overlap으로 겹친 부분을 한 번만 남기고 이어 붙인다 (반복된 제목 제외)"""
+    right = _strip_heading(left, right)
+    for size in range(min(max_overlap, len(left), len(right)), 0, -1):
+        if left.endswith(right[:size]):
+            return left + right[size:]
+    return f"{left}\n{right}"
+
+
+def _header(source, page, article):
+    return (
+        f"📄 [출처: {os.path.basename(source) or '파일_없음'} p.{page + 1}"
+        f"{' ' + article if article else ''}]"
+    )
+
+
+def _block(passage):
+    header = _header(passage["source"], passage["page"], passage["article"])
+    return f"{header}\n{passage['text']}"
+
+
+def round_robin(groups):
+    """우선순위 그룹별 순위를 번갈아 (그룹1 1위, 그룹2 1위, ..., 그룹1 2위, ...)"""
+    ordered = []
+    for rank in range(max((len(g) for g in groups), default=0)):
+        for order, group in enumerate(groups):
+            if rank < len(group):
+                ordered.append((order, rank, group[rank]))
+    return ordered
+
+
+def assemble(groups, budget=None, extra=()):
+    """
+    groups: 우선순위 순 Document 리스트들 (예: [MSDS, SOP, 법령])
+    extra: 이미 형식이 정해진 블록 (SIF 사례 등) - 문서 뒤에 예산이 남으면 붙인다
+    1) 그룹을 번갈아 가며 후보 순서를 정하고
+    2) MinHash로 거의 같은 청크, 문서당 MAX_CHUNKS_PER_SOURCE 초과분을 버리고
+    3) 토큰 예산 안에 들어가는 만큼 담은 뒤
+    4) 같은 페이지의 연속 청크는 하나로 합쳐 (그룹, 문서, 페이지) 순으로 출력한다.
+    반환: (컨텍스트 문자열, 통계 dict)
+    """
+    budget = budget or CONTEXT_TOKEN_BUDGET
+    separator_tokens = count_tokens(DOC_SEPARATOR)
+    stats = {"candidates": 0, "duplicates": 0, "over_budget": 0, "merged": 0}
+
+    selected, signatures, per_source = [], [], {}
+    used = 0
+    for order, rank, doc in round_robin(groups):
+        stats["candidates"] += 1
+        text = doc.page_content.strip()
+        if not text:
+            continue
+        source, page, chunk = _position(doc)
+        if per_source.get(source, 0) >= MAX_CHUNKS_PER_SOURCE:
+            continue
+
+        signature = minhash(text)
+        if any(similarity(signature, s) >= DEDUPE_THRESHOLD for s in signatures):
+            stats["duplicates"] += 1
+            continue
+
+        # 출처 머리글도 출력에 들어가므로 함께 센다
+        article = doc.metadata.get("article", "")
+        header = _header(source, page, article)
+        tokens = count_tokens(f"{header}\n{text}") + separator_tokens
+        if used + tokens > budget:
+            stats["over_budget"] += 1
+            continue
+
+        used += tokens
+        signatures.append(signature)
+        per_source[source] = per_source.get(source, 0) + 1
+        selected.append(
+            {
+                "order": order,
+                "source": source,
+                "page": page,
+                "chunk": chunk,
+                "rank": rank,
+                "article": article,
+                "text": text,
+            }
+        )
+
+    # 같은 (문서, 페이지)의 연속 청크 병합
+    selected.sort(
+        key=lambda p: (
+            p["order"],
+            p["source"],
+            p["page"],
+            p["chunk"] if p["chunk"] is not None else p["rank"],
+        )
+    )
+    passages = []
+    for p in selected:
+        last = passages[-1] if passages else None
+        if (
+            last is not None
+            and p["chunk"] is not None
+            and last["chunk"] is not None
+            and (last["source"], last["page"]) == (p["source"], p["page"])
+            and p["chunk"] == last["chunk"] + 1
+        ):
+            last["text"] = _join_overlap(last["text"], p["text"])
+            last["chunk"] = p["chunk"]
+            stats["merged"] += 1
+            continue
+        passages.append(dict(p))
+
+    blocks = [_block(p) for p in passages]
+    used = sum(count_tokens(b) + separator_tokens for b in blocks)
+    for block in extra:
+        tokens = count_tokens(block) + separator_tokens
+        if used + tokens > budget:
+            stats["over_budget"] += 1
+            continue
+        used += tokens
+        blocks.append(block)
+
+    stats["tokens"] = used
+    stats["passages"] = len(blocks)
+    return DOC_SEPARATOR.join(blocks), stats
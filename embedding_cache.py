@@ -0,0 +1,150 @@
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+import unicodedata
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+# faiss_db는 버전 변경 시 통째로 지워지므로 캐시는 별도 폴더에 둔다
+CACHE_PATH = os.getenv("EMBED_CACHE_PATH", "./embedding_cache/embeddings.sqlite")
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "32"))
+
+# SQLite IN 절 변수 개수 제한 대비
+LOOKUP_CHUNK = 500
+
+
+def normalize_text(text):
+    """공백/유니코드 정규화 (같은 청크가 줄바꿈 차이로 캐시 미스 나는 것 방지)"""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    (모델명, 정규화된 청크 해시) 키로 벡터를 SQLite에 저장하는 임베딩 래퍼.
+    캐시 미스만 길이순으로 정렬해 batch_size 단위로 원본 모델에 넘긴다.
+    base 대신 base_factory를 주면 실제 추론이 필요한 첫 호출 때 모델을 로드한다.
+    """
+
+    def __init__(
+        self,
+        base=None,
+        model_name="",
+        cache_path=CACHE_PATH,
+        batch_size=None,
+        base_factory=None,
+    ):
+        self._base = base
+        self._base_factory = base_factory
+        self._base_lock = threading.Lock()
+        self.model_name = model_name
+        self.batch_size = batch_size or EMBED_BATCH_SIZE
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(cache_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS embeddings (
+                model TEXT NOT NULL,
+                text_hash TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                PRIMARY KEY (model, text_hash)
+            )
+            """
+        )
+        self._conn.commit()
+        self.reset_stats()
+
+    @property
+    def base(self):
+        if self._base is None:
+            with self._base_lock:
+                if self._base is None:
+                    self._base = self._base_factory()
+        return self._base
+
+    @property
+    def is_loaded(self):
+        return self._base is not None
+
+    # --- 통계 ---
+    def reset_stats(self):
+        self.stats = {"hits": 0, "misses": 0, "seconds": 0.0}
+
+    def stats_summary(self):
+        total = self.stats["hits"] + self.stats["misses"]
+        seconds = self.stats["seconds"]
+        return {
+            "hits": self.stats["hits"],
+            "misses": self.stats["misses"],
+            "hit_rate": round(self.stats["hits"] / total, 3) if total else 0.0,
+            "chunks_per_sec": round(total / seconds, 1) if seconds else 0.0,
+        }
+
+    # --- 캐시 입출력 ---
+    def _hash(self, text):
+        return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+    def _lookup(self, hashes):
+        found = {}
+        for i in range(0, len(hashes), LOOKUP_CHUNK):
+            part = hashes[i : i + LOOKUP_CHUNK]
+            placeholders = ",".join("?" * len(part))
+            with self._lock:
+                rows = self._conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings "
+                    f"WHERE model = ? AND text_hash IN ({placeholders})",
+                    [self.model_name, *part],
+                ).fetchall()
+            for text_hash, blob in rows:
+                found[text_hash] = np.frombuffer(blob, dtype=np.float32)
+        return found
+
+    def _store(self, items):
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, text_hash, vector) "
+                "VALUES (?, ?, ?)",
+                [
+                    (self.model_name, text_hash, np.asarray(vec, np.float32).tobytes())
+                    for text_hash, vec in items
+                ],
+            )
+            self._conn.commit()
+
+    # --- Embeddings 인터페이스 ---
+    def embed_documents(self, texts):
+        started = time.time()
+        hashes = [self._hash(t) for t in texts]
+        vectors = self._lookup(list(set(hashes)))
+
+        # 미스만 중복 제거 후 길이순 정렬 -> 배치 내 패딩 최소화
+        missing = {}
+        for text_hash, text in zip(hashes, texts):
+            if text_hash not in vectors:
+                missing.setdefault(text_hash, text)
+        order = sorted(missing, key=lambda h: len(missing[h]))
+
+        for i in range(0, len(order), self.batch_size):
+            batch = order[i : i + self.batch_size]
+            embedded = self.base.embed_documents([missing[h] for h in batch])
+            self._store(zip(batch, embedded))
+            for text_hash, vec in zip(batch, embedded):
+                vectors[text_hash] = np.asarray(vec, np.float32)
+
+        self.stats["misses"] += len(order)
+        self.stats["hits"] += len(texts) - len(order)
+        self.stats["seconds"] += time.time() - started
+        return [vectors[h].tolist() for h in hashes]
+
+    def embed_query(self, text):
+        return self.base.embed_query(text)
+
+    def embed_queries(self, texts):
+        """여러 질의를 한 번의 forward pass로 임베딩 (질의는 캐시하지 않음)"""
+        if not texts:
+            return []
+        return self.base.embed_documents(list(texts))
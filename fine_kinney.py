@@ -0,0 +1,376 @@
+"""
+규칙 기반 Fine-Kinney 위험성 평가 (LLM 없이 R = P x E x C 계산)
+
+    python fine_kinney.py jsa.csv --column 작업내용 --output jsa_scored.csv
+    python fine_kinney.py --check     # 회귀 사례 확인 (규칙/사전 수정 후)
+"""
+
+import re
+import csv
+import time
+import argparse
+from hazard_lexicon import get_lexicon
+
+# --- Fine-Kinney 척도 ---
+PROBABILITY_SCALE = {
+    10: "거의 확실",
+    6: "가능성 높음",
+    3: "가능",
+    1: "가능성 낮음",
+    0.5: "희박",
+    0.2: "매우 희박",
+    0.1: "거의 불가능",
+}
+EXPOSURE_SCALE = {
+    10: "상시/하루 수회",
+    6: "매일(하루 1회)",
+    3: "주 1회",
+    2: "월 1회",
+    1: "연 수회",
+    0.5: "연 1회 이하",
+}
+CONSEQUENCE_SCALE = {
+    100: "재난/다수 사망",
+    40: "사망",
+    15: "중상",
+    7: "휴업 재해",
+    3: "경상",
+    1: "경미",
+}
+
+DEFAULT_EXPOSURE = 2.0
+
+# (패턴, E) - 위에서부터 처음 맞는 것 (EXPOSURE_SCALE과 같은 구간)
+EXPOSURE_RULES = [
+    (r"하루\s*(?:1|한)\s*(?:회|번)", 6),
+    (r"상시|교대\s*마다|하루\s*(?:\d+|수|여러)\s*(?:회|번)", 10),
+    (r"매일", 6),
+    (r"매주|주\s*\d+\s*회", 3),
+    (r"매월|월\s*\d+\s*회", 2),
+    (r"분기|반기|연\s*\d+\s*회|매년", 1),
+    (r"최초|1회성|일회성", 0.5),
+]
+
+# 위험 유형별 규칙 (risk_analyst.md의 Score Logic과 동일)
+#   lexicon: 이 유형으로 보는 lexicon/hazards.json 항목 (category, name), name이 None이면 분류 전체
+#   (C=40은 프롬프트의 벤젠/톨루엔, 탱크/밀폐공간 진입, 용접/화기만. 장소보다 작업 내용 우선)
+#   severity: C / accident_type: 재해유형 / group: P 산정 규칙(PROBABILITY_RULES)
+HAZARD_RULES = [
+    {
+        "name": "밀폐공간",
+        "lexicon": [("work_type", "밀폐공간")],
+        "severity": 40,
+        "accident_type": "질식",
+        "group": "severe",
+    },
+    {
+        # 장소/공정 이름("화학 공장")이나 다른 물질은 C를 정할 수 없어 규칙에 넣지 않는다
+        "name": "화학물질",
+        "lexicon": [("chemical", "벤젠"), ("chemical", "톨루엔")],
+        "severity": 40,
+        "accident_type": "화학물질 누출/중독",
+        "group": "severe",
+    },
+    {
+        "name": "화기작업",
+        "lexicon": [("work_type", "화기작업")],
+        "severity": 40,
+        "accident_type": "화재/폭발",
+        "group": "severe",
+    },
+    {
+        "name": "고소작업",
+        "lexicon": [("work_type", "고소작업"), ("work_type", "조명 교체")],
+        "severity": 7,
+        "accident_type": "추락",
+        "group": "height",
+    },
+    {
+        "name": "단순작업",
+        "lexicon": [("work_type", "단순작업"), ("work_type", "청소/세척")],
+        "severity": 1,
+        "accident_type": "경미한 부상",
+        "group": "simple",
+    },
+]
+
+# 그룹별 P 산정 규칙
+#   levels: 안전조치 (0개, 1개, 2개 이상)일 때 P / measures: 감점 대상 안전조치
+PROBABILITY_RULES = {
+    "severe": {
+        "levels": (10, 6, 1.5),
+        "measures": {
+            "환기": r"환기|배기|송풍",
+            "소화기": r"소화기",
+            "감시인": r"감시인|감시자",
+            "호흡보호구": r"마스크|송기|공기호흡기",
+            "방폭": r"방폭",
+            "농도측정": r"측정",
+            "불티방지": r"불티|방화포|비산\s*방지",
+        },
+    },
+    "height": {
+        "levels": (3, 1, 1),
+        "measures": {
+            "2인1조": r"2\s*인\s*1\s*조",
+            "안전모": r"안전모",
+            "안전대": r"안전대|안전벨트",
+            "A형사다리": r"A\s*형\s*사다리",
+        },
+    },
+    "simple": {"levels": (0.5, 0.5, 0.5), "measures": {}},
+}
+
+# 안전조치의 부정/불확실 판정 범위: 절(문장부호, "~고/~며/~지만" 연결) 단위로 나눈 뒤,
+# 조치 단어부터 같은 절의 다음 조치 단어 앞까지를 그 조치의 서술로 본다.
+#   "환기는 하지 않고 마스크도 착용하지 않음" -> 환기/마스크 모두 부정
+#   "감시인 배치 소화기 없음" -> 감시인 인정, 소화기 부정
+CLAUSE_BOUNDARY = re.compile(r"[.,;!?\n]|(?<=[고며])\s+|(?<=지만)\s+|(?<=는데)\s+")
+NEGATION = re.compile(
+    r"않|안\s*(?:함|했|하|해|됨|된|씀|썼|쓰)|못|없|아님|아니|"
+    r"미실시|미착용|미비|미설치|미배치|미측정|생략|누락"
+)
+# 조치 단어 바로 앞의 부정 ("안 환기", "미측정") - "탱크 안 환기"처럼 장소일 수도 있어 불확실로
+NEGATION_PREFIX = re.compile(r"(?:^|\s)(?:안|못|무)\s*$|미$")
+# 아직 하지 않은 계획/조건 ("나중에 환기", "환기 예정", "마스크 필요") - 절 전체에서 찾는다
+HEDGE = re.compile(r"나중|예정|할\s*것|하겠|할\s*게|필요|해야|\?")
+# 조치 단어 사이에 조사/나열만 있으면 뒤 조치와 서술어를 공유한다 ("환기, 마스크 안 함")
+SHARED_PREDICATE = re.compile(r"^\s*(?:와|과|및|랑|이랑|하고|도|/)?\s*$")
+
+_EXPOSURE_PATTERNS = [(re.compile(p), e) for p, e in EXPOSURE_RULES]
+_MEASURE_PATTERNS = {
+    group: [(name, re.compile(p)) for name, p in rule["measures"].items()]
+    for group, rule in PROBABILITY_RULES.items()
+}
+# 조치 서술 범위를 끊는 "다음 조치 단어" (모든 그룹의 조치)
+_ANY_MEASURE = re.compile(
+    "|".join(p for rule in PROBABILITY_RULES.values() for p in rule["measures"].values())
+)
+
+
+def risk_level(r_score):
+    if r_score >= 320:
+        return "Very High"
+    if r_score >= 160:
+        return "High"
+    if r_score >= 70:
+        return "Medium"
+    return "Low"
+
+
+def _rule_matches(rule, found):
+    return any(
+        found.get(category) and (name is None or name in found[category])
+        for category, name in rule["lexicon"]
+    )
+
+
+def detect_hazards(text, found=None):
+    """
+    규칙에 걸린 위험 유형 목록 (HAZARD_RULES 순서, 단어 매칭은 hazard_lexicon)
+    found: 이미 계산한 get_lexicon().detect(text) 결과
+    """
+    if found is None:
+        found = get_lexicon().detect(text)
+    return [rule for rule in HAZARD_RULES if _rule_matches(rule, found)]
+
+
+def _unruled_chemicals(hazards, found):
+    """C=40 규칙에 없는 물질 (질소, 황산 등) - 노출 강도를 규칙으로 정할 수 없다"""
+    named = {
+        name
+        for rule in hazards
+        for category, name in rule["lexicon"]
+        if category == "chemical"
+    }
+    return [name for name in found["chemical"] if name not in named]
+
+
+def mentioned_measures(text):
+    """부정 여부와 관계없이 언급된 안전조치 단어 (모든 그룹)"""
+    return sorted({m.group() for m in _ANY_MEASURE.finditer(text)})
+
+
+def exposure(text):
+    for pattern, value in _EXPOSURE_PATTERNS:
+        if pattern.search(text):
+            return value
+    return DEFAULT_EXPOSURE
+
+
+def _clauses(text):
+    start = 0
+    for m in CLAUSE_BOUNDARY.finditer(text):
+        yield text[start : m.start()]
+        start = m.end()
+    yield text[start:]
+
+
+def _measure_status(pattern, clause, m):
+    """"negated" / "unclear" / "affirmed" - 조치 단어 m 하나의 서술 판정"""
+    if NEGATION_PREFIX.search(clause[: m.start()]):
+        return "unclear"
+    following = _ANY_MEASURE.search(clause, m.end())
+    scope_end = following.start() if following else len(clause)
+    scope = clause[m.end() : scope_end]
+    if NEGATION.search(scope):
+        return "negated"
+    if HEDGE.search(clause):
+        return "unclear"
+    # 자기 서술어 없이 뒤 조치와 묶여 있는데 뒤쪽에 부정이 있으면 이 조치까지 부정하는지
+    # 알 수 없음 ("환기 마스크 착용 안 함")
+    if (
+        following
+        and SHARED_PREDICATE.match(scope)
+        and NEGATION.search(clause[scope_end:])
+    ):
+        return "unclear"
+    return "affirmed"
+
+
+def measure_status(pattern, text):
+    """조치가 한 번이라도 인정되면 "affirmed", 언급이 없으면 None"""
+    statuses = set()
+    for clause in _clauses(text):
+        for m in pattern.finditer(clause):
+            statuses.add(_measure_status(pattern, clause, m))
+    for status in ("affirmed", "unclear", "negated"):
+        if status in statuses:
+            return status
+    return None
+
+
+def safety_measures(text, group):
+    """(인정된 조치, 부정 여부가 불확실한 조치)"""
+    affirmed, unclear = [], []
+    for name, pattern in _MEASURE_PATTERNS[group]:
+        status = measure_status(pattern, text)
+        if status == "affirmed":
+            affirmed.append(name)
+        elif status == "unclear":
+            unclear.append(name)
+    return affirmed, unclear
+
+
+def assess(text):
+    """
+    작업 설명 한 건을 평가한다. 어떤 규칙에도 걸리지 않거나 안전조치의 부정 여부가
+    불확실하면 None (감점 없이 점수를 낮게 매기지 않도록 LLM 평가 대상).
+    여러 유형이 걸리면 강도(C)가 가장 큰 유형 기준으로 P를 산정한다.
+    규칙 밖의 물질이 함께 나오면 C=40 규칙이 걸린 경우에만 점수를 매긴다.
+    (SIF 유사 사례는 기인물만 겹쳐도 걸리므로 점수를 매기지 않고 LLM 근거 자료로만 쓴다)
+    """
+    found = get_lexicon().detect(text)
+    hazards = detect_hazards(text, found)
+    if not hazards:
+        return None
+
+    main = max(hazards, key=lambda rule: rule["severity"])
+    if main["group"] != "severe" and _unruled_chemicals(hazards, found):
+        return None
+    group = main["group"]
+    measures, unclear = safety_measures(text, group)
+    if unclear:
+        return None
+    levels = PROBABILITY_RULES[group]["levels"]
+    p_score = levels[min(len(measures), len(levels) - 1)]
+    e_score = exposure(text)
+    c_score = main["severity"]
+    r_score = p_score * e_score * c_score
+
+    names = [rule["name"] for rule in hazards]
+    basis = f"감지 유형: {', '.join(names)} / 안전조치: {', '.join(measures) or '없음'}"
+    return {
+        "accident_type": main["accident_type"],
+        "p": p_score,
+        "e": e_score,
+        "c": c_score,
+        "r": r_score,
+        "level": risk_level(r_score),
+        "hazards": names,
+        "measures": measures,
+        "basis": basis,
+    }
+
+
+# 회귀 사례: (작업 설명, 기대값) - 기대값 None은 LLM 평가 대상, 아니면 (C, P, 등급)
+REGRESSION_CASES = [
+    # 장소("화학 공장")보다 작업 내용(형광등 교체) 우선
+    ("화학 공장 제어실 형광등 교체, 안전모 착용, 2인1조", (7, 1, "Low")),
+    # 규칙에 없는 물질(질소) + 강도를 정할 수 없는 작업 -> LLM
+    ("질소 퍼지 후 배관 플랜지 교체", None),
+    ("톨루엔 탱크 내부 청소, 환기 및 감시인 배치", (40, 1.5, "Medium")),
+]
+
+
+def check_rules(cases=REGRESSION_CASES):
+    """회귀 사례를 평가해 기대값과 다른 사례 수를 돌려준다"""
+    failures = 0
+    for text, expected in cases:
+        result = assess(text)
+        actual = result and (result["c"], result["p"], result["level"])
+        if actual != expected:
+            failures += 1
+            print(f"❌ {text} : 기대 {expected} / 실제 {actual}")
+    print(f"✅ 회귀 사례 {len(cases) - failures}/{len(cases)}건 통과")
+    return failures
+
+
+def assess_many(texts):
+    return [assess(text) for text in texts]
+
+
+def score_csv(path, column, output=None):
+    """JSA 표(CSV)의 작업 설명 열을 일괄 평가. 규칙 밖의 행은 R을 비워 둔다."""
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        rows = list(csv.DictReader(f))
+    if not rows:
+        print("⚠️ 평가할 행이 없습니다.")
+        return []
+
+    started = time.perf_counter()
+    results = assess_many(row.get(column, "") for row in rows)
+    seconds = time.perf_counter() - started
+
+    matched = sum(r is not None for r in results)
+    print(
+        f"✅ {len(rows)}행 평가 ({matched}행 규칙 적용, {len(rows) - matched}행 LLM 필요) "
+        f"- {len(rows) / seconds if seconds else float('inf'):,.0f}행/초"
+    )
+
+    if output:
+        fields = list(rows[0]) + ["P", "E", "C", "R", "등급", "재해유형", "평가근거"]
+        with open(output, "w", encoding="utf-8-sig", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=fields)
+            writer.writeheader()
+            for row, result in zip(rows, results):
+                if result is not None:
+                    row.update(
+                        {
+                            "P": result["p"],
+                            "E": result["e"],
+                            "C": result["c"],
+                            "R": result["r"],
+                            "등급": result["level"],
+                            "재해유형": result["accident_type"],
+                            "평가근거": result["basis"],
+                        }
+                    )
+                writer.writerow(row)
+        print(f"📄 저장: {output}")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="규칙 기반 Fine-Kinney 일괄 평가")
+    parser.add_argument("csv_path", nargs="?")
+    parser.add_argument("--column", default="작업내용", help="작업 설명이 들어있는 열 이름")
+    parser.add_argument("--output", default=None)
+    parser.add_argument("--check", action="store_true", help="회귀 사례만 확인")
+    args = parser.parse_args()
+
+    if args.check:
+        raise SystemExit(1 if check_rules() else 0)
+    if not args.csv_path:
+        parser.error("csv_path가 필요합니다 (--check 제외)")
+    score_csv(args.csv_path, args.column, args.output)
@@ -0,0 +1,140 @@
+import os
+import json
+import threading
+import unicodedata
+from collections import deque
+
+# 위험 요소 사전 (화학물질/작업 유형/장비)
+# 항목을 추가하면 코드 수정 없이 검출 대상이 늘어난다.
+# work_type 용어는 작업 내용을 나타내는 말만 넣는다. ("화학 공장"처럼 장소/공정을 나타내는
+# 말은 위험성 규칙 강도와 PDF 체크리스트 선택까지 바꾼다)
+LEXICON_PATH = os.getenv("HAZARD_LEXICON_PATH", "./lexicon/hazards.json")
+CATEGORIES = ("chemical", "work_type", "equipment")
+
+
+def _normalize(text):
+    return unicodedata.normalize("NFC", text).lower()
+
+
+def _is_ascii_word(ch):
+    return ch.isascii() and ch.isalnum()
+
+
+class AhoCorasick:
+    """다중 패턴 오토마톤: 텍스트를 한 번 훑어 모든 패턴의 (시작, 끝, 값)을 찾는다"""
+
+    def __init__(self, patterns):
+        # patterns: {패턴 문자열: 값}
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [[]]
+
+        for pattern, value in patterns.items():
+            node = 0
+            for ch in pattern:
+                nxt = self.goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(self.goto)
+                    self.goto[node][ch] = nxt
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append([])
+                node = nxt
+            self.output[node].append((len(pattern), value))
+
+        # BFS로 실패 링크 연결 (접미사 노드의 출력도 합친다)
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, nxt in self.goto[node].items():
+                queue.append(nxt)
+                f = self.fail[node]
+                while f and ch not in self.goto[f]:
+                    f = self.fail[f]
+                self.fail[nxt] = self.goto[f].get(ch, 0)
+                self.output[nxt] = self.output[nxt] + self.output[self.fail[nxt]]
+
+    def iter(self, text):
+        node = 0
+        goto, fail, output = self.goto, self.fail, self.output
+        for i, ch in enumerate(text):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            for length, value in output[node]:
+                yield i - length + 1, i + 1, value
+
+
+class HazardLexicon:
+    """
+    lexicon/hazards.json을 하나의 오토마톤으로 컴파일한다.
+    항목: {"name": 대표명, "terms": [동의어...], "cas": CAS 번호(화학물질)}
+    """
+
+    def __init__(self, data):
+        self.entries = {category: data.get(category, []) for category in CATEGORIES}
+        patterns = {}
+        for category, entries in self.entries.items():
+            for entry in entries:
+                terms = list(entry.get("terms", [])) + [entry["name"]]
+                if entry.get("cas"):
+                    terms.append(entry["cas"])
+                for term in terms:
+                    patterns[_normalize(term)] = (category, entry["name"])
+        self.automaton = AhoCorasick(patterns)
+
+    @classmethod
+    def load(cls, path=LEXICON_PATH):
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def names(self, category):
+        return [entry["name"] for entry in self.entries[category]]
+
+    def scan(self, text):
+        """
+        [(category, name, start, end)] - 카테고리별로 왼쪽부터 가장 긴 매칭만 남긴다.
+        ("메틸벤젠"은 벤젠이 아니라 톨루엔, "용접기"는 장비이면서 화기작업)
+        영문/숫자 용어(hcl, CAS 번호)는 단어 경계에서만 인정한다.
+        """
+        text = _normalize(text)
+        candidates = {}
+        for start, end, (category, name) in self.automaton.iter(text):
+            if _is_ascii_word(text[start]) and (
+                (start > 0 and _is_ascii_word(text[start - 1]))
+                or (end < len(text) and _is_ascii_word(text[end]))
+            ):
+                continue
+            candidates.setdefault(category, []).append((start, end, name))
+
+        matches = []
+        for category, found in candidates.items():
+            found.sort(key=lambda m: (m[0], -(m[1] - m[0])))
+            last_end = 0
+            for start, end, name in found:
+                if start >= last_end:
+                    matches.append((category, name, start, end))
+                    last_end = end
+        matches.sort(key=lambda m: m[2])
+        return matches
+
+    def detect(self, text):
+        """{category: [대표명...]} (텍스트 등장 순서, 중복 제거)"""
+        found = {category: [] for category in CATEGORIES}
+        for category, name, _, _ in self.scan(text):
+            if name not in found[category]:
+                found[category].append(name)
+        return found
+
+
+_lexicon = None
+_lock = threading.Lock()
+
+
+def get_lexicon():
+    global _lexicon
+    if _lexicon is None:
+        with _lock:
+            if _lexicon is None:
+                _lexicon = HazardLexicon.load()
+    return _lexicon
@@ -0,0 +1,353 @@
+import os
+import json
+import hashlib
+import sqlite3
+import threading
+import faiss
+from langchain_core.documents import Document
+from langchain_community.docstore.base import AddableMixin, Docstore
+from langchain_community.vectorstores import FAISS
+
+INDEX_FILE = "index.faiss"
+CHUNKS_FILE = "chunks.sqlite"
+
+# 필터 검색에 쓰는 메타데이터 필드 (rag_setup.classify_document 참고)
+FILTER_FIELDS = ("doc_type", "chemical", "source_name")
+
+# faiss 1.10+는 IndexFlat도 zero-copy mmap 가능, 이전 버전은 IVF 역리스트만 mmap
+MMAP_FLAGS = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP)
+MMAP_FLAGS |= getattr(faiss, "IO_FLAG_READ_ONLY", 0)
+
+
+def read_index(path, mmap=False):
+    """mmap=True면 인덱스를 메모리 매핑으로 열어 여러 프로세스가 OS 페이지 캐시를 공유"""
+    if mmap:
+        try:
+            return faiss.read_index(path, MMAP_FLAGS)
+        except RuntimeError as e:
+            print(f"⚠️ mmap 로드 실패, 일반 로드로 대체 : {e}")
+    return faiss.read_index(path)
+
+
+def write_index(index, path):
+    # 읽는 중인 프로세스가 있어도 기존 파일(inode)은 유지되도록 교체
+    tmp_path = path + ".tmp"
+    faiss.write_index(index, tmp_path)
+    os.replace(tmp_path, path)
+
+
+def _file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def index_fingerprint(path):
+    """인덱스 파일 지문: 크기/mtime(빠른 비교) + 내용 해시(복사 등으로 mtime이 바뀐 경우)"""
+    stat = os.stat(path)
+    return {
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "sha256": _file_sha256(path),
+    }
+
+
+def fingerprint_matches(path, expected):
+    if not expected or not os.path.exists(path):
+        return False
+    stat = os.stat(path)
+    if stat.st_size != expected["size"]:
+        return False
+    if stat.st_mtime_ns == expected["mtime_ns"]:
+        return True
+    return _file_sha256(path) == expected["sha256"]
+
+
+class SQLiteDocstore(Docstore, AddableMixin):
+    """
+    청크 본문/메타데이터를 SQLite에 두는 docstore (pickle 대체).
+    메타데이터 필터 색인(filters)과 BM25 역색인(terms/doc_len)도 같은 파일에 두어
+    프로세스마다 메모리에 다시 만들지 않고 SQL로 조회한다.
+    add/delete는 트랜잭션에 쌓였다가 commit() 시점(인덱스 저장과 함께)에 반영된다.
+    """
+
+    def __init__(self, path, read_only=False):
+        self.path = path
+        self._lock = threading.Lock()
+        if read_only:
+            self._conn = sqlite3.connect(
+                f"file:{path}?mode=ro", uri=True, check_same_thread=False
+            )
+            self._load_length_stats()
+            return
+
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS chunks (
+                doc_id TEXT PRIMARY KEY,
+                text TEXT NOT NULL,
+                metadata TEXT NOT NULL
+            )
+            """
+        )
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS positions (
+                position INTEGER PRIMARY KEY,
+                doc_id TEXT NOT NULL
+            )
+            """
+        )
+        # positions와 같은 트랜잭션으로 기록한 index.faiss 지문
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS meta "
+            "(key TEXT PRIMARY KEY, value TEXT NOT NULL)"
+        )
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS filters (
+                field TEXT NOT NULL,
+                value TEXT NOT NULL,
+                doc_id TEXT NOT NULL,
+                PRIMARY KEY (field, value, doc_id)
+            ) WITHOUT ROWID
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS filters_doc_id ON filters (doc_id)"
+        )
+        # BM25 역색인: term -> (doc_id, tf), 문서 길이
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS terms (
+                term TEXT NOT NULL,
+                doc_id TEXT NOT NULL,
+                tf INTEGER NOT NULL,
+                PRIMARY KEY (term, doc_id)
+            ) WITHOUT ROWID
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS terms_doc_id ON terms (doc_id)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS doc_len "
+            "(doc_id TEXT PRIMARY KEY, length INTEGER NOT NULL)"
+        )
+        self._conn.commit()
+        self._load_length_stats()
+
+    def _load_length_stats(self):
+        # BM25의 문서 수/전체 길이는 질의마다 집계하지 않도록 메모리에 유지
+        try:
+            count, total = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(length), 0) FROM doc_len"
+            ).fetchone()
+        except sqlite3.OperationalError:
+            # doc_len 테이블이 없는 이전 형식
+            count, total = 0, 0
+        self.doc_count, self.total_len = count, total
+
+    def search(self, search):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT text, metadata FROM chunks WHERE doc_id = ?", (search,)
+            ).fetchone()
+        if row is None:
+            return f"ID {search} not found."
+        # id는 context_assembler가 같은 페이지의 연속 청크를 찾는 데 쓴다
+        return Document(id=search, page_content=row[0], metadata=json.loads(row[1]))
+
+    def add(self, texts):
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO chunks (doc_id, text, metadata) "
+                "VALUES (?, ?, ?)",
+                [
+                    (
+                        doc_id,
+                        doc.page_content,
+                        json.dumps(doc.metadata, ensure_ascii=False),
+                    )
+                    for doc_id, doc in texts.items()
+                ],
+            )
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO filters (field, value, doc_id) VALUES (?, ?, ?)",
+                [
+                    (field, str(doc.metadata[field]), doc_id)
+                    for doc_id, doc in texts.items()
+                    for field in FILTER_FIELDS
+                    if doc.metadata.get(field)
+                ],
+            )
+
+    def delete(self, ids):
+        params = [(doc_id,) for doc_id in ids]
+        with self._lock:
+            for doc_id in ids:
+                row = self._conn.execute(
+                    "SELECT length FROM doc_len WHERE doc_id = ?", (doc_id,)
+                ).fetchone()
+                if row is not None:
+                    self.doc_count -= 1
+                    self.total_len -= row[0]
+            for table in ("chunks", "filters", "terms", "doc_len"):
+                self._conn.executemany(
+                    f"DELETE FROM {table} WHERE doc_id = ?", params
+                )
+
+    # --- 메타데이터 필터 ---
+    def filter_positions(self, field, values):
+        """field가 values 중 하나인 청크의 FAISS 위치 (commit된 positions 기준)"""
+        values = [str(v) for v in values]
+        marks = ", ".join("?" * len(values))
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT p.position FROM filters f "
+                "JOIN positions p ON p.doc_id = f.doc_id "
+                f"WHERE f.field = ? AND f.value IN ({marks}) ORDER BY p.position",
+                [field, *values],
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    # --- BM25 역색인 ---
+    def add_terms(self, doc_id, counts):
+        """counts: {term: tf}. 이미 색인된 문서면 무시"""
+        with self._lock:
+            exists = self._conn.execute(
+                "SELECT 1 FROM doc_len WHERE doc_id = ?", (doc_id,)
+            ).fetchone()
+            if exists:
+                return
+            length = sum(counts.values())
+            self._conn.execute(
+                "INSERT INTO doc_len (doc_id, length) VALUES (?, ?)", (doc_id, length)
+            )
+            self._conn.executemany(
+                "INSERT INTO terms (term, doc_id, tf) VALUES (?, ?, ?)",
+                [(term, doc_id, tf) for term, tf in counts.items()],
+            )
+            self.doc_count += 1
+            self.total_len += length
+
+    def document_frequencies(self, terms):
+        if not terms:
+            return {}
+        marks = ", ".join("?" * len(terms))
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT term, COUNT(*) FROM terms WHERE term IN ({marks}) "
+                "GROUP BY term",
+                list(terms),
+            ).fetchall()
+        return dict(rows)
+
+    def postings(self, term):
+        """[(doc_id, tf, 문서 길이)]"""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT t.doc_id, t.tf, d.length FROM terms t "
+                "JOIN doc_len d ON d.doc_id = t.doc_id WHERE t.term = ?",
+                (term,),
+            ).fetchall()
+
+    def load_positions(self):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT position, doc_id FROM positions ORDER BY position"
+            ).fetchall()
+        return dict(rows)
+
+    def load_fingerprint(self):
+        with self._lock:
+            try:
+                row = self._conn.execute(
+                    "SELECT value FROM meta WHERE key = 'index_fingerprint'"
+                ).fetchone()
+            except sqlite3.OperationalError:
+                # meta 테이블이 없는 이전 형식
+                return None
+        return json.loads(row[0]) if row else None
+
+    def commit(self, index_to_docstore_id, fingerprint):
+        """FAISS 위치 -> docstore ID 매핑과 인덱스 지문을 갱신하고 그동안의 변경을 확정"""
+        with self._lock:
+            self._conn.execute("DELETE FROM positions")
+            self._conn.executemany(
+                "INSERT INTO positions (position, doc_id) VALUES (?, ?)",
+                list(index_to_docstore_id.items()),
+            )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) "
+                "VALUES ('index_fingerprint', ?)",
+                (json.dumps(fingerprint),),
+            )
+            self._conn.commit()
+
+
+def exists(db_path):
+    return os.path.exists(os.path.join(db_path, INDEX_FILE)) and os.path.exists(
+        os.path.join(db_path, CHUNKS_FILE)
+    )
+
+
+def create_vectorstore(db_path, embeddings, dim):
+    os.makedirs(db_path, exist_ok=True)
+    return FAISS(
+        embedding_function=embeddings,
+        index=faiss.IndexFlatL2(dim),
+        docstore=SQLiteDocstore(os.path.join(db_path, CHUNKS_FILE)),
+        index_to_docstore_id={},
+    )
+
+
+def load_vectorstore(db_path, embeddings, mmap=False):
+    """
+    mmap=True: 서빙용 (읽기 전용 mmap 인덱스 + 읽기 전용 SQLite)
+    mmap=False: 동기화용 (쓰기 가능)
+    """
+    docstore = SQLiteDocstore(os.path.join(db_path, CHUNKS_FILE), read_only=mmap)
+    index_path = os.path.join(db_path, INDEX_FILE)
+    fingerprint = docstore.load_fingerprint()
+    if not fingerprint_matches(index_path, fingerprint):
+        # SQLite 확정 후 index.faiss 교체 직전에 중단됐으면 새 인덱스(.tmp)로 마저 교체
+        tmp_path = index_path + ".tmp"
+        if not mmap and fingerprint_matches(tmp_path, fingerprint):
+            print("♻️ 중단된 인덱스 저장을 마무리합니다.")
+            os.replace(tmp_path, index_path)
+        else:
+            # 개수가 같아도 위치 매핑이 다른 인덱스를 가리킬 수 있으므로 재생성 대상
+            raise ValueError("인덱스 파일이 SQLite에 기록된 지문과 다릅니다.")
+
+    index = read_index(index_path, mmap=mmap)
+    positions = docstore.load_positions()
+
+    # 저장 도중 중단되어 인덱스와 위치 매핑이 어긋났으면 재생성 대상
+    if index.ntotal != len(positions):
+        raise ValueError(
+            f"인덱스({index.ntotal})와 위치 매핑({len(positions)}) 개수가 다릅니다."
+        )
+
+    return FAISS(
+        embedding_function=embeddings,
+        index=index,
+        docstore=docstore,
+        index_to_docstore_id=positions,
+    )
+
+
+def save_vectorstore(vectorstore, db_path):
+    """
+    새 인덱스를 .tmp에 쓰고 -> 그 지문과 위치 매핑을 SQLite에 한 트랜잭션으로 확정 ->
+    index.faiss로 교체. 어느 단계에서 중단돼도 load 시 지문 비교로 어긋남을 감지한다.
+    """
+    index_path = os.path.join(db_path, INDEX_FILE)
+    tmp_path = index_path + ".tmp"
+    faiss.write_index(vectorstore.index, tmp_path)
+    vectorstore.docstore.commit(
+        vectorstore.index_to_docstore_id, index_fingerprint(tmp_path)
+    )
+    os.replace(tmp_path, index_path)
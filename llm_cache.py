@@ -0,0 +1,223 @@
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+import numpy as np
+from embedding_cache import normalize_text
+
+# 세션/프로세스가 바뀌어도 재사용되도록 SQLite에 저장 (LLM_CACHE_ENABLED=0이면 조회/저장 안 함)
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "1") == "1"
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", "./llm_cache/responses.sqlite")
+LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", str(7 * 24 * 3600)))  # 초
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "5000"))
+
+# 의미 유사도 캐시 (기본 꺼짐): bge-m3 코사인 유사도가 이 값 이상이면 재사용
+LLM_CACHE_SEMANTIC = os.getenv("LLM_CACHE_SEMANTIC", "0") == "1"
+LLM_CACHE_THRESHOLD = float(os.getenv("LLM_CACHE_THRESHOLD", "0.97"))
+
+# put 몇 번마다 만료/초과 항목을 정리할지
+PURGE_EVERY = 50
+
+
+def _sha256(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache:
+    """
+    LLM 응답 캐시.
+    - 정확 일치: (프롬프트 파일, 렌더링된 프롬프트 해시, 모델, temperature)
+    - 의미 유사도(선택): 같은 프롬프트 파일/모델/temperature/guard 안에서
+      semantic_text 임베딩이 threshold 이상 비슷하면 재사용
+    만료(TTL)는 조회 시 무시하고 주기적으로 삭제, 개수 초과 시 마지막 사용이 오래된 것부터 삭제(LRU).
+    """
+
+    def __init__(
+        self,
+        model,
+        temperature,
+        path=LLM_CACHE_PATH,
+        ttl=LLM_CACHE_TTL,
+        max_entries=LLM_CACHE_MAX_ENTRIES,
+        embed_fn=None,
+        threshold=LLM_CACHE_THRESHOLD,
+        enabled=LLM_CACHE_ENABLED,
+    ):
+        self.enabled = enabled
+        self.model = model
+        self.temperature = temperature
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.embed_fn = embed_fn
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self._puts = 0
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                namespace TEXT NOT NULL,
+                guard TEXT NOT NULL,
+                response TEXT NOT NULL,
+                vector BLOB,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_responses_ns "
+            "ON responses (namespace, guard)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_responses_used ON responses (last_used)"
+        )
+        self._conn.commit()
+        self.reset_stats()
+
+    # --- 통계 ---
+    def reset_stats(self):
+        self.stats = {"exact": 0, "semantic": 0, "misses": 0, "by_prompt": {}}
+
+    def _count(self, prompt_file, outcome):
+        self.stats[outcome] += 1
+        per_prompt = self.stats["by_prompt"].setdefault(
+            prompt_file, {"exact": 0, "semantic": 0, "misses": 0}
+        )
+        per_prompt[outcome] += 1
+
+    def stats_summary(self):
+        hits = self.stats["exact"] + self.stats["semantic"]
+        total = hits + self.stats["misses"]
+        return {
+            "exact": self.stats["exact"],
+            "semantic": self.stats["semantic"],
+            "misses": self.stats["misses"],
+            "hit_rate": round(hits / total, 3) if total else 0.0,
+        }
+
+    # --- 키 ---
+    def _namespace(self, prompt_file):
+        return f"{prompt_file}|{self.model}|{self.temperature}"
+
+    def _key(self, prompt_file, prompt):
+        return _sha256(f"{self._namespace(prompt_file)}|{_sha256(prompt)}")
+
+    def _embed(self, semantic_text):
+        vector = np.asarray(
+            self.embed_fn(normalize_text(semantic_text)), dtype=np.float32
+        )
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    @property
+    def semantic_enabled(self):
+        return LLM_CACHE_SEMANTIC and self.embed_fn is not None
+
+    # --- 조회/저장 ---
+    def get(self, prompt_file, prompt, semantic_text=None, guard=""):
+        """캐시된 응답 문자열, 없으면 None"""
+        if not self.enabled:
+            return None
+        now = time.time()
+        oldest = now - self.ttl
+        key = self._key(prompt_file, prompt)
+
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response FROM responses WHERE key = ? AND created_at >= ?",
+                (key, oldest),
+            ).fetchone()
+            if row is not None:
+                self._touch(key, now)
+        if row is not None:
+            self._count(prompt_file, "exact")
+            return row[0]
+
+        if semantic_text and self.semantic_enabled:
+            found = self._semantic_lookup(prompt_file, semantic_text, guard, oldest)
+            if found is not None:
+                match_key, response, score = found
+                with self._lock:
+                    self._touch(match_key, now)
+                print(f"♻️ 유사 응답 재사용 ({prompt_file}, 유사도 {score:.3f})")
+                self._count(prompt_file, "semantic")
+                return response
+
+        self._count(prompt_file, "misses")
+        return None
+
+    def _semantic_lookup(self, prompt_file, semantic_text, guard, oldest):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT key, response, vector FROM responses "
+                "WHERE namespace = ? AND guard = ? AND vector IS NOT NULL "
+                "AND created_at >= ?",
+                (self._namespace(prompt_file), guard, oldest),
+            ).fetchall()
+        if not rows:
+            return None
+
+        query = self._embed(semantic_text)
+        matrix = np.stack([np.frombuffer(r[2], dtype=np.float32) for r in rows])
+        scores = matrix @ query
+        best = int(np.argmax(scores))
+        if scores[best] < self.threshold:
+            return None
+        return rows[best][0], rows[best][1], float(scores[best])
+
+    def _touch(self, key, now):
+        self._conn.execute(
+            "UPDATE responses SET last_used = ? WHERE key = ?", (now, key)
+        )
+        self._conn.commit()
+
+    def put(self, prompt_file, prompt, response, semantic_text=None, guard=""):
+        if not self.enabled:
+            return
+        vector = None
+        if semantic_text and self.semantic_enabled:
+            vector = self._embed(semantic_text).tobytes()
+
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses "
+                "(key, namespace, guard, response, vector, created_at, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    self._key(prompt_file, prompt),
+                    self._namespace(prompt_file),
+                    guard,
+                    response,
+                    vector,
+                    now,
+                    now,
+                ),
+            )
+            self._conn.commit()
+            self._puts += 1
+            if self._puts % PURGE_EVERY == 0:
+                self._purge(now)
+
+    def _purge(self, now):
+        """TTL 만료 항목 삭제 후 max_entries 초과분을 LRU 순서로 삭제"""
+        self._conn.execute(
+            "DELETE FROM responses WHERE created_at < ?", (now - self.ttl,)
+        )
+        self._conn.execute(
+            "DELETE FROM responses WHERE key IN ("
+            "SELECT key FROM responses ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        )
+        self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
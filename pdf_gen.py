@@ -1,20 +1,82 @@
+import io
 import os
+import time
+import uuid
 import textwrap
+import threading
+import statistics
+from concurrent.futures import ProcessPoolExecutor
 from reportlab.pdfgen import canvas
 from reportlab.lib.pagesizes import A4
 from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfbase.cidfonts import UnicodeCIDFont
 from datetime import datetime
+from hazard_lexicon import get_lexicon
+
+OUTPUT_DIR = os.getenv("PDF_OUTPUT_DIR", "./outputs")
+# 대량 렌더링(render_many) 프로세스 수
+PDF_PROCESSES = int(os.getenv("PDF_PROCESSES", os.cpu_count() or 1))
 
 # --- [설정] 폰트 및 컬러 ---
-try:
-    pdfmetrics.registerFont(TTFont("Malgun", "C:/Windows/Fonts/Malgun.ttf"))
-    pdfmetrics.registerFont(TTFont("MalgunBd", "C:/Windows/Fonts/Malgunbd.ttf"))
-    font_norm = "Malgun"
-    font_bold = "MalgunBd"
-except:
-    font_norm = "Helvetica"
-    font_bold = "Helvetica-Bold"
+# (본문, 굵게) TTF 후보 - 위에서부터 처음 존재하는 것. TTF는 사용한 글자만 서브셋으로 임베드된다.
+FONT_CANDIDATES = [
+    (os.getenv("PDF_FONT_PATH"), os.getenv("PDF_FONT_BOLD_PATH")),
+    ("C:/Windows/Fonts/Malgun.ttf", "C:/Windows/Fonts/Malgunbd.ttf"),
+    (
+        "/usr/share/fonts/truetype/nanum/NanumGothic.ttf",
+        "/usr/share/fonts/truetype/nanum/NanumGothicBold.ttf",
+    ),
+    (
+        "/usr/share/fonts/nanum/NanumGothic.ttf",
+        "/usr/share/fonts/nanum/NanumGothicBold.ttf",
+    ),
+    ("./fonts/NanumGothic.ttf", "./fonts/NanumGothicBold.ttf"),
+]
+# TTF가 하나도 없을 때: PDF 뷰어 내장 한글 CID 폰트 (임베드 없음, 한글은 표시됨)
+CID_FALLBACK = "HYGothic-Medium"
+
+font_norm = None
+font_bold = None
+_font_lock = threading.Lock()
+
+
+def _load_fonts():
+    for regular, bold in FONT_CANDIDATES:
+        if not regular or not os.path.exists(regular):
+            continue
+        try:
+            pdfmetrics.registerFont(TTFont("KR", regular))
+            if bold and os.path.exists(bold):
+                pdfmetrics.registerFont(TTFont("KR-Bold", bold))
+                return "KR", "KR-Bold"
+            return "KR", "KR"
+        except Exception as e:
+            print(f"⚠️ 폰트 등록 실패 ({regular}): {e}")
+
+    print(f"⚠️ 한글 TTF 폰트를 찾지 못해 내장 CID 폰트({CID_FALLBACK})를 사용합니다.")
+    pdfmetrics.registerFont(UnicodeCIDFont(CID_FALLBACK))
+    return CID_FALLBACK, CID_FALLBACK
+
+
+def register_fonts():
+    """한글 폰트를 프로세스당 한 번만 등록한다. 반환: (본문, 굵게) 폰트 이름"""
+    global font_norm, font_bold
+    if font_norm is None:
+        # PDF 스레드 풀에서 동시에 호출되므로 한 스레드만 등록
+        with _font_lock:
+            if font_norm is None:
+                norm, bold = _load_fonts()
+                # font_norm이 준비 완료 표시이므로 font_bold를 먼저 채운다
+                font_bold = bold
+                font_norm = norm
+    return font_norm, font_bold
+
+
+def new_permit_id():
+    """허가서 번호: PTW-날짜-시각-임의 6자리 (동시 요청에서도 겹치지 않음)"""
+    return f"PTW-{datetime.now():%Y%m%d-%H%M%S}-{uuid.uuid4().hex[:6].upper()}"
+
 
 # 컬러 정의
 COL_NAVY = (0.05, 0.15, 0.3)
@@ -73,8 +135,11 @@ def draw_footer(c, width):
 
 def get_dynamic_checklist(user_input):
     """작업 내용별 동적 체크리스트"""
+    detected = get_lexicon().detect(user_input)
+    work_types = set(detected["work_type"])
+
     # 1. 화기/용접
-    if any(k in user_input for k in ["용접", "절단", "화기", "그라인더", "불티"]):
+    if "화기작업" in work_types:
         return [
             "용접면 / 보안경 착용",
             "불티 비산 방지포 설치",
@@ -84,10 +149,7 @@ def get_dynamic_checklist(user_input):
             "화기 감시인 배치 확인",
         ]
     # 2. 밀폐/화학
-    if any(
-        k in user_input
-        for k in ["탱크", "밀폐", "청소", "세척", "톨루엔", "벤젠", "화학"]
-    ):
+    if detected["chemical"] or work_types & {"밀폐공간", "청소/세척", "화학물질 취급"}:
         return [
             "송기마스크 / 방독마스크",
             "산소/유해가스 농도 측정",
@@ -97,9 +159,7 @@ def get_dynamic_checklist(user_input):
             "밀폐공간 감시인 배치",
         ]
     # 3. 고소/교체
-    if any(
-        k in user_input for k in ["고소", "교체", "사다리", "천장", "램프", "형광등"]
-    ):
+    if work_types & {"고소작업", "조명 교체", "교체작업"}:
         return [
             "안전모 (턱끈 체결 필수)",
             "안전대(벨트) 착용/체결",
@@ -119,13 +179,18 @@ def get_dynamic_checklist(user_input):
     ]
 
 
-def generate_permit_pdf(risk_score, risk_level, reason_summary, user_input):
+def render_permit_pdf(risk_score, risk_level, reason_summary, user_input, permit_id=None):
+    """
+    작업허가서를 메모리에서 렌더링한다. (디스크에 쓰지 않음)
+    반환: {"permit_id", "data"(PDF bytes), "render_ms", "size"}
+    """
+    register_fonts()
+    permit_id = permit_id or new_permit_id()
+    started = time.perf_counter()
 
-    if not os.path.exists("./outputs"):
-        os.makedirs("./outputs")
-
-    filename = f"./outputs/Permit_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
-    c = canvas.Canvas(filename, pagesize=A4)
+    buffer = io.BytesIO()
+    c = canvas.Canvas(buffer, pagesize=A4)
+    c.setTitle(permit_id)
     width, height = A4
 
     # 1. 헤더 배너
@@ -143,7 +208,10 @@ def generate_permit_pdf(risk_score, risk_level, reason_summary, user_input):
     c.setFillColorRGB(*COL_DARK_TXT)
     c.setFont(font_norm, 10)
     c.drawString(
-        60, current_y - 40, f"발행 일시: {datetime.now().strftime('%Y-%m-%d %H:%M')}"
+        60,
+        current_y - 40,
+        f"발행 일시: {datetime.now().strftime('%Y-%m-%d %H:%M')}"
+        f"   |   허가 번호: {permit_id}",
     )
 
     input_prefix = "신청 작업: "
@@ -255,4 +323,72 @@ def generate_permit_pdf(risk_score, risk_level, reason_summary, user_input):
 
     draw_footer(c, width)
     c.save()
-    return filename
+
+    data = buffer.getvalue()
+    return {
+        "permit_id": permit_id,
+        "data": data,
+        "render_ms": round((time.perf_counter() - started) * 1000, 1),
+        "size": len(data),
+    }
+
+
+def save_permit(pdf, output_dir=OUTPUT_DIR):
+    """render_permit_pdf 결과를 <허가 번호>.pdf로 저장 (같은 번호는 덮어씀)"""
+    os.makedirs(output_dir, exist_ok=True)
+    path = os.path.join(output_dir, f"{pdf['permit_id']}.pdf")
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(pdf["data"])
+    os.replace(tmp_path, path)
+    return path
+
+
+def generate_permit_pdf(
+    risk_score,
+    risk_level,
+    reason_summary,
+    user_input,
+    permit_id=None,
+    output_dir=OUTPUT_DIR,
+):
+    """렌더링 + outputs/ 보관. 반환: render_permit_pdf 결과에 "path" 추가"""
+    pdf = render_permit_pdf(risk_score, risk_level, reason_summary, user_input, permit_id)
+    pdf["path"] = save_permit(pdf, output_dir)
+    return pdf
+
+
+def _render_job(job, output_dir):
+    # 프로세스 풀 워커: bytes는 돌려보내지 않고 파일 경로와 지표만 반환
+    pdf = generate_permit_pdf(**job, output_dir=output_dir)
+    del pdf["data"]
+    return pdf
+
+
+def render_many(jobs, workers=None, output_dir=OUTPUT_DIR):
+    """
+    대량 렌더링: jobs(generate_permit_pdf 인자 dict 목록)를 프로세스 풀에서 나눠 렌더링한다.
+    폰트는 워커 프로세스마다 한 번 등록된다.
+    반환: 입력 순서대로 {"permit_id", "path", "render_ms", "size"}
+    """
+    if not jobs:
+        return []
+    workers = min(workers or PDF_PROCESSES, len(jobs))
+    started = time.perf_counter()
+    if workers <= 1:
+        results = [_render_job(job, output_dir) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(
+                pool.map(_render_job, jobs, [output_dir] * len(jobs), chunksize=4)
+            )
+    wall = time.perf_counter() - started
+
+    render_ms = [r["render_ms"] for r in results]
+    sizes = [r["size"] for r in results]
+    print(
+        f"🖨️ PDF {len(results)}건 / {wall:.1f}초 (프로세스 {workers}) | "
+        f"건당 렌더링 p50 {statistics.median(render_ms):.0f}ms / "
+        f"최대 {max(render_ms):.0f}ms | 평균 {statistics.mean(sizes) / 1024:.0f}KB"
+    )
+    return results
@@ -0,0 +1,135 @@
+import os
+import time
+import string
+import hashlib
+import threading
+
+PROMPT_DIR = os.getenv("PROMPT_DIR", "prompts")
+
+# 파일이 수정되면 다음 호출에서 다시 컴파일 (mtime 확인은 PROMPT_RELOAD_INTERVAL초에 한 번)
+PROMPT_HOT_RELOAD = os.getenv("PROMPT_HOT_RELOAD", "1") == "1"
+PROMPT_RELOAD_INTERVAL = float(os.getenv("PROMPT_RELOAD_INTERVAL", "1.0"))
+
+# 프롬프트 파일별로 코드가 넘기는 변수 (템플릿의 {변수}와 정확히 일치해야 한다)
+PROMPT_VARIABLES = {
+    "coordinator.md": {"user_input"},
+    "risk_analyst.md": {"chat_history", "user_input", "context"},
+    "admin_agent.md": {"user_input", "context"},
+    "work_summary.md": {"history", "last_input"},
+    "history_summary.md": {"summary", "turns"},
+}
+
+
+class CompiledPrompt:
+    """
+    str.format 파싱을 로드 시 한 번만 해 둔 템플릿.
+    render는 (리터럴, 변수) 조각을 이어 붙이기만 한다.
+    """
+
+    def __init__(self, name, text, mtime):
+        self.name = name
+        self.mtime = mtime
+        self.version = hashlib.sha256(text.encode("utf-8")).hexdigest()[:12]
+        self.parts = []
+        for literal, field, spec, conversion in string.Formatter().parse(text):
+            if field is not None and (
+                not field.isidentifier() or spec or conversion
+            ):
+                raise ValueError(
+                    f"{name}: 지원하지 않는 치환 형식 {{{field}}} "
+                    "(중괄호 문자는 {{ }}로 써야 합니다)"
+                )
+            self.parts.append((literal, field))
+        self.variables = {field for _, field in self.parts if field}
+
+    def render(self, values):
+        missing = self.variables - set(values)
+        extra = set(values) - self.variables
+        if missing or extra:
+            raise ValueError(
+                f"{self.name}: 변수 불일치 (누락 {sorted(missing)}, 미사용 {sorted(extra)})"
+            )
+        return "".join(
+            literal + ("" if field is None else str(values[field]))
+            for literal, field in self.parts
+        )
+
+
+class PromptRegistry:
+    """prompts/*.md를 한 번 읽어 컴파일해 두고, 파일이 바뀌면 다시 컴파일한다"""
+
+    def __init__(self, directory=PROMPT_DIR, variables=PROMPT_VARIABLES):
+        self.directory = directory
+        self.variables = variables
+        self._lock = threading.Lock()
+        self._prompts = {}
+        self._checked = {}
+        # 시작 시 전부 검증: 변수가 맞지 않으면 첫 요청이 아니라 여기서 실패
+        for name in sorted(variables):
+            self._prompts[name] = self._compile(name)
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _compile(self, name):
+        path = self._path(name)
+        mtime = os.path.getmtime(path)
+        with open(path, "r", encoding="utf-8") as f:
+            prompt = CompiledPrompt(name, f.read(), mtime)
+        expected = self.variables.get(name)
+        if expected is not None and prompt.variables != expected:
+            raise ValueError(
+                f"{name}: 템플릿 변수 {sorted(prompt.variables)} != "
+                f"코드가 넘기는 변수 {sorted(expected)}"
+            )
+        return prompt
+
+    def _reload_if_changed(self, name):
+        now = time.monotonic()
+        if now - self._checked.get(name, 0) < PROMPT_RELOAD_INTERVAL:
+            return
+        self._checked[name] = now
+        try:
+            changed = os.path.getmtime(self._path(name)) != self._prompts[name].mtime
+            if changed:
+                prompt = self._compile(name)
+        except (OSError, ValueError) as e:
+            # 편집 중 잘못된 템플릿은 반영하지 않고 이전 버전을 계속 사용
+            print(f"⚠️ 프롬프트 다시 로드 실패 ({name}), 이전 버전 유지: {e}")
+            return
+        if changed:
+            old = self._prompts[name].version
+            self._prompts[name] = prompt
+            print(f"🔄 프롬프트 변경 감지: {name} {old} -> {prompt.version}")
+
+    def get(self, name):
+        with self._lock:
+            if name not in self._prompts:
+                self._prompts[name] = self._compile(name)
+            elif PROMPT_HOT_RELOAD:
+                self._reload_if_changed(name)
+            return self._prompts[name]
+
+    def render(self, name, **values):
+        return self.get(name).render(values)
+
+    def version(self, name):
+        """템플릿 내용 해시 (캐시 키/추적 메타데이터용)"""
+        return self.get(name).version
+
+    def versions(self):
+        with self._lock:
+            return {name: prompt.version for name, prompt in self._prompts.items()}
+
+
+_registry = None
+_lock = threading.Lock()
+
+
+def get_prompts():
+    global _registry
+    if _registry is None:
+        with _lock:
+            if _registry is None:
+                _registry = PromptRegistry()
+    return _registry
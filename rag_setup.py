@@ -1,85 +1,429 @@
 import os
+import re
+import sys
+import json
+import time
 import shutil
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
 from dotenv import load_dotenv
-from langchain_community.document_loaders import PyPDFLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
+from pypdf import PdfReader
+from langchain_core.documents import Document
 from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_community.vectorstores import FAISS
+from embedding_cache import CachedEmbeddings, EMBED_BATCH_SIZE
+from bm25_index import BM25Index
+from structure_splitter import split_pages
+from ann_index import RAG_INDEX_TYPE, load_or_build
+from reranker import RERANK_ENABLED, RERANK_CANDIDATES
+from index_store import create_vectorstore, load_vectorstore, save_vectorstore
+from retrieval import (
+    load_static_results,
+    set_sparse_index,
+    HybridRetriever,
+    TARGET_CHEMICALS,
+)
 
 # 환경 변수 로드
 load_dotenv()
 
 DB_PATH = "./faiss_db"
+EMBED_MODEL = "BAAI/bge-m3"
+DATA_PATH = "./data"
+MANIFEST_PATH = os.path.join(DB_PATH, "manifest.json")
 
+# faiss_db 구성: index.faiss(mmap 가능한 FAISS 인덱스) + chunks.sqlite(청크 본문/메타데이터)
+#               + manifest.json / static_queries.json
+#               (chunks.sqlite에 메타데이터 필터 색인과 BM25 역색인도 함께 저장)
 
-def get_retriever():
+# 청킹/메타데이터 규칙이 바뀌면 올려서 전체 재생성을 유도
+# (4: 페이지 단위 800자 분할 -> 조문/절/MSDS 항목 단위 구조 분할 + article 메타데이터)
+# (5: 청크 ID에 파일 경로 포함 - 내용이 같은 두 파일의 ID 충돌 방지)
+# (6: bm25.json -> chunks.sqlite의 terms/doc_len 테이블, 메타데이터 필터 색인 추가)
+INDEX_VERSION = 6
 
-    print("🧠 임베딩 모델 로드 중 (BAAI/bge-m3)...")
-    embeddings = HuggingFaceEmbeddings(
-        model_name="BAAI/bge-m3",
+# 병렬 파싱 설정 (워커 수 / 작업 단위 페이지 수 / 동시에 대기시키는 작업 수)
+RAG_WORKERS = int(os.getenv("RAG_WORKERS", os.cpu_count() or 1))
+PAGES_PER_TASK = int(os.getenv("RAG_PAGES_PER_TASK", "32"))
+MAX_PENDING_PER_WORKER = 2
+
+
+def load_embedding_model():
+    print(f"🧠 임베딩 모델 로드 중 ({EMBED_MODEL})...")
+    return HuggingFaceEmbeddings(
+        model_name=EMBED_MODEL,
         model_kwargs={"device": "cpu"},
-        encode_kwargs={"normalize_embeddings": True},
+        encode_kwargs={"normalize_embeddings": True, "batch_size": EMBED_BATCH_SIZE},
     )
 
-    # 1. 이미 만들어진 DB가 있는지 확인
-    if os.path.exists(DB_PATH):
-        print("💾 기존 벡터 DB를 로드합니다...")
+
+def get_embeddings():
+    # 변경 없는 청크는 디스크 캐시에서 읽어오도록 래핑
+    # 모델(~2GB)은 실제 추론이 필요한 첫 호출 때 로드
+    return CachedEmbeddings(model_name=EMBED_MODEL, base_factory=load_embedding_model)
+
+
+# --- 매니페스트 (파일별 해시 + 청크 ID) ---
+def file_sha256(path):
+    """파일 내용 해시 (대용량 PDF를 위해 1MB 단위로 읽음)"""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def load_manifest():
+    if os.path.exists(MANIFEST_PATH):
         try:
-            vectorstore = FAISS.load_local(
-                DB_PATH, embeddings, allow_dangerous_deserialization=True
-            )
+            with open(MANIFEST_PATH, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+            if manifest.get("version") == INDEX_VERSION:
+                return manifest
+            print("⚠️ 인덱스 버전이 달라 전체 재생성이 필요합니다.")
+        except Exception as e:
+            print(f"⚠️ 매니페스트 로드 실패 : {e}")
+    return None
+
+
+def save_manifest(manifest):
+    os.makedirs(DB_PATH, exist_ok=True)
+    tmp_path = MANIFEST_PATH + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, MANIFEST_PATH)
+
+
+def corpus_fingerprint(files):
+    """인덱스 버전 + 파일별 해시로 만든 코퍼스 지문 (파생 캐시 무효화용)"""
+    h = hashlib.sha256(str(INDEX_VERSION).encode())
+    for name in sorted(files):
+        h.update(f"{name}:{files[name]['sha256']}".encode("utf-8"))
+    return h.hexdigest()[:16]
+
+
+def list_corpus_files():
+    return sorted(f for f in os.listdir(DATA_PATH) if f.endswith(".pdf"))
+
 
-            return vectorstore.as_retriever(
-                search_type="similarity",
-                search_kwargs={"k": 6},
+def diff_corpus(manifest):
+    """
+    data 폴더와 매니페스트를 비교해 added / updated / removed / unchanged 분류.
+    크기와 수정시각이 같으면 해시 계산을 생략한다.
+    """
+    known = manifest["files"]
+    current = {}
+    report = {"added": [], "updated": [], "removed": [], "unchanged": []}
+
+    for name in list_corpus_files():
+        path = os.path.join(DATA_PATH, name)
+        stat = os.stat(path)
+        entry = known.get(name)
+
+        if (
+            entry
+            and entry["size"] == stat.st_size
+            and entry["mtime"] == stat.st_mtime
+        ):
+            current[name] = entry
+            report["unchanged"].append(name)
+            continue
+
+        digest = file_sha256(path)
+        current[name] = {
+            "sha256": digest,
+            "size": stat.st_size,
+            "mtime": stat.st_mtime,
+            "chunk_ids": entry["chunk_ids"] if entry else [],
+        }
+        if entry is None:
+            report["added"].append(name)
+        elif entry["sha256"] != digest:
+            report["updated"].append(name)
+        else:
+            # 내용은 같고 mtime만 바뀐 경우 (복사 등)
+            report["unchanged"].append(name)
+
+    report["removed"] = [name for name in known if name not in current]
+    return current, report
+
+
+def classify_document(name):
+    """
+    파일명으로 문서 유형을 태깅한다. (필터 검색용 메타데이터)
+    MSDS / SOP(사내 규정) / LAW(법령) / GUIDE(KOSHA 기술지침) / STAT(재해 통계) / ETC
+    """
+    stem = os.path.splitext(name)[0]
+    metadata = {"source_name": name, "doc_type": "ETC"}
+
+    if "Regulation" in stem or stem.startswith("S Chem"):
+        metadata["doc_type"] = "SOP"
+    elif re.match(r"^[A-Z]-\d+-\d{4}", stem):
+        metadata["doc_type"] = "GUIDE"
+    elif "산업재해현황" in stem:
+        metadata["doc_type"] = "STAT"
+    elif "법" in stem or "규칙" in stem:
+        metadata["doc_type"] = "LAW"
+    else:
+        for chem in TARGET_CHEMICALS:
+            if chem in stem:
+                metadata["doc_type"] = "MSDS"
+                metadata["chemical"] = chem
+                break
+    return metadata
+
+
+def load_and_split(path, digest, page_start, page_end):
+    """
+    PDF의 페이지 구간 하나를 추출해 조문/절/MSDS 항목 단위로 분할한다.
+    (프로세스 풀 워커에서 실행)
+    구간 안에서는 페이지를 넘는 조문도 한 청크로 묶인다. (구간 경계에서만 나뉨)
+    청크 ID는 (파일 경로+해시, 시작 페이지, 페이지 내 순번)으로 고정되어 처리 순서와 무관하다.
+    """
+    reader = PdfReader(path)
+    doc_metadata = classify_document(os.path.basename(path))
+    pages = [
+        reader.pages[page].extract_text() or "" for page in range(page_start, page_end)
+    ]
+
+    prefix = chunk_id_prefix(path, digest)
+    splits, ids, per_page = [], [], {}
+    for chunk in split_pages(pages, doc_metadata["doc_type"], first_page=page_start):
+        page = chunk["page"]
+        i = per_page.get(page, 0)
+        per_page[page] = i + 1
+        # PyPDFLoader와 동일한 메타데이터(source, page) + 끝 페이지/조항 번호
+        splits.append(
+            Document(
+                page_content=chunk["text"],
+                metadata={
+                    "source": path,
+                    "page": page,
+                    "page_end": chunk["page_end"],
+                    "article": chunk["article"],
+                    **doc_metadata,
+                },
             )
+        )
+        ids.append(f"{prefix}-{page:05d}-{i:03d}")
+    return splits, ids
+
+
+def chunk_id_prefix(path, digest):
+    """
+    내용 해시만 쓰면 내용이 같은 두 파일(사본 등)이 같은 ID를 받아 docstore 한 행을
+    두 FAISS 위치가 가리키게 되므로 파일 경로까지 포함한다.
+    """
+    key = f"{os.path.relpath(path, DATA_PATH)}\0{digest}"
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:16]
+
+
+def plan_tasks(names, current):
+    """파일을 PAGES_PER_TASK 단위 페이지 구간으로 쪼개 작업 목록 생성"""
+    tasks = []
+    for name in names:
+        path = os.path.join(DATA_PATH, name)
+        num_pages = len(PdfReader(path).pages)
+        for start in range(0, num_pages, PAGES_PER_TASK):
+            end = min(start + PAGES_PER_TASK, num_pages)
+            tasks.append((name, path, current[name]["sha256"], start, end))
+    return tasks
+
+
+def iter_chunks(tasks, workers=None):
+    """
+    페이지 구간 작업을 프로세스 풀에서 파싱하고, 끝나는 순서대로 (파일명, 청크, ID)를 내보낸다.
+    대기 중인 작업 수를 워커 수의 배수로 제한해 메모리 사용량을 묶어둔다.
+    """
+    workers = workers or RAG_WORKERS
 
-            # mmr? (실험해보기)
-            # return vectorstore.as_retriever(
-            #     search_type="mmr",
-            #     search_kwargs={"k": 10, "fetch_k": 20},
-            # )
+    if workers <= 1:
+        for name, path, digest, start, end in tasks:
+            yield name, *load_and_split(path, digest, start, end)
+        return
 
+    max_pending = workers * MAX_PENDING_PER_WORKER
+    queue = list(reversed(tasks))
+    pending = {}
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        while queue or pending:
+            while queue and len(pending) < max_pending:
+                name, path, digest, start, end = queue.pop()
+                future = pool.submit(load_and_split, path, digest, start, end)
+                pending[future] = name
+
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = pending.pop(future)
+                yield name, *future.result()
+
+
+# --- 증분 동기화 ---
+def sync_index(embeddings=None, workers=None):
+    """
+    매니페스트 기준으로 변경된 파일의 청크만 삭제/재임베딩한다.
+    파싱/청킹은 프로세스 풀에서 병렬로 돌고, 끝난 구간부터 바로 임베딩된다.
+    BM25 역색인도 같은 청크 ID로 함께 갱신한다. (docstore와 같은 SQLite 트랜잭션)
+    반환: (vectorstore 또는 None, BM25Index 또는 None, 리포트 dict)
+    """
+    started = time.time()
+
+    if not os.path.exists(DATA_PATH):
+        os.makedirs(DATA_PATH)
+        print("⚠️ 'data' 폴더가 비어있습니다. PDF 파일을 넣어주세요.")
+
+    if embeddings is None:
+        embeddings = get_embeddings()
+    if isinstance(embeddings, CachedEmbeddings):
+        embeddings.reset_stats()
+
+    manifest = load_manifest()
+    vectorstore = None
+
+    # 1. 기존 DB 로드 (매니페스트가 유효할 때만)
+    if manifest is not None:
+        current, report = diff_corpus(manifest)
+        changed = report["added"] or report["updated"] or report["removed"]
+        print("💾 기존 벡터 DB를 로드합니다...")
+        try:
+            # 변경이 없으면 읽기 전용 mmap으로 열어 프로세스 간 페이지 캐시를 공유
+            vectorstore = load_vectorstore(DB_PATH, embeddings, mmap=not changed)
         except Exception as e:
             print(f"⚠️ 기존 DB 로드 실패 : {e}")
+            manifest = None
+
+    if manifest is None:
+        if os.path.exists(DB_PATH):
             print("🗑️ 기존 DB를 삭제하고 새로 생성합니다.")
             shutil.rmtree(DB_PATH)  # 폴더 삭제
+        manifest = {"version": INDEX_VERSION, "files": {}}
+        # 2. 변경 사항 계산 (전체가 added)
+        current, report = diff_corpus(manifest)
+        changed = bool(report["added"])
 
-    # 2. 없으면 새로 생성
-    print("🔄 새로운 벡터 DB를 생성합니다...")
-    if not os.path.exists("./data"):
-        os.makedirs("./data")
-        print("⚠️ 'data' 폴더가 비어있습니다. PDF 파일을 넣어주세요.")
-        return None
+    bm25 = BM25Index(vectorstore.docstore) if vectorstore is not None else None
+
+    # 3. 삭제/수정된 파일의 기존 청크 제거 (docstore.delete가 BM25 posting도 함께 삭제)
+    stale_ids = []
+    for name in report["removed"] + report["updated"]:
+        stale_ids.extend(manifest["files"][name]["chunk_ids"])
+    if vectorstore is not None and stale_ids:
+        vectorstore.delete(stale_ids)
+
+    # 4. 추가/수정된 파일만 병렬 파싱 후 임베딩
+    targets = report["added"] + report["updated"]
+    for name in targets:
+        print(f"   - 로딩 중: {name}")
+        current[name]["chunk_ids"] = []
 
-    documents = []
-    for file in os.listdir("./data"):
-        if file.endswith(".pdf"):
-            print(f"   - 로딩 중: {file}")
-            loader = PyPDFLoader(f"./data/{file}")
-            docs = loader.load()
-            documents.extend(docs)
+    for name, splits, ids in iter_chunks(plan_tasks(targets, current), workers):
+        current[name]["chunk_ids"].extend(ids)
+        if not splits:
+            continue
 
-    if not documents:
+        texts = [split.page_content for split in splits]
+        vectors = embeddings.embed_documents(texts)
+        if vectorstore is None:
+            vectorstore = create_vectorstore(DB_PATH, embeddings, len(vectors[0]))
+            bm25 = BM25Index(vectorstore.docstore)
+        vectorstore.add_embeddings(
+            zip(texts, vectors), [split.metadata for split in splits], ids=ids
+        )
+        for doc_id, text in zip(ids, texts):
+            bm25.add(doc_id, text)
+
+    for name in targets:
+        current[name]["chunk_ids"].sort()
+
+    if vectorstore is not None and (changed or not os.path.exists(MANIFEST_PATH)):
+        save_vectorstore(vectorstore, DB_PATH)
+        manifest["files"] = current
+        save_manifest(manifest)
+    elif current != manifest["files"]:
+        # mtime만 바뀐 경우 다음 실행에서 해시 재계산을 피하도록 갱신
+        manifest["files"] = current
+        save_manifest(manifest)
+
+    report["fingerprint"] = corpus_fingerprint(current)
+    report["seconds"] = round(time.time() - started, 2)
+    if isinstance(embeddings, CachedEmbeddings):
+        report["embedding"] = embeddings.stats_summary()
+    return vectorstore, bm25, report
+
+
+def print_sync_report(report):
+    print("📊 [동기화 결과]")
+    for key, label in [
+        ("added", "추가"),
+        ("updated", "변경"),
+        ("removed", "삭제"),
+        ("unchanged", "유지"),
+    ]:
+        print(f"   - {label}: {len(report[key])}건")
+        if key != "unchanged":
+            for name in report[key]:
+                print(f"       · {name}")
+    print(f"   ⏱️ 소요 시간: {report['seconds']}초")
+    if "embedding" in report:
+        stats = report["embedding"]
+        print(
+            f"   🧠 임베딩 캐시: hit {stats['hits']} / miss {stats['misses']} "
+            f"(적중률 {stats['hit_rate']:.0%}, {stats['chunks_per_sec']} chunks/s)"
+        )
+
+
+def get_retriever(embeddings=None):
+    vectorstore, bm25, report = sync_index(embeddings)
+
+    if report["added"] or report["updated"] or report["removed"]:
+        print_sync_report(report)
+
+    if vectorstore is None:
         print("❌ 로드할 PDF 파일이 없습니다.")
         return None
 
-    # 3. 텍스트 분할 (Chunking)
-    text_splitter = RecursiveCharacterTextSplitter(chunk_size=800, chunk_overlap=100)
-    splits = text_splitter.split_documents(documents)
+    # 대용량 코퍼스용 근사 인덱스 (flat 인덱스에서 파생, 위치/ID 매핑은 동일)
+    if RAG_INDEX_TYPE != "flat" and vectorstore.index.ntotal:
+        vectorstore.index = load_or_build(
+            DB_PATH, vectorstore.index, RAG_INDEX_TYPE, report["fingerprint"]
+        )
 
-    # 4. 벡터 저장소 생성 및 저장
-    print("vectors 생성 중... (시간이 조금 걸릴 수 있습니다)")
-    vectorstore = FAISS.from_documents(splits, embeddings)
-    vectorstore.save_local(DB_PATH)
-    print("🎉 DB 생성 및 저장 완료!")
+    # Dense(FAISS) + Lexical(BM25) 결과를 RRF로 융합
+    set_sparse_index(bm25)
 
-    # 리턴 시에도 동일한 검색 조건 적용
-    return vectorstore.as_retriever(
-        search_type="similarity_score_threshold",
-        search_kwargs={"score_threshold": 0.4, "k": 8},
-    )
+    # 요청마다 반복되는 고정 질의는 여기서 한 번만 검색
+    # 재순위를 쓰면 고정 질의도 후보 풀 크기만큼 미리 계산
+    static_k = max(6, RERANK_CANDIDATES) if RERANK_ENABLED else 6
+    load_static_results(vectorstore, DB_PATH, report["fingerprint"], k=static_k)
+
+    return HybridRetriever(vectorstore=vectorstore, search_kwargs={"k": 6})
+
+    # mmr? (실험해보기)
+    # return vectorstore.as_retriever(
+    #     search_type="mmr",
+    #     search_kwargs={"k": 10, "fetch_k": 20},
+    # )
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="SafeGuard-AI 벡터 DB 관리")
+    parser.add_argument(
+        "--sync",
+        action="store_true",
+        help="data 폴더의 변경분(추가/변경/삭제)만 인덱스에 반영하고 결과를 출력",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help=f"PDF 파싱 프로세스 수 (기본값: RAG_WORKERS={RAG_WORKERS})",
+    )
+    args = parser.parse_args()
+
+    if args.sync:
+        _, _, sync_report = sync_index(workers=args.workers)
+        print_sync_report(sync_report)
+        sys.exit(0)
+
     get_retriever()
@@ -0,0 +1,237 @@
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from embedding_cache import normalize_text, LOOKUP_CHUNK
+
+# Cross-encoder 재순위 (기본 꺼짐, RERANK_ENABLED=1로 사용)
+#   후보 RERANK_CANDIDATES개를 검색한 뒤 cross-encoder 점수로 다시 정렬해 k개만 남긴다.
+RERANK_ENABLED = os.getenv("RERANK_ENABLED", "0") == "1"
+RERANK_MODEL = os.getenv("RERANK_MODEL", "BAAI/bge-reranker-v2-m3")
+RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", "30"))
+RERANK_BATCH_SIZE = int(os.getenv("RERANK_BATCH_SIZE", "16"))
+# 요청당 재순위 지연 상한. 넘기면 벡터 검색 순서를 그대로 쓰고 남은 배치는 건너뛴다
+# (버려진 요청의 배치가 워커를 붙잡아 다음 요청까지 연달아 상한을 넘기지 않도록)
+RERANK_BUDGET_MS = float(os.getenv("RERANK_BUDGET_MS", "1500"))
+RERANK_MAX_LENGTH = 512
+
+# CPU용 ONNX int8 동적 양자화 (arm64 / avx2 / avx512 / avx512_vnni)
+RERANK_QUANTIZATION = os.getenv("RERANK_QUANTIZATION", "avx2")
+ONNX_DIR = os.getenv("RERANK_ONNX_DIR", "./models/reranker-onnx")
+
+CACHE_PATH = os.getenv("RERANK_CACHE_PATH", "./embedding_cache/rerank.sqlite")
+
+
+def _quantized_file():
+    return f"onnx/model_qint8_{RERANK_QUANTIZATION}.onnx"
+
+
+def load_reranker_model():
+    """
+    ONNX int8 cross-encoder. 처음 한 번 HF 모델을 ONNX로 내보내고 양자화해 ONNX_DIR에 저장한다.
+    optimum/onnxruntime이 없으면 PyTorch CPU로 실행한다.
+    """
+    from sentence_transformers import CrossEncoder
+
+    print(f"🧮 재순위 모델 로드 중 ({RERANK_MODEL}, ONNX int8 {RERANK_QUANTIZATION})...")
+    kwargs = {"max_length": RERANK_MAX_LENGTH, "device": "cpu"}
+    quantized = _quantized_file()
+    try:
+        if not os.path.exists(os.path.join(ONNX_DIR, quantized)):
+            from sentence_transformers import export_dynamic_quantized_onnx_model
+
+            model = CrossEncoder(RERANK_MODEL, backend="onnx", **kwargs)
+            model.save_pretrained(ONNX_DIR)
+            export_dynamic_quantized_onnx_model(model, RERANK_QUANTIZATION, ONNX_DIR)
+        return CrossEncoder(
+            ONNX_DIR, backend="onnx", model_kwargs={"file_name": quantized}, **kwargs
+        )
+    except Exception as e:
+        print(f"⚠️ ONNX 재순위 모델 준비 실패 ({e}) -> PyTorch CPU로 실행")
+        return CrossEncoder(RERANK_MODEL, **kwargs)
+
+
+class Reranker:
+    """
+    (모델명, 질의, 청크) 점수를 SQLite에 캐시하는 cross-encoder 재순위기.
+    캐시 미스 쌍만 길이순으로 정렬해 batch_size 단위로 모델에 넘긴다.
+    모델은 실제 점수 계산이 필요한 첫 호출 때 로드한다.
+    """
+
+    def __init__(
+        self,
+        model_factory=load_reranker_model,
+        model_name=RERANK_MODEL,
+        cache_path=CACHE_PATH,
+        batch_size=None,
+        budget_ms=None,
+    ):
+        self._model = None
+        self._model_factory = model_factory
+        self._model_lock = threading.Lock()
+        self.model_name = model_name
+        self.batch_size = batch_size or RERANK_BATCH_SIZE
+        self.budget_ms = RERANK_BUDGET_MS if budget_ms is None else budget_ms
+        # 점수 계산은 워커 1개에서 순서대로 (지연 상한을 넘겨도 요청 스레드는 바로 돌아간다)
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="rerank")
+        self._lock = threading.Lock()
+
+        if cache_path != ":memory:":
+            os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(cache_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS scores (
+                model TEXT NOT NULL,
+                pair_hash TEXT NOT NULL,
+                score REAL NOT NULL,
+                PRIMARY KEY (model, pair_hash)
+            )
+            """
+        )
+        self._conn.commit()
+        self.reset_stats()
+
+    @property
+    def model(self):
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    self._model = self._model_factory()
+        return self._model
+
+    @property
+    def is_loaded(self):
+        return self._model is not None
+
+    # --- 통계 ---
+    def reset_stats(self):
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "fallbacks": 0,
+            "skipped": 0,
+            "seconds": 0.0,
+        }
+
+    def stats_summary(self):
+        total = self.stats["hits"] + self.stats["misses"]
+        return {
+            "hits": self.stats["hits"],
+            "misses": self.stats["misses"],
+            "hit_rate": round(self.stats["hits"] / total, 3) if total else 0.0,
+            "fallbacks": self.stats["fallbacks"],
+            "skipped": self.stats["skipped"],
+            "seconds": round(self.stats["seconds"], 2),
+        }
+
+    # --- 캐시 입출력 ---
+    def _hash(self, query, text):
+        pair = f"{normalize_text(query)}\x00{normalize_text(text)}"
+        return hashlib.sha256(pair.encode("utf-8")).hexdigest()
+
+    def _lookup(self, hashes):
+        found = {}
+        for i in range(0, len(hashes), LOOKUP_CHUNK):
+            part = hashes[i : i + LOOKUP_CHUNK]
+            placeholders = ",".join("?" * len(part))
+            with self._lock:
+                rows = self._conn.execute(
+                    f"SELECT pair_hash, score FROM scores "
+                    f"WHERE model = ? AND pair_hash IN ({placeholders})",
+                    [self.model_name, *part],
+                ).fetchall()
+            found.update(rows)
+        return found
+
+    def _store(self, items):
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO scores (model, pair_hash, score) "
+                "VALUES (?, ?, ?)",
+                [(self.model_name, pair_hash, float(s)) for pair_hash, s in items],
+            )
+            self._conn.commit()
+
+    def _score(self, missing, cancelled=None):
+        """
+        missing: {pair_hash: (질의, 청크)} -> {pair_hash: 점수} (배치마다 캐시에 저장)
+        cancelled: 요청이 지연 상한을 넘겨 결과를 버렸으면 set되는 Event.
+        배치마다 확인해 남은 배치는 계산하지 않는다. (이미 끝난 배치 점수는 캐시에 남음)
+        """
+        order = sorted(missing, key=lambda h: len(missing[h][1]))
+        scores = {}
+        for i in range(0, len(order), self.batch_size):
+            if cancelled is not None and cancelled.is_set():
+                self.stats["skipped"] += len(order) - i
+                break
+            batch = order[i : i + self.batch_size]
+            predicted = self.model.predict(
+                [missing[h] for h in batch],
+                batch_size=self.batch_size,
+                show_progress_bar=False,
+            )
+            items = list(zip(batch, predicted))
+            self._store(items)
+            scores.update(items)
+        return scores
+
+    # --- 재순위 ---
+    def rerank_many(self, queries, doc_lists, k, budget_ms=None):
+        """
+        질의별 후보 Document 리스트를 cross-encoder 점수 순으로 다시 정렬해 k개씩 돌려준다.
+        요청의 모든 (질의, 청크) 쌍을 한 번에 배치 처리한다.
+        budget_ms: 지연 상한 (None이면 RERANK_BUDGET_MS, 0이면 상한 없음).
+        상한을 넘기거나 모델 오류가 나면 입력(벡터 검색) 순서의 앞 k개.
+        """
+        started = time.perf_counter()
+        budget_ms = self.budget_ms if budget_ms is None else budget_ms
+        hashes = [
+            [self._hash(query, doc.page_content) for doc in docs]
+            for query, docs in zip(queries, doc_lists)
+        ]
+        scores = self._lookup(list({h for row in hashes for h in row}))
+
+        missing = {}
+        for query, docs, row in zip(queries, doc_lists, hashes):
+            for doc, pair_hash in zip(docs, row):
+                if pair_hash not in scores:
+                    missing.setdefault(pair_hash, (query, doc.page_content))
+        self.stats["misses"] += len(missing)
+        self.stats["hits"] += sum(len(row) for row in hashes) - len(missing)
+
+        if missing:
+            cancelled = threading.Event()
+            future = self._executor.submit(self._score, missing, cancelled)
+            try:
+                scores.update(future.result(timeout=budget_ms / 1000 or None))
+            except FutureTimeout:
+                # 아직 대기 중이면 취소, 실행 중이면 다음 배치부터 건너뛴다
+                cancelled.set()
+                future.cancel()
+                self.stats["fallbacks"] += 1
+                print(f"⏱️ [재순위] {budget_ms:.0f}ms 초과 -> 벡터 검색 순서 사용")
+                return [docs[:k] for docs in doc_lists]
+            except Exception as e:
+                self.stats["fallbacks"] += 1
+                print(f"⚠️ [재순위] 실패 ({e}) -> 벡터 검색 순서 사용")
+                return [docs[:k] for docs in doc_lists]
+
+        # 점수가 같으면 원래(벡터 검색) 순서 유지
+        reranked = [
+            [
+                docs[i]
+                for i in sorted(
+                    range(len(docs)), key=lambda i: scores[row[i]], reverse=True
+                )[:k]
+            ]
+            for docs, row in zip(doc_lists, hashes)
+        ]
+        self.stats["seconds"] += time.perf_counter() - started
+        return reranked
+
+    def rerank(self, query, docs, k, budget_ms=None):
+        return self.rerank_many([query], [docs], k, budget_ms)[0]
@@ -0,0 +1,157 @@
+import os
+import time
+import threading
+from langchain_core.rate_limiters import InMemoryRateLimiter
+from langchain_openai import ChatOpenAI
+import rag_setup
+import sif_table
+from llm_cache import LLMResponseCache
+from reranker import Reranker, RERANK_ENABLED
+
+# 프로세스 시작 시각 (time-to-ready 측정 기준)
+PROCESS_STARTED = time.time()
+
+LLM_MODEL = "gpt-4o"
+LLM_TEMPERATURE = 0
+
+_resources = {}
+_locks = {
+    name: threading.Lock()
+    for name in ("llm", "llm_cache", "embeddings", "retriever", "tables", "reranker")
+}
+
+# tokens: 노드(프롬프트 파일)별 {"calls", "cached", "input", "output"}
+# time_to_ready: 프로세스 시작 -> warm-up 완료 (요청을 바로 처리할 수 있는 시점)
+# first_request_seconds: 첫 요청의 종단 간 처리 시간 (cold start 영향 확인용)
+metrics = {
+    "init_seconds": {},
+    "time_to_ready": None,
+    "first_request_seconds": None,
+    "tokens": {},
+}
+_metrics_lock = threading.Lock()
+
+
+def _get_or_create(name, factory):
+    """리소스별 락으로 한 번만 생성 (서로 다른 리소스는 병렬로 초기화 가능)"""
+    if name in _resources:
+        return _resources[name]
+    with _locks[name]:
+        if name not in _resources:
+            started = time.time()
+            _resources[name] = factory()
+            metrics["init_seconds"][name] = round(time.time() - started, 2)
+    return _resources[name]
+
+
+def _rate_limiter():
+    """LLM_RPM(분당 요청 수)이 설정되면 모든 LLM 호출이 공유하는 토큰 버킷 (캐시 적중은 제외)"""
+    rpm = float(os.getenv("LLM_RPM", "0"))
+    if rpm <= 0:
+        return None
+    return InMemoryRateLimiter(
+        requests_per_second=rpm / 60, check_every_n_seconds=0.05, max_bucket_size=1
+    )
+
+
+def get_llm():
+    return _get_or_create(
+        "llm",
+        lambda: ChatOpenAI(
+            model=LLM_MODEL,
+            temperature=LLM_TEMPERATURE,
+            rate_limiter=_rate_limiter(),
+        ),
+    )
+
+
+def get_llm_cache():
+    # 의미 유사도 캐시는 검색용 bge-m3 모델을 그대로 재사용 (처음 필요할 때 로드)
+    return _get_or_create(
+        "llm_cache",
+        lambda: LLMResponseCache(
+            LLM_MODEL,
+            LLM_TEMPERATURE,
+            embed_fn=lambda text: get_embeddings().embed_query(text),
+        ),
+    )
+
+
+def get_embeddings():
+    return _get_or_create("embeddings", rag_setup.get_embeddings)
+
+
+def get_retriever():
+    return _get_or_create(
+        "retriever", lambda: rag_setup.get_retriever(get_embeddings())
+    )
+
+
+def get_reranker():
+    """cross-encoder 재순위기 (RERANK_ENABLED=1일 때만, 아니면 None)"""
+    if not RERANK_ENABLED:
+        return None
+    return _get_or_create("reranker", Reranker)
+
+
+def get_structured_tables():
+    """(SIFTable, AccidentStats) - SIF 목록 xlsx / 산업재해현황 PDF"""
+    return _get_or_create(
+        "tables",
+        lambda: sif_table.load_tables(rag_setup.DATA_PATH),
+    )
+
+
+def warm_up(background=True):
+    """
+    인덱스 로드와 임베딩 모델 로드를 병렬로 미리 수행한다.
+    background=True면 데몬 스레드로 돌리고 바로 반환한다.
+    """
+
+    def _load_model():
+        embeddings = get_embeddings()
+        if not embeddings.is_loaded:
+            embeddings.base
+
+    def _load_reranker():
+        reranker = get_reranker()
+        if reranker is not None:
+            reranker.model
+
+    tasks = [get_llm, get_retriever, get_structured_tables, _load_model, _load_reranker]
+    threads = [threading.Thread(target=t, daemon=True) for t in tasks]
+    for thread in threads:
+        thread.start()
+
+    def _record_ready():
+        for thread in threads:
+            thread.join()
+        if metrics["time_to_ready"] is None:
+            metrics["time_to_ready"] = round(time.time() - PROCESS_STARTED, 2)
+            print(f"⏱️ time-to-ready: {metrics['time_to_ready']}초")
+
+    if background:
+        threading.Thread(target=_record_ready, daemon=True).start()
+    else:
+        _record_ready()
+    return threads
+
+
+def record_request(seconds):
+    """첫 요청의 종단 간 처리 시간을 기록 (요청 수신 -> 응답 완료)"""
+    if metrics["first_request_seconds"] is None:
+        metrics["first_request_seconds"] = round(seconds, 2)
+        print(f"⏱️ 첫 요청 처리 시간: {metrics['first_request_seconds']}초")
+
+
+def record_tokens(node, input_tokens=0, output_tokens=0, cached=False):
+    """노드별 LLM 토큰 사용량 누적 (캐시 적중은 호출 수만 센다)"""
+    with _metrics_lock:
+        usage = metrics["tokens"].setdefault(
+            node, {"calls": 0, "cached": 0, "input": 0, "output": 0}
+        )
+        usage["calls"] += 1
+        if cached:
+            usage["cached"] += 1
+        usage["input"] += input_tokens
+        usage["output"] += output_tokens
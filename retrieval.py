@@ -0,0 +1,271 @@
+import os
+import json
+import faiss
+import numpy as np
+from typing import Any
+from langchain_core.retrievers import BaseRetriever
+from ann_index import search_params
+from hazard_lexicon import get_lexicon
+
+STATIC_RESULTS_FILE = "static_queries.json"
+# 고정 질의 결과 계산 방식이 바뀌면 올린다 (1: dense, 2: dense + BM25 RRF)
+STATIC_VERSION = 2
+
+# 하이브리드 검색 설정 (RRF 상수 / BM25 지연 예산 / 융합 전 후보 배수)
+RRF_K = 60
+SPARSE_BUDGET_MS = float(os.getenv("SPARSE_BUDGET_MS", "20"))
+FETCH_MULTIPLIER = 2
+
+# 필터 대상 청크가 이보다 적으면 해당 벡터만 꺼내 정확 검색 (ANN 인덱스에서도 top-k 보장)
+EXACT_FILTER_LIMIT = 2048
+
+# 요청마다 똑같이 던지는 고정 질의 (인덱스 생성/로드 시 미리 검색해 둔다)
+SOP_QUERY = "S Chem Safety Regulation_v2 사내 안전 작업 허가 지침 절차"
+# MSDS 대상 화학물질은 위험 요소 사전(lexicon/hazards.json)의 대표명
+TARGET_CHEMICALS = get_lexicon().names("chemical")
+
+# 고정 질의 키 -> docstore ID 목록
+_static_results = {}
+_static_k = 0
+
+# BM25 역색인 (rag_setup.get_retriever에서 주입)
+_sparse = {"index": None}
+
+
+def msds_query(chemical):
+    return f"{chemical} MSDS 물질안전보건자료 경고표지"
+
+
+def msds_filter(chemical):
+    return {"doc_type": "MSDS", "chemical": chemical}
+
+
+SOP_FILTER = {"doc_type": "SOP"}
+LAW_FILTER = {"doc_type": ["LAW", "GUIDE"]}
+
+
+def static_queries():
+    """(질의, 필터) 목록"""
+    queries = [(SOP_QUERY, SOP_FILTER)]
+    queries += [(msds_query(chem), msds_filter(chem)) for chem in TARGET_CHEMICALS]
+    return queries
+
+
+def _query_key(query, flt):
+    if not flt:
+        return query
+    return f"{query}|{json.dumps(flt, ensure_ascii=False, sort_keys=True)}"
+
+
+def embed_queries(embeddings, queries):
+    """질의 여러 개를 한 번에 임베딩 (배치 API가 없는 임베딩은 하나씩 처리)"""
+    if hasattr(embeddings, "embed_queries"):
+        return embeddings.embed_queries(queries)
+    return [embeddings.embed_query(q) for q in queries]
+
+
+# --- 메타데이터 필터 ---
+def filter_positions(vectorstore, flt):
+    """
+    필터 조건(필드별 AND, 값 리스트는 OR)에 해당하는 FAISS 위치 배열.
+    (필드, 값) -> 위치 색인은 chunks.sqlite의 filters 테이블에서 조회한다. (index_store.FILTER_FIELDS만 색인)
+    예: {"source_name": "톨루엔.pdf"} -> 해당 파일 청크들의 위치
+    """
+    empty = np.empty(0, dtype=np.int64)
+    result = None
+    for field, value in flt.items():
+        values = value if isinstance(value, (list, tuple, set)) else [value]
+        ids = np.asarray(
+            vectorstore.docstore.filter_positions(field, values), dtype=np.int64
+        )
+        result = ids if result is None else np.intersect1d(result, ids)
+    return result if result is not None else empty
+
+
+# --- 하이브리드 (Dense + BM25) ---
+def set_sparse_index(index):
+    _sparse["index"] = index
+
+
+def rrf_fuse(rankings, k):
+    """Reciprocal Rank Fusion: 여러 순위 목록을 1/(RRF_K + rank) 합으로 병합"""
+    scores = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (RRF_K + rank + 1)
+    return sorted(scores, key=scores.get, reverse=True)[:k]
+
+
+def _sparse_ids(vectorstore, query, k, flt):
+    allowed = None
+    if flt:
+        allowed = {
+            vectorstore.index_to_docstore_id[int(pos)]
+            for pos in filter_positions(vectorstore, flt)
+        }
+    hits = _sparse["index"].search(query, k, allowed, budget_ms=SPARSE_BUDGET_MS)
+    return [doc_id for doc_id, _ in hits]
+
+
+def _exact_subset_search(index, positions, queries, k):
+    """필터된 위치의 벡터만 복원해 L2 거리로 정렬 (소규모 파티션용)"""
+    subset = index.reconstruct_batch(positions)
+    dists = (subset**2).sum(axis=1)[None, :] - 2 * queries @ subset.T
+    order = np.argsort(dists, axis=1)[:, :k]
+    return positions[order]
+
+
+def _search_ids(vectorstore, queries, k, filters=None, hybrid=True):
+    """
+    질의들을 한 번에 임베딩하고, 같은 필터끼리 묶어 FAISS 다중 벡터 검색으로 docstore ID를 구한다.
+    필터는 파티션이 작으면 해당 벡터만 정확 검색, 크면 IDSelector로 인덱스 안에서 적용되므로
+    "톨루엔.pdf 안에서 top-k"가 검색 1회다.
+    BM25 역색인이 있으면 질의별 lexical 결과와 RRF로 융합한다.
+    """
+    filters = filters or [None] * len(queries)
+    hybrid = hybrid and _sparse["index"] is not None
+    fetch_k = k * FETCH_MULTIPLIER if hybrid else k
+    vectors = np.asarray(
+        embed_queries(vectorstore.embedding_function, queries), dtype=np.float32
+    )
+
+    groups = {}
+    for n, flt in enumerate(filters):
+        groups.setdefault(_query_key("", flt), []).append(n)
+
+    index = vectorstore.index
+    results = [[] for _ in queries]
+    for members in groups.values():
+        flt = filters[members[0]]
+        params = None
+        if flt:
+            positions = filter_positions(vectorstore, flt)
+            if len(positions) == 0:
+                continue
+            if len(positions) <= EXACT_FILTER_LIMIT:
+                indices = _exact_subset_search(
+                    index, positions, vectors[members], fetch_k
+                )
+            else:
+                params = search_params(index, faiss.IDSelectorBatch(positions))
+
+        if params is not None or not flt:
+            _, indices = index.search(vectors[members], fetch_k, params=params)
+
+        for n, row in zip(members, indices):
+            results[n] = [
+                vectorstore.index_to_docstore_id[int(i)] for i in row if i != -1
+            ]
+
+    if not hybrid:
+        return [ids[:k] for ids in results]
+
+    return [
+        rrf_fuse([dense, _sparse_ids(vectorstore, query, fetch_k, flt)], k)
+        for query, dense, flt in zip(queries, results, filters)
+    ]
+
+
+def retrieve_many(vectorstore, queries, k=6, filters=None, hybrid=True):
+    """
+    요청 하나의 질의들을 한 번에 임베딩하고, FAISS 다중 벡터 검색으로 처리한다.
+    filters: 질의별 메타데이터 필터 (없으면 None)
+    hybrid: BM25 결과와 RRF 융합 여부 (False면 dense만)
+    미리 계산된 고정 질의는 검색 없이 바로 돌려준다.
+    반환: 질의 순서대로 Document 리스트의 리스트
+    """
+    if not queries:
+        return []
+    filters = filters or [None] * len(queries)
+
+    ids_per_query = [None] * len(queries)
+    pending = []
+    for n, (query, flt) in enumerate(zip(queries, filters)):
+        key = _query_key(query, flt)
+        if hybrid and key in _static_results and k <= _static_k:
+            ids_per_query[n] = _static_results[key][:k]
+        else:
+            pending.append(n)
+
+    if pending:
+        searched = _search_ids(
+            vectorstore,
+            [queries[n] for n in pending],
+            k,
+            [filters[n] for n in pending],
+            hybrid,
+        )
+        for n, ids in zip(pending, searched):
+            ids_per_query[n] = ids
+
+    return [
+        [vectorstore.docstore.search(doc_id) for doc_id in ids]
+        for ids in ids_per_query
+    ]
+
+
+# --- 고정 질의 결과 캐시 ---
+def load_static_results(vectorstore, db_path, fingerprint, k=6):
+    """
+    고정 질의 결과를 인덱스 옆에 저장해 두고 재사용한다.
+    코퍼스 지문(fingerprint)이 바뀌면 자동으로 다시 계산한다.
+    """
+    global _static_results, _static_k
+
+    path = os.path.join(db_path, STATIC_RESULTS_FILE)
+    queries = static_queries()
+    keys = [_query_key(q, f) for q, f in queries]
+
+    if os.path.exists(path):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                saved = json.load(f)
+            if (
+                saved.get("version") == STATIC_VERSION
+                and saved["fingerprint"] == fingerprint
+                and saved["k"] >= k
+                and set(keys) <= set(saved["results"])
+            ):
+                _static_results, _static_k = saved["results"], saved["k"]
+                return
+        except Exception as e:
+            print(f"⚠️ 고정 질의 캐시 로드 실패 : {e}")
+
+    print("📌 고정 질의(SOP/MSDS) 결과 사전 계산 중...")
+    searched = _search_ids(
+        vectorstore, [q for q, _ in queries], k, [f for _, f in queries]
+    )
+    _static_results = dict(zip(keys, searched))
+    _static_k = k
+
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(
+            {
+                "version": STATIC_VERSION,
+                "fingerprint": fingerprint,
+                "k": k,
+                "results": _static_results,
+            },
+            f,
+            ensure_ascii=False,
+        )
+    os.replace(tmp_path, path)
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    기존 VectorStoreRetriever와 같은 인터페이스(invoke, vectorstore, search_kwargs)로
+    Dense + BM25 하이브리드 검색을 제공한다.
+    """
+
+    vectorstore: Any
+    search_kwargs: dict = {"k": 6}
+
+    def _get_relevant_documents(self, query, *, run_manager=None):
+        return retrieve_many(
+            self.vectorstore,
+            [query],
+            self.search_kwargs.get("k", 6),
+            [self.search_kwargs.get("filter")],
+        )[0]
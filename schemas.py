@@ -0,0 +1,64 @@
+from typing import Literal
+from pydantic import BaseModel, Field, field_validator, model_validator
+
+# LLM 구조화 출력 스키마 (OpenAI json_schema strict 모드)
+#   strict 모드는 모든 필드가 필수이고 숫자 범위(minimum/maximum)를 강제하지 않으므로
+#   범위 검증은 validator에서 하고, 실패하면 agent_graph가 오류 내용을 붙여 재시도한다.
+
+
+class StructuredOutputError(ValueError):
+    """repair 재요청까지 모두 스키마 검증에 실패 (네트워크/API 오류는 그대로 전파)"""
+
+
+class GateDecision(BaseModel):
+    """coordinator(Safety Gatekeeper) 판정"""
+
+    status: Literal["OK", "MISSING"] = Field(
+        description="OK: 통과 / MISSING: 안전 조치 정보 부족"
+    )
+    question: str = Field(
+        description="MISSING일 때 사용자에게 되물을 질문 한 문장, OK면 빈 문자열"
+    )
+
+    @model_validator(mode="after")
+    def _question_required(self):
+        if self.status == "MISSING" and not self.question.strip():
+            raise ValueError("status가 MISSING이면 question이 필요합니다.")
+        return self
+
+
+class RiskAssessment(BaseModel):
+    """risk_analyst Fine-Kinney 평가 (R = P x E x C는 코드에서 계산)"""
+
+    accident_type: str = Field(description="재해유형 (예: 추락, 질식, 화재/폭발)")
+    p: float = Field(description="가능성 P (0.1~10)")
+    e: float = Field(description="빈도 E (0.5~10)")
+    c: float = Field(description="강도 C (1~100)")
+
+    @field_validator("accident_type")
+    @classmethod
+    def _not_blank(cls, value):
+        if not value.strip():
+            raise ValueError("accident_type이 비어 있습니다.")
+        return value.strip()
+
+    @field_validator("p")
+    @classmethod
+    def _probability(cls, value):
+        return _in_range("p", value, 0.1, 10)
+
+    @field_validator("e")
+    @classmethod
+    def _exposure(cls, value):
+        return _in_range("e", value, 0.5, 10)
+
+    @field_validator("c")
+    @classmethod
+    def _consequence(cls, value):
+        return _in_range("c", value, 1, 100)
+
+
+def _in_range(name, value, low, high):
+    if not low <= value <= high:
+        raise ValueError(f"{name}={value}는 {low}~{high} 범위를 벗어납니다.")
+    return value
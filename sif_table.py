@@ -0,0 +1,278 @@
+import os
+import re
+import json
+import glob
+import time
+import math
+import heapq
+import hashlib
+from bm25_index import tokenize
+
+# data 폴더의 구조화 자료
+#   - 산업재해 고위험요인(SIF) 목록 xlsx -> SIFTable (작업/기인물 키워드 색인)
+#   - 산업재해현황 통계 PDF -> AccidentStats (항목명 + 수치 행)
+SIF_PATTERN = "*고위험요인(SIF)*.xlsx"
+STAT_PATTERN = "*산업재해현황*.pdf"
+# 파싱 결과 캐시는 faiss_db 밖에 둔다 (warm-up에서 인덱스 동기화와 병렬로 돌고,
+# 인덱스 재생성 시 faiss_db 폴더가 통째로 삭제되므로)
+TABLES_CACHE_PATH = os.getenv("TABLES_CACHE_PATH", "./table_cache/structured_tables.json")
+TABLES_VERSION = 1
+
+# 이 점수(매칭된 term idf 합) 미만이면 SIF 매칭으로 보지 않음
+SIF_MIN_SCORE = float(os.getenv("SIF_MIN_SCORE", "8.0"))
+# 전체 키의 이 비율보다 많이 등장하는 term("작업" 등)은 색인하지 않음
+SIF_STOP_RATIO = 0.2
+
+SIF_COLUMNS = (
+    "id",
+    "sector",
+    "industry",
+    "overview",
+    "agent",
+    "work",
+    "cause",
+    "countermeasure",
+)
+
+# 시트별 열 위치 (0부터). 건설업 시트는 고위험작업·상황이 공종/작업명/단위작업명 3단
+SHEET_LAYOUTS = {
+    "건설업": {
+        "sector": "건설업",
+        "id": 0,
+        "work": (1, 2, 3),
+        "overview": 4,
+        "agent": 5,
+        "cause": 6,
+        "countermeasure": 7,
+    },
+    "default": {
+        "sector": "제조업 등",
+        "id": 0,
+        "industry": (1, 2, 3),
+        "overview": 4,
+        "agent": 5,
+        "work": (6,),
+        "cause": 7,
+        "countermeasure": 8,
+    },
+}
+
+ID_PATTERN = re.compile(r"^\d{4}-\d{2}-\d{2}-\d{3}$")
+OUTLINE_NUMBER = re.compile(r"^\d+(?:\.\d+)*\.?\s*")
+# 통계 PDF의 "항목명 수치 수치 ..." 행
+NUMBER = r"-?[\d,]+(?:\.\d+)?%?"
+STAT_LINE = re.compile(rf"^([가-힣A-Za-z·/()\s]+?)\s+((?:{NUMBER}\s+)*{NUMBER})$")
+
+# 재해유형(fine_kinney) -> 통계 항목명 키워드
+STAT_LABELS = {
+    "추락": ["떨어짐", "추락"],
+    "질식": ["질식", "산소결핍"],
+    "화재/폭발": ["화재", "폭발"],
+    "화학물질 누출/중독": ["화학물질", "중독"],
+    "경미한 부상": ["넘어짐"],
+}
+
+
+def _cell(row, index):
+    if index >= len(row) or row[index] is None:
+        return ""
+    return " ".join(str(row[index]).split())
+
+
+class SIFTable:
+    """
+    SIF 목록을 열 단위 리스트로 보관하고, (고위험작업, 기인물) 조합별로 묶어 역색인한다.
+    같은 작업/기인물 사례가 여러 건이면 한 키로 합치고 건수를 함께 돌려준다.
+    """
+
+    def __init__(self, columns=None):
+        self.columns = columns or {name: [] for name in SIF_COLUMNS}
+        self._build_index()
+
+    def __len__(self):
+        return len(self.columns["id"])
+
+    # --- 생성 ---
+    @classmethod
+    def from_xlsx(cls, path):
+        from openpyxl import load_workbook
+
+        columns = {name: [] for name in SIF_COLUMNS}
+        workbook = load_workbook(path, read_only=True, data_only=True)
+        for sheet in workbook.worksheets:
+            # 시트명: "제조업 등(건설업 외 업종)" / "건설업"
+            title = sheet.title.strip()
+            layout = SHEET_LAYOUTS["건설업" if title == "건설업" else "default"]
+            # 병합 셀/계층 구분(공종, 업종)은 빈 칸이면 윗 행 값을 이어받는다
+            carried = {}
+            for row in sheet.iter_rows(values_only=True):
+                row_id = _cell(row, layout["id"])
+                if not ID_PATTERN.match(row_id):
+                    continue
+                record = {"id": row_id, "sector": layout["sector"]}
+                for name in ("industry", "work"):
+                    parts = []
+                    for index in layout.get(name, ()):
+                        value = _cell(row, index) or carried.get(index, "")
+                        carried[index] = value
+                        parts.append(OUTLINE_NUMBER.sub("", value))
+                    record[name] = " > ".join(p for p in parts if p)
+                for name in ("overview", "agent", "cause", "countermeasure"):
+                    record[name] = _cell(row, layout[name])
+                for name in SIF_COLUMNS:
+                    columns[name].append(record.get(name, ""))
+        workbook.close()
+        return cls(columns)
+
+    def _build_index(self):
+        keys = {}
+        self.key_rows = []
+        for row, (work, agent) in enumerate(
+            zip(self.columns["work"], self.columns["agent"])
+        ):
+            key = keys.setdefault((work, agent), len(keys))
+            if key == len(self.key_rows):
+                self.key_rows.append([])
+            self.key_rows[key].append(row)
+
+        self.postings = {}
+        for (work, agent), key in keys.items():
+            for term in set(tokenize(f"{work} {agent}")):
+                self.postings.setdefault(term, []).append(key)
+        max_df = max(1, int(len(keys) * SIF_STOP_RATIO))
+        self.postings = {
+            term: key_ids
+            for term, key_ids in self.postings.items()
+            if len(key_ids) <= max_df
+        }
+        self.idf = {
+            term: math.log(1 + len(keys) / len(key_ids))
+            for term, key_ids in self.postings.items()
+        }
+
+    # --- 조회 ---
+    def match(self, text, k=3, min_score=None):
+        """
+        작업 설명과 겹치는 (고위험작업, 기인물) 상위 k개.
+        반환: [{..SIF 열.., "score", "cases"}] (대표 사례는 첫 행)
+        """
+        min_score = SIF_MIN_SCORE if min_score is None else min_score
+        scores = {}
+        for term in set(tokenize(text)):
+            for key in self.postings.get(term, ()):
+                scores[key] = scores.get(key, 0.0) + self.idf[term]
+
+        results = []
+        # 점수가 같으면 사례가 많은 조합 우선
+        ranked = heapq.nlargest(
+            k, scores.items(), key=lambda item: (item[1], len(self.key_rows[item[0]]))
+        )
+        for key, score in ranked:
+            if score < min_score:
+                break
+            rows = self.key_rows[key]
+            entry = {name: self.columns[name][rows[0]] for name in SIF_COLUMNS}
+            entry.update(score=round(score, 2), cases=len(rows))
+            results.append(entry)
+        return results
+
+
+class AccidentStats:
+    """산업재해현황 PDF의 표를 (출처, 페이지, 항목명, 수치들) 행으로 보관"""
+
+    def __init__(self, rows=None):
+        self.rows = rows or []
+
+    @classmethod
+    def from_pdfs(cls, paths):
+        from pypdf import PdfReader
+
+        rows = []
+        # 파일명 순 = 기간 순 (최신 자료가 뒤) -> 조회 시 최신부터
+        for path in sorted(paths, reverse=True):
+            source = os.path.basename(path)
+            for page_no, page in enumerate(PdfReader(path).pages):
+                for line in (page.extract_text() or "").splitlines():
+                    m = STAT_LINE.match(line.strip())
+                    if m is None:
+                        continue
+                    label = "".join(m.group(1).split())
+                    if len(label) < 2:
+                        continue
+                    rows.append([source, page_no, label, m.group(2).split()])
+        return cls(rows)
+
+    def lookup(self, accident_type, limit=3):
+        keywords = STAT_LABELS.get(accident_type, [accident_type])
+        found = []
+        for source, page, label, values in self.rows:
+            if any(keyword in label for keyword in keywords):
+                found.append(
+                    {"source": source, "page": page, "label": label, "values": values}
+                )
+                if len(found) >= limit:
+                    break
+        return found
+
+
+def _digest(paths):
+    h = hashlib.sha256()
+    for path in sorted(paths):
+        stat = os.stat(path)
+        name = os.path.basename(path)
+        h.update(f"{name}:{stat.st_size}:{stat.st_mtime_ns}".encode("utf-8"))
+    return h.hexdigest()
+
+
+def load_tables(data_path, cache_path=TABLES_CACHE_PATH):
+    """
+    (SIFTable, AccidentStats). 원본 파일이 그대로면 cache_path의 JSON 캐시를 쓰고,
+    바뀌었으면 xlsx/PDF를 다시 파싱한다. 원본이 없으면 빈 테이블.
+    """
+    sif_paths = glob.glob(os.path.join(data_path, SIF_PATTERN))
+    stat_paths = glob.glob(os.path.join(data_path, STAT_PATTERN))
+    digest = _digest(sif_paths + stat_paths)
+
+    if os.path.exists(cache_path):
+        try:
+            with open(cache_path, "r", encoding="utf-8") as f:
+                saved = json.load(f)
+            if (
+                saved.get("version") == TABLES_VERSION
+                and saved.get("digest") == digest
+            ):
+                return SIFTable(saved["sif"]), AccidentStats(saved["stats"])
+        except Exception as e:
+            print(f"⚠️ 구조화 테이블 캐시 로드 실패 : {e}")
+
+    started = time.time()
+    sif = SIFTable()
+    stats = AccidentStats()
+    try:
+        if sif_paths:
+            sif = SIFTable.from_xlsx(sif_paths[0])
+        if stat_paths:
+            stats = AccidentStats.from_pdfs(stat_paths)
+    except Exception as e:
+        print(f"⚠️ 구조화 자료 파싱 실패 : {e}")
+        return sif, stats
+
+    os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+    tmp_path = cache_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(
+            {
+                "version": TABLES_VERSION,
+                "digest": digest,
+                "sif": sif.columns,
+                "stats": stats.rows,
+            },
+            f,
+            ensure_ascii=False,
+        )
+    os.replace(tmp_path, cache_path)
+    print(
+        f"📋 구조화 테이블 생성: SIF {len(sif)}건, 통계 {len(stats.rows)}행 "
+        f"({time.time() - started:.1f}초)"
+    )
+    return sif, stats
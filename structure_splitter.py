@@ -0,0 +1,159 @@
+import os
+import re
+import bisect
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+# 구조 단위(조문/절/MSDS 항목) 청킹 설정
+#   짧은 단위는 MIN_CHUNK_CHARS가 될 때까지 다음 단위와 합치고,
+#   MAX_CHUNK_CHARS를 넘는 단위만 항/호 경계로 나눈다 (조항 제목을 앞에 붙여 단독으로 읽히게).
+MAX_CHUNK_CHARS = int(os.getenv("CHUNK_MAX_CHARS", "1000"))
+MIN_CHUNK_CHARS = int(os.getenv("CHUNK_MIN_CHARS", "300"))
+CHUNK_OVERLAP = 100
+
+# 페이지 머리말/꼬리말 (쪽번호 "- 12 -", "3 / 40", 법제처 PDF 하단)
+PAGE_NOISE = re.compile(
+    r"^\s*(?:-\s*\d+\s*-|\d+\s*/\s*\d+|법제처\s+\d+\s+국가법령정보센터)\s*$"
+)
+
+# 조문: "제619조(밀폐공간 작업 프로그램의 수립·시행)" / 편·장·절 제목은 label 없이 경계로만
+LAW_HEADING = re.compile(
+    r"^(?:(?P<label>제\s*\d+\s*조(?:\s*의\s*\d+)?)\s*\(|제\s*\d+\s*[편장절]\s)",
+    re.M,
+)
+# KOSHA 기술지침: "1. 목적", "4.2 작업 전 점검" (제목 줄만, 문장으로 끝나는 목록 항목 제외)
+GUIDE_HEADING = re.compile(
+    r"^(?P<label>\d{1,2}(?:\.\d{1,2}){0,2})\.?[ \t]+(?P<title>[^\n]{1,40})$", re.M
+)
+# MSDS 16개 표준 항목: "9. 물리화학적 특성"
+MSDS_HEADING = re.compile(
+    r"^(?P<label>\d{1,2})\.\s*(?:화학제품과|유해성|구성성분|응급조치|폭발|화재|누출|취급|"
+    r"노출방지|물리화학|안정성|독성|환경|폐기|운송|법적|그\s*밖의)",
+    re.M,
+)
+
+# 문서 유형(rag_setup.classify_document) -> 시도할 구조 (앞에서부터, 제목이 2개 이상 나오는 첫 구조)
+STRUCTURES = {
+    "LAW": ("law",),
+    "GUIDE": ("guide",),
+    "MSDS": ("msds",),
+}
+DEFAULT_STRUCTURES = ("law", "guide")
+
+HEADINGS = {"law": LAW_HEADING, "guide": GUIDE_HEADING, "msds": MSDS_HEADING}
+
+# 긴 단위를 나눌 때의 경계 (항 ①, 호 "1.", 목 "가.", 문단, 줄)
+SEPARATORS = [
+    r"\n(?=[①-⑳])",
+    r"\n(?=\d{1,2}\.\s)",
+    r"\n(?=[가나다라마바사아자차카타파하]\.\s)",
+    r"\n\n",
+    r"\n",
+    r" ",
+    r"",
+]
+
+
+def clean_page(text):
+    return "\n".join(
+        line for line in (text or "").splitlines() if not PAGE_NOISE.match(line)
+    )
+
+
+def _headings(text, structure):
+    found = []
+    for m in HEADINGS[structure].finditer(text):
+        if structure == "guide" and m.group("title").rstrip().endswith(("다", ".")):
+            continue
+        label = m.group("label")
+        found.append((m.start(), "".join(label.split()) if label else None))
+    return found
+
+
+def find_headings(text, doc_type):
+    """[(오프셋, 조항 번호 또는 None)] - 문서 유형에 맞는 구조가 없으면 []"""
+    for structure in STRUCTURES.get(doc_type, DEFAULT_STRUCTURES):
+        found = _headings(text, structure)
+        if len(found) >= 2:
+            return found
+    return []
+
+
+def _units(text, headings):
+    """제목 위치로 나눈 (시작, 끝, 조항 번호) 단위. 첫 제목 앞부분은 번호 없는 단위"""
+    bounds = [offset for offset, _ in headings]
+    labels = [label for _, label in headings]
+    if not bounds or bounds[0] > 0:
+        bounds.insert(0, 0)
+        labels.insert(0, None)
+    bounds.append(len(text))
+    return [
+        (bounds[i], bounds[i + 1], labels[i])
+        for i in range(len(labels))
+        if text[bounds[i] : bounds[i + 1]].strip()
+    ]
+
+
+def _merge_small(units):
+    """MIN_CHUNK_CHARS 미만 단위는 MAX_CHUNK_CHARS 안에서 다음 단위와 합친다"""
+    merged = []
+    for start, end, label in units:
+        if merged:
+            m_start, m_end, m_labels = merged[-1]
+            if m_end - m_start < MIN_CHUNK_CHARS and end - m_start <= MAX_CHUNK_CHARS:
+                merged[-1] = (m_start, end, m_labels + [label])
+                continue
+        merged.append((start, end, [label]))
+    return merged
+
+
+def _article(labels):
+    labels = [label for label in labels if label]
+    if not labels:
+        return ""
+    return labels[0] if len(labels) == 1 else f"{labels[0]}~{labels[-1]}"
+
+
+def split_pages(pages, doc_type, first_page=0):
+    """
+    연속된 페이지 텍스트를 구조 단위로 나눈다. (페이지 경계를 넘는 조문도 한 청크)
+    반환: [{"text", "page", "page_end", "article"}] - page/page_end는 청크 시작/끝 페이지
+    """
+    texts = [clean_page(page) for page in pages]
+    offsets, cursor = [], 0
+    for text in texts:
+        offsets.append(cursor)
+        cursor += len(text) + 1
+    text = "\n".join(texts)
+
+    def page_at(offset):
+        return first_page + bisect.bisect_right(offsets, offset) - 1
+
+    splitter = RecursiveCharacterTextSplitter(
+        chunk_size=MAX_CHUNK_CHARS,
+        chunk_overlap=CHUNK_OVERLAP,
+        separators=SEPARATORS,
+        is_separator_regex=True,
+    )
+
+    chunks = []
+    for start, end, labels in _merge_small(_units(text, find_headings(text, doc_type))):
+        body = text[start:end].strip()
+        article = _article(labels)
+        pieces = [body] if len(body) <= MAX_CHUNK_CHARS else splitter.split_text(body)
+        # 나뉜 조문은 제목 줄을 뒤 조각에도 붙여 "제619조 ... ③" 조각이 단독으로 읽히게
+        heading = body.split("\n", 1)[0][:60] if article and len(pieces) > 1 else ""
+
+        search_from = start
+        for i, piece in enumerate(pieces):
+            found = text.find(piece[:50], search_from)
+            piece_start = found if found != -1 else search_from
+            search_from = piece_start
+            chunks.append(
+                {
+                    "text": f"{heading}\n{piece}" if i and heading else piece,
+                    "page": page_at(piece_start),
+                    "page_end": page_at(min(piece_start + len(piece), end) - 1),
+                    "article": article,
+                }
+            )
+    return chunks